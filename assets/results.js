@@ -0,0 +1,70 @@
+// Clientside callbacks for main_dash.py
+// These callbacks decide which of the Generate Graph, Save Figure, Generate Data Table, and Export Data Table buttons are disabled and hide results that no longer match the user's selections.
+// The graph and data table themselves are made by background callbacks on the server (display_graph and display_table), the figure and data table are downloaded by save_figure and export_table.
+// The year slider of a map is set here, moving it sends the year to update_map_year on the server.
+
+function triggeredId() {
+    // Returns the id of the item that most recently triggered the callback ('' on the initial call)
+    var triggered = window.dash_clientside.callback_context.triggered;
+    if (!triggered || triggered.length === 0) {
+        return '';
+    }
+    return triggered[0]['prop_id'].split('.')[0];
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    results: {
+        // Returns whether the Generate Graph, Save Figure, Generate Data Table, and Export Data Table buttons are disabled (in that order)
+        // Each button is disabled once clicked, the Save Figure button is only enabled by clicking the Generate Graph button,
+        // the Export Data Table button is only enabled by clicking the Generate Data Table button,
+        // and changing any selection (or the initial call) resets the buttons
+        button_states: function (graphClicks, saveClicks, tableClicks, exportClicks, resolved) {
+            var noUpdate = window.dash_clientside.no_update;
+            switch (triggeredId()) {
+                case 'graph-button':
+                    return [true, false, noUpdate, noUpdate];
+                case 'save-fig-button':
+                    return [noUpdate, true, noUpdate, noUpdate];
+                case 'data-table-button':
+                    return [noUpdate, noUpdate, true, false];
+                case 'export-table-button':
+                    return [noUpdate, noUpdate, noUpdate, true];
+                default:
+                    return [false, true, false, true];
+            }
+        },
+        // Hides the graph, the map's year slider, and the data table, and clears the saved figure and data table messages, once the user changes a selection
+        hide_results: function (resolved) {
+            return [{'display': 'none'}, {'display': 'none'}, {'display': 'none'}, '', ''];
+        },
+        // Sets the map's year slider to every year of the resolved selection (held in its params), starting at the latest year
+        // Animated maps have their own slider in the figure, so the year slider is left as it is for them
+        map_years: function (resolved) {
+            var noUpdate = window.dash_clientside.no_update;
+            var selection = resolved['selection'] || {};
+            if (!resolved['complete'] || selection['viz_type'] !== 'Map' || selection['animate']) {
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+            var years = resolved['params']['year'].map(Number);
+            var marks = {};
+            years.forEach(function (year) {
+                marks[year] = String(year);
+            });
+            return [marks, years[0], years[years.length - 1], years[years.length - 1]];
+        },
+        // Returns the address the Export Raw Data link downloads the raw rows of the resolved selection from (the export_raw route in main_dash.py) and whether the link is displayed
+        // The link is hidden until the selection is complete, and for Excel files since they can't be streamed
+        // The data item a ratio divides by (and its commodity) isn't a column of the raw rows, so only the rows of the data item itself are exported
+        raw_export_link: function (resolved, fmt, compression) {
+            if (!resolved['complete'] || !resolved['params'] || fmt === 'xlsx') {
+                return ['', {'display': 'none'}];
+            }
+            var params = Object.assign({}, resolved['params']);
+            delete params['ratio_item'];
+            delete params['ratio_commodity'];
+            var href = 'export/raw?params=' + encodeURIComponent(JSON.stringify(params)) +
+                '&format=' + encodeURIComponent(fmt) + '&compression=' + encodeURIComponent(compression);
+            return [href, {'display': 'inline-block'}];
+        }
+    }
+});
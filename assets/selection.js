@@ -0,0 +1,120 @@
+// Clientside callbacks for main_dash.py
+// These callbacks only decide what is presented to the user (options, disabled items, and whether a section is displayed),
+// so they run in the browser rather than sending a request to the server on every click.
+// Every section after the state section reads its options from the resolved selection held in 'selection-store' (set by the resolve_selection callback).
+
+function displayStyle(show, display) {
+    // Returns the style of a section, display is the style used when the section is shown ('block' for dropdowns, 'inherit' for checklists and radio items)
+    return show ? {'display': display} : {'display': 'none'};
+}
+
+function checklistLayout(results, validVals, limit) {
+    // Constructs the list of objects that make up a checklist, the label and value of each item are the same
+    // Once the amount of valid items already chosen by the user reaches limit, every other item is disabled
+    return results.map(function (i) {
+        var item = {'label': i, 'value': i};
+        if (validVals.length >= limit) {
+            item['disabled'] = validVals.indexOf(i) === -1;
+        }
+        return item;
+    });
+}
+
+function dropdownSection(vals) {
+    // Dropdowns display when there are options, and start with an empty option
+    var style = displayStyle(vals.length > 0, 'block');
+    return [[''].concat(vals), style, style];
+}
+
+function radioSection(vals, emptyVals) {
+    // Radio items display when there are options
+    var style = displayStyle(vals.length > 0, 'inherit');
+    return [vals.length > 0 ? vals : emptyVals, style, style];
+}
+
+function selectionLimit(large, limit) {
+    // In large selection mode there is no limit on how many items can be chosen
+    return large ? Infinity : limit;
+}
+
+function everyYear(resolved) {
+    // Returns whether the user chose a map or an animated bar plot, which show every year one at a time, so they only take one domain category
+    var selection = resolved['selection'] || {};
+    return selection['viz_type'] === 'Map' || (selection['viz_type'] === 'Bar Plot' && selection['animate']);
+}
+
+function checklistSection(results, validVals, limit) {
+    // Checklists display when there are options, and limit how many items can be chosen
+    var style = displayStyle(results.length > 0, 'inherit');
+    return [checklistLayout(results, validVals, limit), style, style];
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    selection: {
+        // Returns a random id for the page the app is open in, set once when the page loads
+        session_id: function (id) {
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            return Math.random().toString(36).slice(2) + Date.now().toString(36);
+        },
+        // The switch animating a bar plot or map over every year is only displayed for bar plots and maps
+        display_animate: function (vizType) {
+            return displayStyle(vizType === 'Bar Plot' || vizType === 'Map', 'block');
+        },
+        // State section, only displayed once a visualization type is chosen, the user can pick up to 5 states (any number in large selection mode)
+        // A map shows every state, so the section isn't displayed for maps
+        update_multi_options: function (value, vizType, large, options) {
+            var style = displayStyle(vizType !== '' && vizType !== null && vizType !== 'Map', 'inherit');
+            var chosen = value || [];
+            var stateLayout = options.map(function (option) {
+                var item = {'label': option['label'], 'value': option['value']};
+                if (chosen.length >= selectionLimit(large, 5)) {
+                    item['disabled'] = chosen.indexOf(option['value']) === -1;
+                }
+                return item;
+            });
+            return [stateLayout, style, style];
+        },
+        display_coms: function (resolved) {
+            return dropdownSection(resolved['options']['commodity']);
+        },
+        update_doms: function (resolved) {
+            return dropdownSection(resolved['options']['domain']);
+        },
+        update_dts: function (resolved) {
+            return dropdownSection(resolved['options']['data_item']);
+        },
+        ask_mult_dt: function (resolved) {
+            return radioSection(resolved['options']['mult_dt_q'], ['']);
+        },
+        // Additional data items are limited to 4 so that the final visualization displays at most five data items (no limit in large selection mode)
+        update_mult_dts_items: function (resolved) {
+            return checklistSection(resolved['options']['add_data_item'], resolved['valid']['add_data_item'], selectionLimit(resolved['large'], 4));
+        },
+        update_dc: function (resolved) {
+            var limit = everyYear(resolved) ? 1 : selectionLimit(resolved['large'], 5);
+            return checklistSection(resolved['options']['domain_category'], resolved['valid']['domain_category'], limit);
+        },
+        update_years: function (resolved) {
+            return checklistSection(resolved['options']['year'], resolved['valid']['year'], selectionLimit(resolved['large'], 5));
+        },
+        ask_stat: function (resolved) {
+            return radioSection(resolved['options']['stat_type'], []);
+        },
+        // Only displayed once the user chose Ratio as the statistic
+        ask_ratio_item: function (resolved) {
+            return dropdownSection(resolved['options']['ratio_item']);
+        },
+        ask_barplot_xax: function (resolved) {
+            return radioSection(resolved['options']['barax'], []);
+        },
+        ask_linegraph_line_n: function (resolved) {
+            return radioSection(resolved['options']['line_n'], []);
+        },
+        // The Generate Graph, Save Figure, Generate Data Table, and Export Data Table buttons display once the selection is complete
+        display_g_or_dt_buttons: function (resolved) {
+            return displayStyle(resolved['complete'], 'inherit');
+        }
+    }
+});
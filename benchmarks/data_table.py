@@ -0,0 +1,117 @@
+'''
+Data table benchmark of the tool, run from the root of the repository with:
+    python benchmarks/data_table.py
+
+Times making the data table (get_statistics in data_table.py) from the keyed results of the final query for the largest selections in the irrigation database,
+every state over all years:
+    line graph with a line per state, for the data item (with domain TOTAL) available in the most states and years
+    line graph and bar plot with a line or bar per domain category, for every domain category of the domain and data item with the most of them
+and, since no selection of the database has more than 50 lines (one per state), for synthetic keyed results with thousands of lines (--rows) over the same years,
+some of them missing years, to check the time grows linearly with the rows of the table
+
+Query results are cached before timing, so only making the data table is measured (the best of --repeat runs)
+'''
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from src.Irr_DB import Irr_DB
+from src.cache import LRUCache
+from src.data_table import get_statistics
+from large_selection import widest_data_item
+
+
+def most_categories(db)->dict[str,str]:
+    '''
+    Finds the domain and data item (not domain TOTAL) with the most domain categories
+
+    Returns a dictionary with its commodity, domain, and data item
+    '''
+    sql="""
+    SELECT commodity, domain, data_item FROM tMain
+    WHERE domain != 'TOTAL'
+    GROUP BY commodity, domain, data_item
+    ORDER BY COUNT(DISTINCT domain_category) DESC
+    LIMIT 1
+    ;"""
+    row=db.run_query(sql, None).iloc[0]
+    return {'commodity': row['commodity'], 'domain': row['domain'], 'data_item': row['data_item']}
+
+
+def best_ms(fn, repeat:int)->float:
+    '''
+    Returns the fewest milliseconds calling fn (with no arguments) took over repeat calls
+    '''
+    times=[]
+    for _ in range(repeat):
+        start=time.perf_counter()
+        fn()
+        times+=[(time.perf_counter()-start)*1000]
+    return min(times)
+
+
+def selection_table(db, selection:dict, repeat:int)->tuple[pd.DataFrame, float]:
+    '''
+    Resolves selection (over every valid year, and every domain category if it has any) and runs its final query once so its results are cached
+
+    Returns its data table (a pandas DataFrame) and the fewest milliseconds making it took
+    '''
+    options=db.resolve_selection(selection)['options']
+    if options.get('domain_category'):
+        selection=dict(selection, domain_category=options['domain_category'])
+    selection['year']=db.resolve_selection(dict(selection, year=[]))['options']['year']
+    resolved=db.resolve_selection(selection)
+    assert resolved['complete'], 'selection is not complete'
+    params=resolved['params']
+    line_graph=selection['viz_type']=='Line Graph'
+    query=db.final_query(operation='Sum', params=params, s_multiple_or_one=resolved['s_multiple_or_one'], yr_or_states=resolved['yr_or_states'], line_graph=line_graph)
+    results=db.execute_keyed_query(query, params)
+    s_multiple_or_one=db.set_group_by_line(resolved['s_multiple_or_one']) if resolved['s_multiple_or_one']!=None else None
+    make=lambda: get_statistics(results=results, params=params, yr_or_states=None, s_multiple_or_one=s_multiple_or_one, line_graph=line_graph)
+    return make(), best_ms(make, repeat)
+
+
+def synthetic_table(rows:int, years:list[str], repeat:int)->tuple[pd.DataFrame, float]:
+    '''
+    Makes keyed results of rows (an int) lines over years (a list of strings), each line missing one year in ten at random
+
+    Returns the data table of a line graph of them (a pandas DataFrame) and the fewest milliseconds making it took
+    '''
+    rng=np.random.default_rng(0)
+    lines=['LINE %06d' % i for i in range(rows)]
+    results=pd.DataFrame({'domain_category': np.repeat(lines, len(years)), 'year': np.tile(years, rows), 'value': rng.random(rows*len(years))*1e6})
+    results=results[rng.random(len(results))>=0.1]
+    params={'commodity': ['WATER'], 'domain': ['SYNTHETIC'], 'data_item': ['SYNTHETIC'], 'domain_category': lines, 'year': years}
+    make=lambda: get_statistics(results=results, params=params, yr_or_states=None, s_multiple_or_one=None, line_graph=True)
+    return make(), best_ms(make, repeat)
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Times making data tables of large selections')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 5000, 20000], help='lines of the synthetic data tables')
+    parser.add_argument('--repeat', type=int, default=20, help='times each data table is made, the fastest is reported')
+    args=parser.parse_args()
+
+    db=Irr_DB()
+    db.query_cache=LRUCache(64)
+    states=sorted(db.get_states())
+    base={'state_id': states, 'mult_dt_q': 'One Data Item', 'add_data_item': [], 'domain_category': [], 'stat_type': 'Sum', 'barax': 'States', 'line_n': 'Multiple Lines'}
+
+    print(f'{"table":<34}{"rows":>7}{"cols":>6}{"empty cells":>12}{"ms":>9}{"us/row":>8}')
+    tables=[('line per state', dict(base, viz_type='Line Graph', **widest_data_item(db))),
+            ('line per domain category', dict(base, viz_type='Line Graph', **most_categories(db))),
+            ('bar per domain category', dict(base, viz_type='Bar Plot', **most_categories(db)))]
+    for name, selection in tables:
+        df, ms=selection_table(db, selection, args.repeat)
+        print(f'{name:<34}{len(df):>7}{len(df.columns)-1:>6}{int(df.iloc[:, 1:].isna().sum().sum()):>12}{ms:>9.2f}{ms*1000/len(df):>8.1f}')
+    years=db.resolve_selection(dict(base, viz_type='Line Graph', year=[], **widest_data_item(db)))['options']['year']
+    for rows in args.rows:
+        df, ms=synthetic_table(rows, years, args.repeat)
+        print(f'{"synthetic lines":<34}{len(df):>7}{len(df.columns)-1:>6}{int(df.iloc[:, 1:].isna().sum().sum()):>12}{ms:>9.2f}{ms*1000/len(df):>8.1f}')
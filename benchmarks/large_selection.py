@@ -0,0 +1,99 @@
+'''
+Large selection benchmark of the tool, run from the root of the repository with:
+    python benchmarks/large_selection.py
+
+Times each step of making a line graph (one line per state) and a bar plot (states on the x axis) for one data item over all years,
+for a growing number of states up to every state in the irrigation database (50 states x all census years), with large selection mode on and off:
+    resolve: resolving the selection (resolve_selection in the Irr_DB class)
+    query: the final query to the database (get_final_results in main_dash.py)
+    build: making the figure (make_line_graph or make_bar_plot in visualization.py)
+    payload: size of the figure sent to the browser
+
+Query results and figures aren't cached, so every step is measured in full. Time per state should stay about the same as states are added (the steps scale linearly)
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main_dash
+from src.visualization import make_line_graph, make_bar_plot
+
+
+def widest_data_item(db)->dict[str,str]:
+    '''
+    Finds the data item (with domain TOTAL) available in the most combinations of states and years
+
+    Returns a dictionary with its commodity, domain, and data item
+    '''
+    sql="""
+    SELECT commodity, domain, data_item FROM tMain
+    WHERE domain = 'TOTAL'
+    GROUP BY commodity, domain, data_item
+    ORDER BY COUNT(DISTINCT state_id || '-' || year) DESC
+    LIMIT 1
+    ;"""
+    row=db.run_query(sql, None).iloc[0]
+    return {'commodity': row['commodity'], 'domain': row['domain'], 'data_item': row['data_item']}
+
+
+def timed(fn, *args, **kwargs):
+    '''
+    Returns the result of calling fn with args and kwargs, and the milliseconds it took
+    '''
+    start=time.perf_counter()
+    result=fn(*args, **kwargs)
+    return result, (time.perf_counter()-start)*1000
+
+
+def run(viz_type:str, states:list[str], item:dict[str,str], large:bool)->dict:
+    '''
+    Makes the figure of viz_type ('Line Graph' or 'Bar Plot') for the data item in item over every valid year for states (a list of state abbreviations)
+
+    Returns a dictionary of how long each step took (in milliseconds), the amount of traces in the figure, and the size of the figure (in KB)
+    '''
+    db=main_dash.data_service.db
+    selection={'viz_type': viz_type, 'state_id': states, 'mult_dt_q': 'One Data Item', 'add_data_item': [], 'domain_category': [],
+               'stat_type': 'Sum', 'barax': 'States', 'line_n': 'Multiple Lines', **item}
+    selection['year']=db.resolve_selection(dict(selection, year=[]))['options']['year'] #every valid year
+    resolved, t_resolve=timed(db.resolve_selection, selection)
+    resolved['selection']=selection
+    resolved['large']=large
+    assert resolved['complete'], 'selection is not complete'
+
+    (params, final_results, encoded_answer), t_query=timed(main_dash.get_final_results, resolved)
+    operation=db.which_statistic('Sum')
+    if viz_type=='Line Graph':
+        fig, t_build=timed(make_line_graph, params=params, y_data=final_results, operation=operation, s_multiple_or_one=encoded_answer, large=large)
+    else:
+        fig, t_build=timed(make_bar_plot, params, encoded_answer, final_results, operation, large=large)
+    return {'years': len(params['year']), 'resolve': t_resolve, 'query': t_query, 'build': t_build,
+            'traces': len(fig.data), 'payload': len(fig.to_json())/1024}
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Times the steps of graphing large selections')
+    parser.add_argument('--steps', type=int, nargs='+', default=[5, 10, 25, 50], help='amounts of states to measure')
+    args=parser.parse_args()
+
+    tmp=tempfile.mkdtemp()
+    main_dash.create_app({'query_cache_size': 0, 'figure_cache_dir': None, 'figure_cache_size': 0,
+                          'jobs_dir': os.path.join(tmp, 'jobs'), 'snapshot_path': os.path.join(tmp, 'startup.json')})
+    all_states=sorted(main_dash.data_service.db.get_states())
+    item=widest_data_item(main_dash.data_service.db)
+    print('data item:', item['data_item'], '\n')
+
+    print(f'{"graph":<11}{"large":<7}{"states":>7}{"years":>6}{"traces":>7}{"resolve ms":>11}{"query ms":>10}{"build ms":>10}{"ms/state":>10}{"payload KB":>11}')
+    for viz_type in ['Line Graph', 'Bar Plot']:
+        for large in [False, True]:
+            for n in args.steps:
+                if n > len(all_states):
+                    continue
+                r=run(viz_type, all_states[:n], item, large)
+                total=r['resolve']+r['query']+r['build']
+                print(f'{viz_type:<11}{str(large):<7}{n:>7}{r["years"]:>6}{r["traces"]:>7}{r["resolve"]:>11.1f}{r["query"]:>10.1f}{r["build"]:>10.1f}{total/n:>10.2f}{r["payload"]:>11.1f}')
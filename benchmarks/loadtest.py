@@ -0,0 +1,388 @@
+'''
+Load test of the tool, run from the root of the repository with:
+    python benchmarks/loadtest.py --users 8 --sessions 5
+
+Starts the tool with gunicorn on a free local port (or uses a tool already running at --url), then runs --users simulated users at once,
+each replaying --sessions selection sessions against Dash's /_dash-update-component route, the same requests a browser makes:
+    picks a visualization type, states, commodity, domain, data item (and whether to add more data items), domain categories or additional data items,
+    years, statistic, and the bar plot or line graph question, each chosen at random from the options the tool offers at that point,
+    then generates the graph and the data table (background callbacks, polled until they finish like the browser does)
+Only callbacks run on the server are replayed, the clientside callbacks (assets/*.js) run in the browser
+
+Prints the throughput (sessions and requests per second) and the p50, p95, and p99 latency of each callback by the input that triggered it.
+With --record, the results are appended to benchmarks/results/loadtest.jsonl so they can be tracked over time,
+and with --max-p95 the script fails (exit code 1) if the p95 latency of any callback is more milliseconds than given
+'''
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Union
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH_RESULTS=os.path.join(ROOT, 'benchmarks', 'results', 'loadtest.jsonl')
+sys.path.insert(0, ROOT)
+
+from src.metrics import callback_name
+
+#the steps of a session, in the order a user makes them: the component value set and the key of the options it is chosen from in the resolved selection
+#(the visualization type and states are chosen from the options in the layout), along with the most items picked for checklists (None for single choices)
+SESSION_STEPS=[('viz-r.value', 'viz_type', None),
+               ('state-cl.value', 'state_id', 3),
+               ('com-dd.value', 'commodity', None),
+               ('dom-dd.value', 'domain', None),
+               ('dt-dd.value', 'data_item', None),
+               ('mult-dt-r.value', 'mult_dt_q', None),
+               ('tot-dom-dt.value', 'add_data_item', 2),
+               ('dc-cl.value', 'domain_category', 2),
+               ('year-cl.value', 'year', 3),
+               ('statq-r.value', 'stat_type', None),
+               ('ratio-dd.value', 'ratio_item', None),
+               ('barxax-r.value', 'barax', None),
+               ('line-n-r.value', 'line_n', None)]
+
+#the buttons clicked once the selection is complete, and the output of the background callback each one starts
+RESULT_STEPS=[('graph-button.n_clicks', 'graph.figure'),
+              ('data-table-button.n_clicks', 'table-container.children')]
+
+
+def free_port()->int:
+    '''
+    Returns a local port nothing is listening on
+    '''
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers:int, threads:int)->tuple[subprocess.Popen, str]:
+    '''
+    Starts the tool with gunicorn (configured by gunicorn.conf.py) with workers processes of threads threads (ints) on a free local port,
+    and waits until it serves its layout
+
+    Returns the gunicorn process and the url of the tool as a string
+    '''
+    port=free_port()
+    env=dict(os.environ, DVAT_BIND='127.0.0.1:'+str(port), DVAT_WORKERS=str(workers), DVAT_THREADS=str(threads))
+    server=subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url='http://127.0.0.1:'+str(port)
+    for _ in range(600):
+        if server.poll() != None:
+            raise RuntimeError('gunicorn exited with code '+str(server.returncode))
+        try:
+            request(url, '/_dash-layout')
+            return server, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('the tool did not start within 2 minutes')
+
+
+def request(url:str, path:str, body:dict=None)->tuple[int, Union[dict, None], int]:
+    '''
+    Sends a request to path (a string) of the tool at url, a POST of body (a dictionary sent as json) or a GET if body is None
+
+    Returns the status code (an int), the json response (None if there isn't one), and the amount of bytes received (an int)
+    '''
+    data=None if body == None else json.dumps(body).encode()
+    req=urllib.request.Request(url+path, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=300) as response:
+        content=response.read()
+        return response.status, (json.loads(content) if content else None), len(content)
+
+
+def find_components(layout:dict, found:dict)->dict:
+    '''
+    Walks the layout of the tool (a dictionary as served on /_dash-layout) and adds every component with an id to found (a dictionary of props keyed by id)
+
+    Returns found
+    '''
+    if isinstance(layout, list):
+        for child in layout:
+            find_components(child, found)
+    elif isinstance(layout, dict) and 'props' in layout:
+        if 'id' in layout['props']:
+            found[layout['props']['id']]=layout['props']
+        find_components(layout['props'].get('children'), found)
+    return found
+
+
+def option_values(options:list)->list:
+    '''
+    Takes in the options of a component (strings, or dictionaries with a 'value')
+
+    Returns the values of the options as a list
+    '''
+    return [o['value'] if isinstance(o, dict) else o for o in options]
+
+
+class Stats:
+    def __init__(self)->None:
+        '''
+        Constructor for the latencies (in milliseconds) of every callback made by the simulated users, shared by all of them
+
+        Returns None
+        '''
+        self.lock=threading.Lock()
+        self.latency={}
+        self.errors={}
+        self.requests=0
+        self.sessions=0
+        self.complete=0
+        return
+
+    def add(self, name:str, ms:float, requests:int)->None:
+        with self.lock:
+            self.latency.setdefault(name, []).append(ms)
+            self.requests+=requests
+        return
+
+    def error(self, name:str)->None:
+        with self.lock:
+            self.errors[name]=self.errors.get(name, 0)+1
+        return
+
+
+class SimulatedUser:
+    def __init__(self, url:str, deps:list[dict], layout:dict, stats:Stats, seed:int, poll:float, think:float, job_timeout:float)->None:
+        '''
+        Constructor for a user of the tool at url, replaying sessions with the server side callbacks in deps (as served on /_dash-dependencies)
+        and the components in layout (found with find_components), recording latencies in stats
+        Choices are made by a random generator seeded with seed (an int), background callbacks are polled every poll seconds,
+        the user waits think seconds between steps, and gives up on a background callback after job_timeout seconds (floats)
+
+        Returns None
+        '''
+        self.url=url
+        self.deps=[d for d in deps if not d.get('clientside_function')]
+        self.layout=layout
+        self.stats=stats
+        self.rng=random.Random(seed)
+        self.poll=poll
+        self.think=think
+        self.job_timeout=job_timeout
+        self.values={}
+        return
+
+    def reset(self)->None:
+        '''
+        Starts a new session: every component holds the value it has in the layout, like a newly opened page
+
+        Returns None
+        '''
+        self.values={cid+'.'+prop: value for cid, props in self.layout.items() for prop, value in props.items() if prop != 'children'}
+        return
+
+    def callback(self, output:str)->dict:
+        '''
+        Returns the dependency (as served on /_dash-dependencies) of the server side callback with output (a string such as 'graph.figure') among its outputs
+        '''
+        for dep in self.deps:
+            if output in dep['output']:
+                return dep
+        raise KeyError(output)
+
+    def body(self, dep:dict, changed:str)->dict:
+        '''
+        Builds the request the browser sends to call the callback dep once the component value changed (a string such as 'com-dd.value') changes
+
+        Returns the request body as a dictionary
+        '''
+        def value(item):
+            return dict(item, value=self.values.get(item['id']+'.'+item['property']))
+        outputs=[]
+        for o in dep['output'].strip('.').split('...'):
+            cid, prop=o.rsplit('.', 1)
+            outputs+=[{'id': cid, 'property': prop.split('@')[0]}]
+        return {'output': dep['output'], 'outputs': outputs if len(outputs) > 1 else outputs[0],
+                'inputs': [value(i) for i in dep['inputs']], 'state': [value(s) for s in dep.get('state', [])],
+                'changedPropIds': [changed]}
+
+    def update(self, response:Union[dict, None])->None:
+        '''
+        Applies the response of a callback (the values it set) to the values held by the user
+
+        Returns None
+        '''
+        for cid, props in ((response or {}).get('response') or {}).items():
+            for prop, value in props.items():
+                self.values[cid+'.'+prop]=value
+        return
+
+    def call(self, output:str, changed:str)->None:
+        '''
+        Calls the callback with output (a string) after changed (a string) changes, polling it until it finishes if it is a background callback,
+        and records how long it took under the name of the callback and the input that triggered it
+
+        Returns None
+        '''
+        dep=self.callback(output)
+        body=self.body(dep, changed)
+        name=callback_name(dep['output'])+' ('+changed.split('.')[0]+')'
+        start=time.perf_counter()
+        requests=1
+        try:
+            status, response, _=request(self.url, '/_dash-update-component', body)
+            if dep.get('long'): #background callback, the first response holds the job to poll
+                job=response
+                response=None
+                while response == None or 'response' not in response:
+                    if time.perf_counter()-start > self.job_timeout: #the job never finished, counted as an error
+                        raise TimeoutError(name)
+                    time.sleep(self.poll)
+                    requests+=1
+                    status, response, _=request(self.url, '/_dash-update-component?cacheKey='+job['cacheKey']+'&job='+str(job['job']), body)
+        except (urllib.error.URLError, ConnectionError, OSError, ValueError):
+            self.stats.error(name)
+            return
+        self.stats.add(name, (time.perf_counter()-start)*1000, requests)
+        if status == 200:
+            self.update(response)
+        return
+
+    def choose(self, key:str, most:Union[int, None])->Union[str, list[str], None]:
+        '''
+        Chooses a value for the section key (a string) from the options the tool offers for it, up to most items (an int, None for a single choice)
+
+        Returns the value, or None if there is nothing to choose from
+        '''
+        if key == 'viz_type':
+            options=option_values(self.layout['viz-r']['options'])
+        elif key == 'state_id':
+            options=option_values(self.layout['state-cl']['options'])
+        else:
+            options=self.values['selection-store.data']['options'][key]
+        if len(options) == 0:
+            return None
+        if most == None:
+            return self.rng.choice(options)
+        return self.rng.sample(options, self.rng.randint(1, min(most, len(options))))
+
+    def session(self)->None:
+        '''
+        Replays one session: makes every selection in SESSION_STEPS the tool asks for, then generates the graph and the data table if the selection is complete
+
+        Returns None
+        '''
+        self.reset()
+        for component, key, most in SESSION_STEPS:
+            value=self.choose(key, most)
+            if value == None: #the tool doesn't ask for this section with the current selections
+                continue
+            self.values[component]=value
+            time.sleep(self.think)
+            self.call('selection-store.data', component)
+        complete=self.values['selection-store.data']['complete']
+        if complete:
+            for button, output in RESULT_STEPS:
+                self.values[button]=1
+                time.sleep(self.think)
+                self.call(output, button)
+        with self.stats.lock:
+            self.stats.sessions+=1
+            self.stats.complete+=int(complete)
+        return
+
+
+def percentile(values:list[float], p:float)->float:
+    '''
+    Returns the p-th percentile (a float from 0 to 100) of values (a list of floats) by the nearest rank
+    '''
+    ordered=sorted(values)
+    return ordered[max(0, min(len(ordered)-1, int(round(p/100*len(ordered)+0.5))-1))]
+
+
+def run(url:str, users:int, sessions:int, poll:float, think:float, seed:int, job_timeout:float)->dict:
+    '''
+    Runs users simulated users (an int) at once against the tool at url, each replaying sessions sessions (an int)
+
+    Returns a dictionary with the throughput and the latency percentiles (in milliseconds) of each callback
+    '''
+    _, deps, _=request(url, '/_dash-dependencies')
+    _, layout, _=request(url, '/_dash-layout')
+    layout=find_components(layout, {})
+    stats=Stats()
+
+    def simulate(i):
+        user=SimulatedUser(url, deps, layout, stats, seed+i, poll, think, job_timeout)
+        for _ in range(sessions):
+            user.session()
+
+    start=time.perf_counter()
+    threads=[threading.Thread(target=simulate, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds=time.perf_counter()-start
+
+    callbacks={}
+    for name in sorted(set(stats.latency) | set(stats.errors)):
+        values=stats.latency.get(name, [])
+        callbacks[name]={'calls': len(values), 'errors': stats.errors.get(name, 0),
+                         'p50': percentile(values, 50) if values else None,
+                         'p95': percentile(values, 95) if values else None,
+                         'p99': percentile(values, 99) if values else None}
+    return {'users': users, 'seconds': seconds, 'sessions': stats.sessions, 'complete sessions': stats.complete,
+            'sessions/s': stats.sessions/seconds, 'requests/s': stats.requests/seconds, 'callbacks': callbacks}
+
+
+def git_commit()->str:
+    '''
+    Returns the commit the load test was run on (an empty string if it can't be found)
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Replays selection sessions of many users at once against the tool')
+    parser.add_argument('--users', type=int, default=8, help='number of simulated users running at once')
+    parser.add_argument('--sessions', type=int, default=5, help='number of sessions each user replays')
+    parser.add_argument('--url', default=None, help='url of a tool already running (by default the tool is started with gunicorn)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers of the started tool')
+    parser.add_argument('--threads', type=int, default=2, help='threads of each gunicorn worker of the started tool')
+    parser.add_argument('--poll', type=float, default=0.25, help='seconds between polls of a background callback')
+    parser.add_argument('--job-timeout', type=float, default=120, help='seconds before a background callback that never finishes is counted as an error')
+    parser.add_argument('--think', type=float, default=0, help='seconds a user waits between steps')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random choices made by the users')
+    parser.add_argument('--record', action='store_true', help='append the results to benchmarks/results/loadtest.jsonl')
+    parser.add_argument('--max-p95', type=float, default=None, help='fail if the p95 latency of any callback is more milliseconds than this')
+    args=parser.parse_args()
+
+    server=None
+    url=args.url
+    if url == None:
+        server, url=start_server(args.workers, args.threads)
+    try:
+        results=run(url.rstrip('/'), args.users, args.sessions, args.poll, args.think, args.seed, args.job_timeout)
+    finally:
+        if server != None:
+            server.terminate()
+            server.wait()
+
+    print(f'{results["users"]} users, {results["sessions"]} sessions ({results["complete sessions"]} complete) in {results["seconds"]:.1f} s: '
+          f'{results["sessions/s"]:.2f} sessions/s, {results["requests/s"]:.1f} requests/s\n')
+    print(f'{"callback (triggered by)":<70}{"calls":>7}{"errors":>7}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+    for name, r in results['callbacks'].items():
+        p=[f'{r[k]:>9.1f}' if r[k] != None else f'{"-":>9}' for k in ['p50', 'p95', 'p99']]
+        print(f'{name:<70}{r["calls"]:>7}{r["errors"]:>7}'+''.join(p))
+
+    if args.record:
+        os.makedirs(os.path.dirname(PATH_RESULTS), exist_ok=True)
+        with open(PATH_RESULTS, 'a') as f:
+            f.write(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(), 'sessions per user': args.sessions, **results})+'\n')
+
+    slow=[name for name, r in results['callbacks'].items() if args.max_p95 != None and r['p95'] != None and r['p95'] > args.max_p95]
+    if slow:
+        print('p95 latency more than', args.max_p95, 'ms:', ', '.join(slow))
+        sys.exit(1)
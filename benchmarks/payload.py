@@ -0,0 +1,88 @@
+'''
+Figure payload benchmark of the tool, run from the root of the repository with:
+    python benchmarks/payload.py
+
+Measures the figure sent to the browser with its values as JSON lists of floats (before) and as typed arrays (after, see figure_encoding.py)
+for the largest selections: one data item over all years for every state in the irrigation database (50 states x all census years), as
+    a line graph (one line per state) and a bar plot (states on the x axis), with large selection mode on and off, and an animated map and bar plot
+For each, the size of the serialized figure (and of it gzipped, as a server compressing its responses would send it)
+and how long serializing it takes (figure_json in figure_encoding.py, the best of --repeat runs)
+'''
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main_dash
+from src.figure_encoding import figure_json
+from src.visualization import make_line_graph, make_bar_plot, make_map_animation, make_bar_animation
+from large_selection import widest_data_item
+
+
+def build(viz_type:str, states:list[str], item:dict[str,str], large:bool, animate:bool):
+    '''
+    Makes the figure of viz_type ('Line Graph', 'Bar Plot', or 'Map') for the data item in item over every valid year for states (a list of state abbreviations),
+    animated over every year if animate is True
+
+    Returns the figure (a plotly.graph_objs._figure.Figure)
+    '''
+    db=main_dash.data_service.db
+    selection={'viz_type': viz_type, 'state_id': states, 'mult_dt_q': 'One Data Item', 'add_data_item': [], 'domain_category': [],
+               'stat_type': 'Sum', 'barax': 'States', 'line_n': 'Multiple Lines', 'animate': animate, **item}
+    selection['year']=db.resolve_selection(dict(selection, year=[]))['options']['year'] #every valid year
+    resolved=db.resolve_selection(selection)
+    resolved['selection']=selection
+    resolved['large']=large
+    assert resolved['complete'], 'selection is not complete'
+
+    params, final_results, encoded_answer=main_dash.get_final_results(resolved)
+    operation=db.which_statistic('Sum')
+    if viz_type=='Map':
+        return make_map_animation(params, final_results, operation)
+    if animate:
+        return make_bar_animation(params, final_results, operation)
+    if viz_type=='Line Graph':
+        return make_line_graph(params=params, y_data=final_results, operation=operation, s_multiple_or_one=encoded_answer, large=large)
+    return make_bar_plot(params, encoded_answer, final_results, operation, large=large)
+
+
+def measure(fig, typed_arrays:bool, repeat:int)->dict:
+    '''
+    Serializes fig with figure_json repeat times
+
+    Returns a dictionary of the size of the serialized figure and of it gzipped (in KB), and the fastest time it took to serialize (in milliseconds)
+    '''
+    times=[]
+    for _ in range(repeat):
+        start=time.perf_counter()
+        fig_json=figure_json(fig, typed_arrays)
+        times+=[(time.perf_counter()-start)*1000]
+    return {'size': len(fig_json)/1024, 'gzip': len(gzip.compress(fig_json.encode()))/1024, 'ms': min(times)}
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Measures the size and serialization time of figures with and without typed arrays')
+    parser.add_argument('--repeat', type=int, default=20, help='times each figure is serialized, the fastest is reported')
+    args=parser.parse_args()
+
+    tmp=tempfile.mkdtemp()
+    main_dash.create_app({'query_cache_size': 0, 'figure_cache_dir': None, 'figure_cache_size': 0, 'prefetch': False,
+                          'jobs_dir': os.path.join(tmp, 'jobs'), 'snapshot_path': os.path.join(tmp, 'startup.json')})
+    all_states=sorted(main_dash.data_service.db.get_states())
+    item=widest_data_item(main_dash.data_service.db)
+    print('data item:', item['data_item'], 'states:', len(all_states), '\n')
+
+    print(f'{"graph":<15}{"large":<7}{"KB before":>10}{"KB after":>10}{"gzip before":>12}{"gzip after":>11}{"ms before":>10}{"ms after":>10}')
+    for viz_type, large, animate in [('Line Graph', False, False), ('Line Graph', True, False), ('Bar Plot', False, False), ('Bar Plot', True, False),
+                                     ('Bar Plot', False, True), ('Map', False, True)]:
+        fig=build(viz_type, all_states, item, large, animate)
+        before=measure(fig, False, args.repeat)
+        after=measure(fig, True, args.repeat)
+        name=viz_type+(' (anim)' if animate else '')
+        print(f'{name:<15}{str(large):<7}{before["size"]:>10.1f}{after["size"]:>10.1f}{before["gzip"]:>12.1f}{after["gzip"]:>11.1f}{before["ms"]:>10.2f}{after["ms"]:>10.2f}')
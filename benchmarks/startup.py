@@ -0,0 +1,99 @@
+'''
+Startup benchmark of the tool, run from the root of the repository with:
+    python benchmarks/startup.py
+
+Each measurement is made in a new Python process so nothing is already imported:
+    import: time to import main_dash
+    create_app (cold snapshot): time for create_app when the startup snapshot has to be made (queries the irrigation database)
+    create_app (warm snapshot): time for create_app when the startup snapshot is read from disk
+    boot: import and create_app with a warm snapshot, what a worker not preloaded by gunicorn pays before serving its first request
+
+Prints the median of each over --runs runs. With --record, the results are appended to benchmarks/results/startup.jsonl so they can be tracked over time,
+and with --max-boot the script fails (exit code 1) if the median boot time is more seconds than given
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH_RESULTS=os.path.join(ROOT, 'benchmarks', 'results', 'startup.jsonl')
+
+#runs in the new process, prints the import and create_app times as json
+CHILD='''
+import json, sys, time
+t0=time.perf_counter()
+import main_dash
+t1=time.perf_counter()
+main_dash.create_app({'snapshot_path': sys.argv[1]})
+t2=time.perf_counter()
+print(json.dumps({'import': t1-t0, 'create_app': t2-t1}))
+'''
+
+
+def measure(snapshot_path:str)->dict[str,float]:
+    '''
+    Imports main_dash and creates the app in a new Python process, using the startup snapshot at snapshot_path
+
+    Returns a dictionary with the seconds taken to import ('import') and create the app ('create_app')
+    '''
+    out=subprocess.run([sys.executable, '-c', CHILD, snapshot_path], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(runs:int)->dict[str,float]:
+    '''
+    Measures startup runs times (an int), removing the startup snapshot before each cold measurement
+
+    Returns a dictionary of the median seconds of each measurement
+    '''
+    imports, cold, warm, boot=[], [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path=os.path.join(tmp, 'startup.json')
+        for _ in range(runs):
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            cold+=[measure(snapshot_path)['create_app']]
+            result=measure(snapshot_path)
+            imports+=[result['import']]
+            warm+=[result['create_app']]
+            boot+=[result['import']+result['create_app']]
+    return {'import': statistics.median(imports),
+            'create_app (cold snapshot)': statistics.median(cold),
+            'create_app (warm snapshot)': statistics.median(warm),
+            'boot': statistics.median(boot)}
+
+
+def git_commit()->str:
+    '''
+    Returns the commit the benchmark was run on (an empty string if it can't be found)
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Measures how long the tool takes to start')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs, the median of each measurement is reported')
+    parser.add_argument('--record', action='store_true', help='append the results to benchmarks/results/startup.jsonl')
+    parser.add_argument('--max-boot', type=float, default=None, help='fail if the median boot time is more seconds than this')
+    args=parser.parse_args()
+
+    results=run(args.runs)
+    for name, seconds in results.items():
+        print(f'{name:<28}{seconds:8.3f} s')
+
+    if args.record:
+        os.makedirs(os.path.dirname(PATH_RESULTS), exist_ok=True)
+        with open(PATH_RESULTS, 'a') as f:
+            f.write(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(), 'runs': args.runs, **results})+'\n')
+
+    if args.max_boot != None and results['boot'] > args.max_boot:
+        print(f'boot took {results["boot"]:.3f} s, more than {args.max_boot} s')
+        sys.exit(1)
@@ -0,0 +1,32 @@
+'''
+Configuration for serving the tool with gunicorn, run from the root of the repository with:
+    gunicorn
+(gunicorn reads this file by default). Settings can be changed with the environment variables below.
+'''
+import multiprocessing
+import os
+
+wsgi_app='wsgi:server'
+
+#only listens locally, the reverse proxy in front of the tool is what users connect to
+bind=os.environ.get('DVAT_BIND', '127.0.0.1:8050')
+
+#one worker per core by default, each callback queries the database and builds figures, so work is bound by the CPU
+workers=int(os.environ.get('DVAT_WORKERS', multiprocessing.cpu_count()))
+threads=int(os.environ.get('DVAT_THREADS', 2))
+timeout=int(os.environ.get('DVAT_TIMEOUT', 120))
+
+#creates the app (and the irrigation database and its indexes) once in the parent process before the workers are forked,
+#so every worker shares it instead of setting it up itself
+preload_app=True
+
+
+def post_fork(server, worker):
+    '''
+    Warms up each worker once it is forked: opens its own connection to the irrigation database and runs the queries of a new page,
+    starts the kaleido renderers figures are saved with, and starts the fork server background jobs are started from
+    '''
+    import main_dash
+    main_dash.data_service.warm_up()
+    main_dash.export_service.start()
+    main_dash.job_manager.start()
@@ -1,37 +1,87 @@
+import atexit
+import hashlib
+import json
+import os
+import diskcache
+from functools import wraps
 import pandas as pd
-from dash import Dash, dcc, html, Input, Output, callback, ctx
+from dash import Dash, dcc, html, dash_table, Input, Output, State, Patch, callback, clientside_callback, ClientsideFunction, ctx, no_update
 import dash_bootstrap_components as dbc
+from flask import Response, request
 import dash_html_components as html
-import plotly.express as px
-from src.Irr_DB import Irr_DB
-from src.data_table import get_statistics
+from src.Irr_DB import PATH_DB
+from src.data_service import DataService
+from src.export_service import ExportService, PATH_EXPORTS, PATH_TABLES, EXPORT_FORMATS, compress
+from src.table_export import installed, stream_table, table_extension
+from src.data_table import get_statistics, get_matrix_statistics
+from src.figure_cache import selection_key
+from src.figure_encoding import figure_json
+from src.figure_patch import figure_patch
+from src.job_manager import JobManager
+from src.metrics import CallbackMetrics
+from src.prefetch import Prefetcher
 from src.visualization import *
-from plotly.io import write_image
-from typing import Union, Tuple
-
-##setting up data table file name for when the user wants to look at a data table representative of the specifications they set when using the tool
-PATH_DT="user_results/tables/table_"
-
-##setting up figure file name for when the user wants their created visualizations to be saved as a png to their computer
-PATH_FIG="user_results/figures/figure_"
-
-
-
-# Creates the application, sets bootstrap components theme
-app = Dash(__name__, external_stylesheets=[dbc.themes.LITERA])
-
-# Title (will appear in the browser tab)
-app.title = 'Irrigation DVAT'
-
-##Prepping the first checklist (states) that is not dynamic to the previous selections made by the user, needs to be in the format of a list of dictionaries
-state_layout=[] 
-for i in Irr_DB().get_states(): #retrieves state abbreviation data stored in the irrigation database
-    single_state={'label': i, 'value': i} #for each item in the checklist, the state abbreviation is both the label presented to the user and its value 
-    state_layout+=[single_state]
-
-def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checklist, dcc.Dropdown, html.Div]]:
+from typing import Union, Tuple, Callable
+
+##setting up the folders the background callbacks (generating the graph and data table) keep their jobs in, and the figures they build are cached in
+PATH_JOBS="user_results/.cache/jobs"
+PATH_FIG_CACHE="user_results/.cache/figures"
+
+##setting up the file the startup snapshot (what the layout needs from the irrigation database) is saved in, see startup_snapshot in data_service.py
+PATH_SNAPSHOT="user_results/.cache/startup.json"
+
+##default configuration of the app made by create_app, any of these can be overridden by the config passed to create_app
+#path_db: path to the irrigation database (built from the .csv files in the data folder if it doesn't exist yet)
+#query_cache_size, figure_cache_size: how many query results and figures to keep cached (figure_cache_size only applies if figure_cache_dir is None)
+#figure_cache_dir: folder the figures are cached in, shared by every process serving the app
+#jobs_dir: folder the background callbacks keep their jobs in, shared by every process serving the app
+#snapshot_path: file the startup snapshot is saved in
+#export_dir: folder figures are exported to (see export_service.py), export_processes: how many kaleido renderers are kept running to export figures
+#metrics: whether every server side callback is timed and the metrics served on the /metrics route (see metrics.py)
+#slow_callback_seconds: callbacks taking longer than this many seconds are logged as warnings (None to never log)
+#prefetch: whether the next steps of each user's selection are run ahead of time (see prefetch.py), prefetch_workers: how many low priority threads run them
+#typed_arrays: whether the values of every figure's traces are sent to the browser as binary typed arrays rather than lists of floats (see figure_encoding.py),
+#   off by default since the traces of this database are mostly too short to gain from it (see benchmarks/payload.py)
+#archive: whether figures and data tables the users download are also saved on the server (in export_dir and table_dir), off by default so nothing is written to disk
+DEFAULT_CONFIG={'path_db': PATH_DB,
+                'query_cache_size': 512,
+                'figure_cache_size': 128,
+                'figure_cache_dir': PATH_FIG_CACHE,
+                'jobs_dir': PATH_JOBS,
+                'snapshot_path': PATH_SNAPSHOT,
+                'export_dir': PATH_EXPORTS,
+                'export_processes': 2,
+                'metrics': True,
+                'slow_callback_seconds': None,
+                'prefetch': True,
+                'prefetch_workers': 1,
+                'typed_arrays': False,
+                'archive': False,
+                'table_dir': PATH_TABLES}
+
+##The data service of the app, set once by create_app, every callback queries the irrigation database through data_service.db rather than constructing Irr_DB() itself
+data_service=None
+
+##The export service of the app, set once by create_app, figures are saved through it
+export_service=None
+
+##Whether figures are serialized with typed arrays, set once by create_app
+typed_arrays=False
+
+##The prefetcher of the app, set once by create_app (None if prefetching is off), every resolved selection is scheduled to it
+prefetcher=None
+
+##The manager of the background jobs (display_graph, save_figure, display_table, export_table), set once by create_app
+job_manager=None
+
+##The metrics of the server side callbacks, set once by create_app (None if metrics are off), every server side callback is measured through it (see measured)
+callback_metrics=None
+
+
+def layout(state_layout:list[dict[str,str]], initial_selection:dict)->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checklist, dcc.Dropdown, html.Div]]:
     ''''
     Sets up the layout for the entire Dash app
+    Takes in the items of the state checklist (state_layout, a list of dictionaries) and the resolved selection before the user makes any selections (initial_selection)
     Returns a list of children that an html.Div takes as argument. The order in which the children are added determines their order in the webpage. 
     The children consist of the types html.H1, html.Label, html.H6, dbc.RadioItems, 
         dbc.Checklist, dcc.Dropdown, and html.Div
@@ -55,7 +105,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     children +=[wel_head]
 
     #Text for welcome message
-    wel_message=html.Label('After you make a selection for a certain category, a new selection or question to answer will pop up in order to filter the data. For checklist items, the maximum number you can select is 5, with the exception of the additional data item section where the limit is 4, for effective visualization purposes. The final items that should pop up after you make all your data specifications are buttons allowing you to generate the graph, save it (as a .png), and generate the associated data table (which will also save it as a .csv). Before you can make a visualization or data table, you will be prompted to choose a statistic to be computed (average, sum, maximum, minimum) over the values of data you specified. The tool may ask you for which piece of data to compute the statistic over, but otherwise infers it based on the amount of items you chose for a particular category. If you do not want a visualization but a data table, you still must choose a type of graph in order to tell the tool how to compute your chosen statistic.')
+    wel_message=html.Label('After you make a selection for a certain category, a new selection or question to answer will pop up in order to filter the data. For checklist items, the maximum number you can select is 5, with the exception of the additional data item section where the limit is 4, for effective visualization purposes. Turning on large selection mode lifts these limits, so any number of states, data items, domain categories, and years can be chosen. The final items that should pop up after you make all your data specifications are buttons allowing you to generate the graph, download it (as a .png, .svg, or .pdf, optionally compressed with gzip), and generate the associated data table (which you can then download as a .csv, Parquet, Excel, or JSON Lines file, compressed with gzip or zstd if you choose, along with the raw rows of data behind it). Before you can make a visualization or data table, you will be prompted to choose a statistic to be computed (average, sum, maximum, minimum, percent change, annual growth rate, or ratio) over the values of data you specified. Percent change and annual growth rate are offered when the graph compares more than one year. If you choose ratio, one more step asks for the data item (with its commodity) to divide by. The tool may ask you for which piece of data to compute the statistic over, but otherwise infers it based on the amount of items you chose for a particular category. If you do not want a visualization but a data table, you still must choose a type of graph in order to tell the tool how to compute your chosen statistic.')
     children +=[wel_message]
 
     #Break to separate text
@@ -78,24 +128,36 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     r_space=html.Div([html.Br()])
     children+=[r_space]
 
-    #Text for warning users to rename file names
-    rename=html.Label('After you save a figure or data table (found in either the figures or tables folders in the user_results folder), you should rename them so that they are not overwritten in your next session using this tool.', style={'color':'#d1251a'})
-    children +=[rename]
+    #Text telling users where saved figures and data tables go
+    downloads=html.Label('Figures and data tables you save are downloaded by your browser (usually to your downloads folder), each named by a hash of its content so downloads never overwrite each other. Data tables can be downloaded as CSV, Parquet, Excel, or JSON Lines, compressed with gzip or zstd (Parquet files compress each column with it, snappy if none is chosen). Turn on the gzip switch to download figures compressed.')
+    children +=[downloads]
 
     #Break to separate text
     e_space=html.Div([html.Br()])
     children+=[e_space]
 
 
-    #Radio item to choose line or bar plots, formatted horizontally
+    #Radio item to choose line or bar plots, or a map of every state, formatted horizontally
     viz_label=html.H6('What type of visualization do you want?')
-    viz_radio=dbc.RadioItems(id="viz-r", options=["Line Graph", "Bar Plot"], value="", inline=True) 
-    ##when selected, viz-r value is set to either 'Line Graph' or 'Bar Plot'
+    viz_radio=dbc.RadioItems(id="viz-r", options=["Line Graph", "Bar Plot", "Map"], value="", inline=True) 
+    ##when selected, viz-r value is set to either 'Line Graph', 'Bar Plot', or 'Map'
+    ##a map shows one data item (and one domain category) for every state, so the states and years aren't chosen, a slider under the map chooses the year shown
     children +=[viz_label, viz_radio]
+
+    ##Switch for large selection mode, off by default
+    #when on, the user isn't limited in how many states, additional data items, domain categories, and years they choose (limits set in assets/selection.js),
+    #and the graph is drawn so that it stays responsive with many states and years (see make_line_graph and make_bar_plot in visualization.py)
+    large_switch=dbc.Switch(id='large-mode', label='Large selection mode (choose any number of states, data items, domain categories, and years)', value=False)
+    children +=[large_switch]
+
+    ##Switch for animating a bar plot or map over every year, off by default, only displayed for bar plots and maps (set by the callback over function display_animate)
+    #an animated bar plot or map shows one data item (and one domain category) for each state, the years aren't chosen since every year is a frame of the animation
+    animate_switch=dbc.Switch(id='animate-mode', label='Animate over every year (bar plots and maps)', value=False, style={'display': 'none'})
+    children +=[animate_switch]
     
 
     ##State checklist , displayed horizontally, no initial values chosen, the items user can choose from is state layout, the states a user can choose to visualize irrigation data from
-    #User limited to 5 choices with callback over function update_multi_options(value, viz_type), whether or not this section is displayed controlled by same callback 
+    #User limited to 5 choices (unless in large selection mode) with callback over function update_multi_options(value, viz_type, large), whether or not this section is displayed controlled by same callback 
     state_cl_label=html.H6('Select States', id='state-label') #introduces state section
     state_cl=dbc.Checklist(id='state-cl', 
         options=state_layout,
@@ -105,7 +167,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
 
 
     # First dropdown menu, allows user to select a commodity (not affected by previous user choices of visualization type and state(s))
-    # Options and whether or not displayed determined by callback function display_coms(state_id)
+    # Options and whether or not displayed determined by callback function display_coms(resolved)
     com_label = html.H6('Select a commodity', id='com-label') ##introduces commodity section 
     com_dd = dcc.Dropdown(id='com-dd', 
                           options=[''] , 
@@ -114,7 +176,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     children += [com_label, com_dd]
  
     # Second dropdown menu, allows user to select a domain, options based on commodity and state(s) already chosen by user
-    #Option and whether or not displayed determined by callback over function update_doms(state_id, commodity)
+    #Option and whether or not displayed determined by callback over function update_doms(resolved)
     dom_label = html.H6('Select a domain', id='dom-label') ##introduces domain section
     dom_dd = dcc.Dropdown(id='dom-dd', 
                              options=[],
@@ -124,7 +186,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
 
 
     #Third dropdown menu, allows user to select a data item, options based on the commodity, domain, and state(s) chosen by the user
-    # Options and whether or not displayed determined by callback over function update_dts(state_id,commodity, domain)
+    # Options and whether or not displayed determined by callback over function update_dts(resolved)
     dt_label = html.H6('Select a data item', id='dt-label') ##introduces data item section
     dt_dd = dcc.Dropdown(id='dt-dd', 
                              options=[], #needs a list 
@@ -135,7 +197,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
 
     #If user chooses TOTAL as the domain, the only domain categories possible to choose from are named UNSPECIFIED which is unhelpful. 
     #To combat this issue, this question asks the user if they want to visualize multiple data items that use the same units as the one they initially picked, or just one data item
-    #Options 'Multiple Data Items' and 'One Data Item' are set by callback over function ask_mult_dt(domain, data_item), whether they are displayed or not is determined in same callback
+    #Options 'Multiple Data Items' and 'One Data Item' are set by callback over function ask_mult_dt(resolved), whether they are displayed or not is determined in same callback
     #If user chooses 'One Data Item' the next selection possible is years. If user chooses 'Multiple Data Items' the user will be presented with the next item (id = 'tot-dom-dt')
     mult_dt_r_label=html.H6('Do you want to visualize/analyze multiple data items, or one?', id='mult-dt-r-label')
     mult_dt_r=dbc.RadioItems(id="mult-dt-r", options=[''], value='', inline=True)
@@ -143,7 +205,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
 
 
     ##Presents a checklist of valid data items to choose from in the occassion that user selected total as domain, and wants to compare multiple data items 
-    ##valid options dependent on user selections of state(s), commodity, domain, and data item, options are then set by callback over function update_mult_dts_items(mult_dt_q, state_id, commodity, domain, data_item, init_vals)
+    ##valid options dependent on user selections of state(s), commodity, domain, and data item, options are then set by callback over function update_mult_dts_items(resolved)
     ##Limited to 4 choices (makes it 5 including the data item chosen in the data item section) through a callback function update_mult_dts_items(mult_dt_q, state_id,commodity, domain, data_item, init_vals)
     tot_dom_dt_label=html.H6('Select Additional Data Items', id='tot-dom-dt-label') ##introduces additional data item section
     tot_dom_dt=dbc.Checklist(id='tot-dom-dt',
@@ -155,7 +217,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
 
     ##checklist for domain_categories, will only appear if user didn't pick TOTAL as the domain
     #valid domain categories to chose from are dependent on state(s), commodity, domain, and data item previously selected by user
-    #valid options set by callback over function update_dc(state_id,commodity, domain, data_item, init_vals)
+    #valid options set by callback over function update_dc(resolved)
     # user limited to select 5 options in same callback 
     dc_label=html.H6('Select domain categories', id='dc-label') ##introduces domain category section
     dc_cl=dbc.Checklist(id='dc-cl',
@@ -164,7 +226,7 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     children += [dc_label, dc_cl]
 
     ##checklist for user to choose valid years, valid years are dependent on state(s), commodity, domain, data item(s), and possibly domain category(ies) previously selected by the user
-    ##valid options and whether they are displayed or not determined by callback over function update_years(mult_dt_q, state_id, commodity, domain, data_item, add_data_item, domain_category, init_vals)
+    ##valid options and whether they are displayed or not determined by callback over function update_years(resolved)
     # user limited to select 5 options in same callback 
     year_cl_label=html.H6('Select Years', id='year-cl-label') ##introduces year section
     year_cl=dbc.Checklist(id='year-cl',
@@ -175,12 +237,19 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
 
     
     # Asks what statistic user wants to visualize/analyze
-    ##Creates 4 radio buttons user can select from (can only select 1) that describe the statistic they want to implemented over the data the user specified (Minimum, Maximum, Average, Sum)
-    #Sets options with callback over function ask_stat(mult_dt_q, state_id, commodity,year, domain, data_item, add_data_item, mult_dt_r, domain_category)
+    ##Creates radio buttons user can select from (can only select 1) that describe the statistic they want to implemented over the data the user specified (Minimum, Maximum, Average, Sum),
+    #or a statistic derived from the sum (Percent Change and Annual Growth Rate when there is more than one year to compare, Ratio to another data item), see derived_query in Irr_DB.py
+    #Sets options with callback over function ask_stat(resolved)
     statq_r_label=html.H6('What statistic do you want to visualize/analyze?', id='statq-r-label') ##introduces choose statistic section
     statq_r=dbc.RadioItems(id="statq-r", options=[''], value='', inline=True)
     children += [statq_r_label, statq_r]
 
+    # If the user chose Ratio, asks what data item (with domain TOTAL, of any commodity) the sum is divided by, ex. ACRES IRRIGATED for expenses per acre
+    #Options and whether or not displayed determined by callback over function ask_ratio_item(resolved)
+    ratio_label=html.H6('Select the data item to divide by', id='ratio-label')
+    ratio_dd=dcc.Dropdown(id='ratio-dd', options=[''], value='', optionHeight=50)
+    children += [ratio_label, ratio_dd]
+
 
     # If bar plot chosen, where either (number states chosen >1 and number of years chosen >1) OR (number of states chosen =1 and number of years chosen =1)
     # and domain=TOTAL and one data item chosen 
@@ -204,26 +273,65 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     
 
     ##generate graph button, presents graph associated with past user data specifications once clicked
-    #disabled property determined by callback over function display_graph
+    #disabled property determined by callback over function button_states
     graph_button=dbc.Button("Generate Graph", id='graph-button', n_clicks=0,className="me-1")
 
  
 
-    ##save figure button (saves the graph obtained by the user as .png)
-    ##intially disabled because user must click the generate graph button before clicking this button (disabled property determined by callback over function display_save_fig_button)
+    ##save figure button (downloads the graph obtained by the user in the format chosen below)
+    ##intially disabled because user must click the generate graph button before clicking this button (disabled property determined by callback over function button_states)
     save_fig_button=dbc.Button("Save Figure", id='save-fig-button', n_clicks=0, disabled=True,className="me-1")
+
+    ##format the figure is saved as, png by default
+    fig_format_r=dbc.RadioItems(id='fig-format-r', options=[{'label': fmt.upper(), 'value': fmt} for fmt in EXPORT_FORMATS], value='png', inline=True,
+                                className="d-inline-block me-2")
     
    
-    #creates a button for user to click if they want to download a .csv version and see the results they obtain from all their specifications on the data
-    #whether or not button is disabled is determined by callback over function display_table (disabled after clicking once for a specific set of selections made by the user)
-    data_table_button=dbc.Button("Generate Data Table", id='data-table-button', n_clicks=0)
-    
-    #creates a container for all 3 buttons so that they can be displayed horizontally with space in between them (why graph-button and save-fig-button have the className me-1)
-    #whether or not all 3 buttons are displayed determiend by callback over function display_g_or_dt_buttons (dependent on whether all required data specifications have been made by the user)
-    fig_button_group=html.Div([graph_button, save_fig_button, data_table_button], id='fig-bt-div')
-    
-    #adds container of 3 buttons to children 
+    #creates a button for user to click if they want to see the results they obtain from all their specifications on the data
+    #whether or not button is disabled is determined by callback over function button_states (disabled after clicking once for a specific set of selections made by the user)
+    data_table_button=dbc.Button("Generate Data Table", id='data-table-button', n_clicks=0, className="me-1")
+
+    ##export data table button (downloads the data table obtained by the user in the format and compression chosen below)
+    ##intially disabled because user must click the generate data table button before clicking this button (disabled property determined by callback over function button_states)
+    export_table_button=dbc.Button("Export Data Table", id='export-table-button', n_clicks=0, disabled=True, className="me-1")
+
+    ##format and compression the data table is downloaded as, csv without compression by default
+    #formats and compressions needing a package that isn't installed (see OPTIONAL_MODULES in table_export.py) are shown but can't be chosen
+    table_format_r=dbc.RadioItems(id='table-format-r', options=[{'label': label, 'value': fmt, 'disabled': not installed(fmt)}
+                                                                for label, fmt in [('CSV', 'csv'), ('PARQUET', 'parquet'), ('EXCEL', 'xlsx'), ('JSONL', 'jsonl')]],
+                                  value='csv', inline=True, className="d-inline-block me-2")
+    table_compression_r=dbc.RadioItems(id='table-compression-r', options=[{'label': label, 'value': compression, 'disabled': not installed(compression)}
+                                                                          for label, compression in [('NO COMPRESSION', 'none'), ('GZIP', 'gzip'), ('ZSTD', 'zstd')]],
+                                       value='none', inline=True, className="d-inline-block")
+    
+    #creates a container for all 4 buttons so that they can be displayed horizontally with space in between them (why every button but the last has the className me-1)
+    #whether or not all 4 buttons are displayed determiend by callback over function display_g_or_dt_buttons (dependent on whether all required data specifications have been made by the user)
+    ##whether the downloaded figure is compressed with gzip, off by default
+    gzip_switch=dbc.Switch(id='gzip-switch', label="Compress figures (gzip)", value=False, className="d-inline-block ms-2")
+
+    ##link downloading every raw row of tMain behind the user's selections (rather than the aggregate) in the data table's format and compression, streamed by the export_raw route
+    #only displayed once the selections are complete and the format can be streamed (set by the clientside callback over raw_export_link in assets/results.js)
+    raw_export_link=html.A("Export Raw Data", id='raw-export-link', href='', download='', className="btn btn-outline-primary ms-2", style={'display': 'none'})
+
+    fig_button_group=html.Div([graph_button, save_fig_button, fig_format_r, data_table_button, export_table_button, table_format_r, table_compression_r, gzip_switch, raw_export_link], id='fig-bt-div')
+    
+    #adds container of 4 buttons to children 
     children+=[fig_button_group]
+
+    ##progress of the callbacks started by the buttons, each progress bar is only displayed while its job is running (set by the callbacks over functions display_graph, display_table, save_figure and export_table)
+    #the labels under them tell the user the name of the figure or data table they downloaded
+    graph_progress=dbc.Progress(id='graph-progress', value=0, style={'display': 'none'}, className="mt-2")
+    table_progress=dbc.Progress(id='table-progress', value=0, style={'display': 'none'}, className="mt-2")
+    save_fig_progress=dbc.Progress(id='save-fig-progress', value=0, style={'display': 'none'}, className="mt-2")
+    export_table_progress=dbc.Progress(id='export-table-progress', value=0, style={'display': 'none'}, className="mt-2")
+    save_fig_status=html.Label(id='save-fig-status', className="me-2")
+    export_table_status=html.Label(id='export-table-status')
+    children+=[html.Div([graph_progress, table_progress, save_fig_progress, export_table_progress, save_fig_status, export_table_status])]
+
+    ##send the figure and data table straight to the user's browser as downloads (set by the callbacks over functions save_figure and export_table)
+    fig_download=dcc.Download(id='fig-download')
+    table_download=dcc.Download(id='table-download')
+    children+=[fig_download, table_download]
     
     #adds space between the button group and the graph or data table the user specifies they want to see 
     mes_space=html.Div([html.Br()])
@@ -231,9 +339,17 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     
 
     ##adds graph to screen, whether or not displayed is determined by callback over function display_graph (dependenet on whether all previosu selections have been made and the button 'Generate Graph' has been clicked)
-    graph=html.Div([dbc.Row([dbc.Col(dcc.Graph(id="graph",figure={}), width={ "offset": 1})])]) #sets an offset to center the graph in a typical webpage
+    graph=html.Div([dbc.Row([dbc.Col(dcc.Graph(id="graph",figure={}, style={'display': 'none'}), width={ "offset": 1})])]) #sets an offset to center the graph in a typical webpage
     children+=[graph]
 
+    ##slider choosing the year a map shows, only displayed under a map that isn't animated (set by the callback over function display_graph), its years are set by map_years in assets/results.js
+    map_year=html.Div([dcc.Slider(id='map-year', min=0, max=0, step=None, marks={}, value=None)], id='map-year-div', style={'display': 'none', 'width': '940px'})
+    children+=[map_year]
+
+    ##holds the key (see selection_key in figure_cache.py) of the figure the graph shows, so display_graph can send only what changed from it
+    graph_key=dcc.Store(id='graph-key')
+    children+=[graph_key]
+
     ##adds space in in between graph and title of data table if user chooses to display both the graph and data table corresponding to their selections
     mes_space1=html.Div([html.Br()])
     children+=[mes_space1]
@@ -241,1174 +357,736 @@ def layout()->list[Union[html.H1,html.Label, html.H6, dbc.RadioItems, dbc.Checkl
     ##adds data table based on user selections and its title to screen, data table and header over it (and whether displayed or not) are set in callback over function
     # because they are dependent on previous selections made by the user, and whether the 'Generate Data Table' button has been clicked
 
-    table=html.Div(id="table-container")
+    table=html.Div(id="table-container", style={'display': 'none'})
     children+=[table]
-    
-    return children
 
-app.layout = html.Div(id='main-div', children=layout(), style={'margin': '20px'}) #add layout to the webpage, specifying margin aroudn items to be 20px
+    ##holds the user's selections once they are resolved by the callback over function resolve_selection, every section after the state section reads its options from here
+    selection_store=dcc.Store(id='selection-store', data=initial_selection)
+    children+=[selection_store]
 
+    ##holds an id for the page the app is open in (set in the browser by the clientside callback over session_id), so the prefetcher only keeps prefetching each page's latest selection
+    session_store=dcc.Store(id='session-id')
+    children+=[session_store]
+    
+    return children
 
-#===================Callbacks=======================
 
+def create_app(config:dict=None)->Dash:
+    '''
+    Creates the Dash app, takes in a dictionary config overriding any of the settings in DEFAULT_CONFIG (None keeps all the defaults)
 
+    Starts the data service once for the whole app (building the irrigation database and its indexes if needed), then builds the layout from its startup snapshot
+    (only queries the database if it changed since the snapshot was saved).
+    When served by a multi-process server that loads the app before forking its workers (see wsgi.py and gunicorn.conf.py),
+    this is done once in the parent process and every worker shares the result, each worker then opens its own connections to the database
 
-##State section (user can choose multiple, selection is a list of strings)
-@app.callback(
-    Output("state-cl", "options"),
-    Output("state-cl", "style"),
-    Output("state-label", "style"),
-    Input("state-cl", "value"), 
-    Input("viz-r", "value")
-)
-def update_multi_options(value:list[str], viz_type:str)->Tuple[list[dict[str,str]], dict[str,str], dict[str,str]]: ##limiting state layout to only 5 possible states to pick
-    '''
-    Takes in list of strings detailing the states already chosen by the user as value, and the visualization type (passed in as string viz_type)if the user has specified it yet (its default value is '')
-    If the visualization type hasn't been chosen yet, state section is not displayed
-    If the type has been chosen, limits the amount of states the user can choose to 5 by resetting the options for 'state-cl' to have disabled items if 5 have already been clicked
+    The callbacks are registered when main_dash is imported, so they apply to every app made here
 
-    Returns the options for 'state-cl' as a list of dictionaries of strings (both as keys an values)
-    For whether or not the state section is displayed, returns its style as a dictionary of strings twice 
-        (once for the header and the other for actual checklist), where the key is 'style' and the value is either 'inherit' (displays as a checklist) or 'none'(doesn't display)
+    Returns the Dash app (its Flask server is app.server), debug is left off, only running main_dash.py directly turns it on
     '''
-    
-    style={'display':'none'}
-    options = state_layout #already created
-    if viz_type!="": #if no visualization type is chosen yet, the choose state section will not be displayed
-        style={'display':'inherit'} #style of checklists
-        if len(value) >= 5: #limits the amount of states a user can click to 5 by using dictionary comprehension, 
-            #sets all other items to disabled if limit of 5 has been reached
-            options = [
-                {
-                    "label": option["label"],
-                    "value": option["value"],
-                    "disabled": option["value"] not in value,
-                }
-                for option in options  
-            ]
-    return options, style, style
-
-
-
-#Commodity section (user can only choose one, when chosen is a string)
-@app.callback(
-    Output("com-dd", "options"),
-    Output("com-dd", "style"),
-    Output("com-label", "style"),
-    Input("state-cl", "value")
-) 
-
-def display_coms(state_id:list[str])->Tuple[list[str], dict[str,str], dict[str, str]]:
-    '''
-    Takes in the user's choice of state(s) as a list of strings, if no states have been chosen it is an empty string
-    If the user has done a selection of states, the commodity dropdown and header are then displayed to the user, 
-    with options being the results from get_commodity() in the Irr_DB class found in Irr_DB.py
+    global prefetcher, job_manager
+    config=dict(DEFAULT_CONFIG, **(config or {}))
+    start_services(config)
 
-    Returns a list of strings (to be the options for comm-dd the commodity dropdown), and two dictionaries (both key and value are strings) detailing the styling of the dropdown (whether its displayed or not)
-    '''
-    
-    vals=Irr_DB().get_commodity() #get list of values to be chosen as commodity
-    if len(state_id): #checking if any items are selected in the state field by the user
-        style = {'display': 'block'} #display commodity field if states have been chosen
-    else:
-        style = {'display': 'none'} #don't display if states haven't been chosen
-        vals=[]
-    return ['']+vals, style, style
+    ##Runs the next steps of each user's selection ahead of time on low priority threads, so Generate Graph is usually a cache hit
+    prefetcher=None
+    if config['prefetch']:
+        prefetcher=Prefetcher(data_service, final_results=get_final_results, figure=get_figure_json, workers=config['prefetch_workers'])
+        atexit.register(prefetcher.stop)
 
+    ##Runs the slow callbacks (display_graph, save_figure, display_table, export_table) as background jobs in their own processes, so they don't hold up the callbacks of the other sections
+    #a job's result is kept for 5 minutes (keyed by the job's inputs and when the database was last changed) rather than removed once it is first fetched,
+    #so users who start the same job at the same time (same selections and clicks) all get its result instead of waiting on it forever
+    #each job runs in a process started from a fork server that has already imported main_dash (and plotly express), and sets up the services the callbacks need first (see job_manager.py)
+    db_mtime=os.path.getmtime(config['path_db'])
+    job_manager=JobManager(diskcache.Cache(config['jobs_dir']), setup=start_services, setup_args=(config,), preload=['main_dash', 'plotly.express'],
+                           cache_by=[lambda: db_mtime], expire=300)
 
-# Domain section (user can only choose one, when chosen is a string)
+    # Creates the application, sets bootstrap components theme
+    app = Dash(__name__, external_stylesheets=[dbc.themes.LITERA], background_callback_manager=job_manager)
 
-@callback(Output('dom-dd', 'options'),
-        Output('dom-dd', 'style'), 
-          Output('dom-label', 'style'), 
-          Input('state-cl', 'value'),
-          Input('com-dd', 'value')
-          )
-def update_doms(state_id:list[str],commodity: str)-> Tuple[list[str], dict[str, str], dict[str, str]]:
-    '''
-    Takes in values for state(s) as state_id (a list of strings) that were chosen by the user in a checklist
-    and takes in the commodity chosen via dropdown (stored as a string called commodity), this is because domain options are dependent on these previous selections
+    # Title (will appear in the browser tab)
+    app.title = 'Irrigation DVAT'
 
-    Queries the irrigation database, using get_domains function in the Irr_DB class, according to the available specifications, to get valid domains to choose from 
-    if one of the parameters passed in has not been filled out by the user, the results from the query will be [] with no length
-    
-    Checks whether results of the query to the database have any length (more than []), if there are items in the results (called vals in this function), the dropdown to choose a domain is presented to the user
-    If the results from the query are [], the dropdown is not displayed 
+    ##Serves the metrics of the server side callbacks (see start_services) in the Prometheus text format on the /metrics route of the app
+    if callback_metrics!=None:
+        callback_metrics.serve(app.server)
 
-    Returns a list of strings (to be the options for dom-dd the domain dropdown), and two dictionaries (both key and value are strings) detailing the styling of the dropdown (whether its displayed or not)
-    '''
-    insert_dict={'state_id':state_id,'commodity': [commodity]} #each value must be a list of strings
-    vals = Irr_DB().get_domains(insert_dict)
-    if len(vals): #if results exist when querying the database
-        style = {'display': 'block'} #display dropdown to user 
-    else:
-        style = {'display': 'none'}#don't display dropdown to user
-    return ['']+vals, style, style
+    ##Renders the figures saved by background jobs in the kaleido renderers of the process serving the app (see serve in export_service.py)
+    export_service.serve(app.server)
 
+    snapshot=data_service.startup_snapshot(config['snapshot_path'])
 
-#Data Item section (user can only choose one, when chosen is a string)
+    ##Prepping the first checklist (states) that is not dynamic to the previous selections made by the user, needs to be in the format of a list of dictionaries
+    state_layout=[] 
+    for i in snapshot['states']: #state abbreviation data stored in the irrigation database
+        single_state={'label': i, 'value': i} #for each item in the checklist, the state abbreviation is both the label presented to the user and its value 
+        state_layout+=[single_state]
 
-@callback(Output('dt-dd', 'options'),
-        Output('dt-dd', 'style'),
-        Output('dt-label', 'style'),
-          Input('state-cl', 'value'),
-          Input('com-dd', 'value'),
-          Input('dom-dd', 'value')
-          )
-def update_dts(state_id:list[str],commodity: str, domain: str)-> Tuple[list[str], dict[str, str], dict[str, str]]:
+    ##Streams the raw rows behind the user's selections as a file (see export_raw), under the same prefix as the app's own routes
+    app.server.add_url_rule(app.config.routes_pathname_prefix+'export/raw', 'export_raw', export_raw)
 
-    '''
-    Takes in the previous selections by the user: state(s) with state_id (a list of strings), commodity chosen with commodity (a string), domain chosen with domain (a string)
-    This is because data item selection is dependent on state(s), commodity, and domain specified by the user
+    app.layout = html.Div(id='main-div', children=layout(state_layout, snapshot['initial_selection']), style={'margin': '20px'}) #add layout to the webpage, specifying margin aroudn items to be 20px
+    return app
 
-    Queries the irrigation database, using get_data_items function in the Irr_DB class, according to the available specifications, to get valid data items to choose from 
-    if one of the parameters passed in has not been filled out by the user, the results from the query will be [] with no length
 
-    Checks whether results of the query to the database have any length (more than []), if there are items in the results (called vals in this function), the dropdown to choose a data item is presented to the user
-    If the results from the query are [], the dropdown is not displayed 
-    
-    Returns a list of strings (to be the options for dt-dd the data item dropdown), and two dictionaries (both key and value are strings) detailing the styling of the dropdown (whether its displayed or not)
+def start_services(config:dict)->None:
     '''
+    Sets up what the callbacks need in the current process from config (a dictionary, DEFAULT_CONFIG with any settings overridden):
+    the data service, the export service, whether figures are serialized with typed arrays, and the metrics of the callbacks
+    Called by create_app, and by each background job before it runs, since a job runs in a process of its own that doesn't have the app's state (see JobManager in job_manager.py)
 
-    insert_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain]} #each value must be a list of strings
-    vals = Irr_DB().get_data_items(insert_dict)
-    if len(vals): #if results exist when querying the database
-        style = {'display': 'block'} #display dropdown to user
-    else:
-        style = {'display': 'none'} #don't display dropdown to user
-
-    return ['']+vals, style, style
+    Returns None
+    '''
+    global data_service, export_service, typed_arrays, callback_metrics
+    typed_arrays=config['typed_arrays']
+
+    data_service=DataService(path_db=config['path_db'],
+                             query_cache_size=config['query_cache_size'],
+                             figure_cache_size=config['figure_cache_size'],
+                             figure_cache_dir=config['figure_cache_dir'])
+    data_service.start()
+    atexit.register(data_service.stop) #closes the connections to the database when the app shuts down
+
+    ##The kaleido renderers of the export service are only started once a figure is first saved (or a worker is warmed up, see gunicorn.conf.py)
+    #background jobs queue the figures they save through jobs_dir, to be rendered by the renderers of a process serving the app
+    export_service=ExportService(export_dir=config['export_dir'], processes=config['export_processes'], archive=config['archive'], table_dir=config['table_dir'],
+                                 jobs_dir=config['jobs_dir'])
+    atexit.register(export_service.stop)
+
+    ##Times every call of a server side callback where it runs, background jobs send the calls they time through jobs_dir
+    callback_metrics=None
+    if config['metrics']:
+        callback_metrics=CallbackMetrics(slow_threshold=config['slow_callback_seconds'], jobs_dir=config['jobs_dir'])
+    return
+
+
+def measured(func:Callable)->Callable:
+    '''
+    Decorator for every server side callback, placed under @callback so the function Dash registers (and runs in background jobs) is what gets measured
+    Takes in the callback function func, which is measured by callback_metrics (see CallbackMetrics.call in metrics.py) whenever metrics are on
 
+    Returns the measured function
+    '''
+    @wraps(func)
+    def measured_func(*args, **kwargs):
+        if callback_metrics==None:
+            return func(*args, **kwargs)
+        return callback_metrics.call(func, *args, **kwargs)
+    return measured_func
 
-##Additional Data Item question section (in the case the user chooses TOTAL as the domain) (user can only choose one option, stored as string)
 
-@callback(Output('mult-dt-r', 'options'),
-        Output('mult-dt-r', 'style'),
-        Output('mult-dt-r-label', 'style'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value')
-          )
+#===================Callbacks=======================
 
-def ask_mult_dt(domain: str, data_item:str)->Tuple[list[str], dict[str, str], dict[str, str]]:
-    '''
-    If domain is set to TOTAL by the user, the next possible selection domain category only consists of UNSPECIFIED. 
-    To combat issue, asks user if they want to only visulize the data item they have already chosen, 
-    or if they want to compare across data items that also have TOTAL as their domain and have the same units as the initial 
-    data item they have chosen 
-
-    To know whether to ask the question, takes user selected domain as domain (a string), and user selected data item as data_item(a string)
-    If the data item selection exists (is not None and is not ''), and if domain == TOTAL, the radio button item mult-dt-r is displayed with the options 'Multiple Data Items' and 'One Data Item'
-    Otherwise, this question does not appear
-    
-    Returns a list of strings (to be the options for mult-dt-r (a radio button item), and two dictionaries detailing the styling (whether its displayed or not)
 
-    '''
 
-    style = {'display': 'none'} #by default, the question does not display
-    vals=['']
-    if data_item!=None: ##data_item must be defined 
-        if (domain=="TOTAL") & (data_item!=''): #domain must be equal to TOTAL in order to ask this question
-            style = {'display': 'inherit'} ##inherit sets the style to the default settings of radio items (the parent element mult-dt-r)
-            vals=['Multiple Data Items', 'One Data Item'] #the options to be presented to the user if radio items are to be displayed
+##State section (user can choose multiple, selection is a list of strings)
+#Limits the amount of states the user can choose to 5 by disabling the other items once 5 have been clicked (no limit in large selection mode), and only displays the section once a visualization type has been chosen
+#Runs in the browser (update_multi_options in assets/selection.js) since it doesn't need the irrigation database
+clientside_callback(
+    ClientsideFunction(namespace='selection', function_name='update_multi_options'),
+    Output("state-cl", "options"),
+    Output("state-cl", "style"),
+    Output("state-label", "style"),
+    Input("state-cl", "value"),
+    Input("viz-r", "value"),
+    Input("large-mode", "value"),
+    State("state-cl", "options")
+)
 
-    return vals, style, style
+##Only displays the animate switch for bar plots and maps (display_animate in assets/selection.js)
+clientside_callback(
+    ClientsideFunction(namespace='selection', function_name='display_animate'),
+    Output('animate-mode', 'style'),
+    Input('viz-r', 'value')
+)
 
+##Gives the page the app is open in its own id once it loads, so the prefetcher can tell users apart (see resolve_selection)
+clientside_callback(
+    ClientsideFunction(namespace='selection', function_name='session_id'),
+    Output('session-id', 'data'),
+    Input('session-id', 'id')
+)
 
-##Additional Data Item selection section
-##if user answered Multiple Data Items to the above question, need to give checklist of other possible data items
-#selection is held as a list of strings
 
-@callback(Output('tot-dom-dt', 'options'),
-        Output('tot-dom-dt', 'style'),
-        Output('tot-dom-dt-label', 'style'),
-        Input('mult-dt-r', 'value'),
+##Selection store section
+##every section after the state section is dependent on the same previous selections, so the selections are resolved once here and held in 'selection-store'
+@callback(Output('selection-store', 'data'),
+        Input('viz-r', 'value'),
         Input('state-cl', 'value'),
         Input('com-dd', 'value'),
         Input('dom-dd', 'value'),
         Input('dt-dd', 'value'),
-        Input('tot-dom-dt', 'value') 
+        Input("mult-dt-r", 'value'),
+        Input('tot-dom-dt', 'value'),
+        Input('dc-cl', 'value'),
+        Input('year-cl', 'value'),
+        Input('statq-r', 'value'),
+        Input('ratio-dd', 'value'),
+        Input('barxax-r', 'value'),
+        Input('line-n-r', 'value'),
+        Input('large-mode', 'value'),
+        Input('animate-mode', 'value'),
+        State('session-id', 'data')
+        )
+@measured
+def resolve_selection(viz_type:str,
+                      state_id:list[str],
+                      commodity:str,
+                      domain:str,
+                      data_item:str,
+                      mult_dt_q:str,
+                      add_data_item:list[str],
+                      domain_category:list[str],
+                      year:list[str],
+                      stat_type:str,
+                      ratio_item:str,
+                      barax:str,
+                      line_n:str,
+                      large:bool,
+                      animate:bool,
+                      session_id:Union[str, None])->dict:
+    '''
+    Takes in every selection the user can make in the app (the same thirteen values every later section is dependent on)
+    whether large selection mode is on (a boolean large, held in the resolved selection under 'large'), whether a bar plot or map is animated over every year
+    (a boolean animate, held with the selections as it changes which selections are required), and the id of the page the app is open in (session_id), and resolves them with resolve_selection in the Irr_DB class, which queries the irrigation database once for every option list downstream of these selections
 
-          )
+    Because the callbacks remember past selections even if they don't apply to the current data specifications, the resolved selection only keeps
+    the valid additional data items, domain categories, and years, and holds whether all required selections have been made ('complete')
+    All later sections read this dictionary instead of checking validity against the database on their own
+    The resolved selection is then scheduled to the prefetcher, which runs its likely next steps ahead of time
 
-def update_mult_dts_items(mult_dt_q:str, state_id:list[str],commodity: str, domain: str, data_item:str, init_vals: list[str])->Tuple[list[dict[str,str]], dict[str,str], dict[str,str]]:
+    Returns a dictionary to be stored in 'selection-store', the values of the user's selections are held under 'selection'
     '''
-    Displays a checklist of additional data items the user can choose to visualize, only if they selected TOTAL as the domain and selected 'Multiple Data Items' to previous question 
-    Otherwise doesn't display to the user. 
-
-    Takes in answer to previous question (mult_dt_q, a string), all previous selections made according to the type of their values (dependent on what type of item they are),
-        makes it so state selection is a list of strings state_id, commodity is a string commoidty, domain is a string domain, and initial data item is a string data_item. These are needed because the additional data item feild is dependent on all of these selections
-    Function also needs the values already chosen by the user in this checklist (a list of strings called init_vals) to limit the amount of item a user can select in the checklist to 4
+    selection={'viz_type':viz_type, 'state_id':state_id, 'commodity':commodity, 'domain':domain, 'data_item':data_item, 'mult_dt_q':mult_dt_q,
+               'add_data_item':add_data_item, 'domain_category':domain_category, 'year':year, 'stat_type':stat_type, 'ratio_item':ratio_item, 'barax':barax, 'line_n':line_n,
+               'animate':bool(animate) and viz_type in ['Bar Plot', 'Map']} #line graphs aren't animated, the switch is hidden for them
+    resolved=data_service.db.resolve_selection(selection)
+    resolved['selection']={k: (v if v is not None else resolved_default(k)) for k, v in selection.items()} #components that haven't been set yet hold None
+    resolved['large']=bool(large)
+    if prefetcher!=None:
+        prefetcher.schedule(resolved, session_id)
+    return resolved
+
+def resolved_default(key:str)->Union[str, list]:
+    '''
+    Called by resolve_selection, gets the default value of a selection (key is the name of the selection) that hasn't been set yet
 
-    Callback remembers past selections for this item (init_vals), even if they were for different previous data specifications (state, commoodity, domain, data item)
-    To combat this, finds items already selected that match the results of additional data items returned by the get_domain_categories function in the Irr_DB class (which handles the case for choosing additional data items rather than domain categories)
-    and ensures they match the units of the initial data item selected as well. Then sets the disabled items in the newly returned checklist of additinal valid items based upon the filtered initial values selected by the user
-    
-    Limits the amount of items a user can choose for this field to 4 so that final visualization only displays five items at a time
-    
+    Returns an empty list for checklists and an empty string otherwise
+    '''
+    if key in ['state_id', 'add_data_item', 'domain_category', 'year']:
+        return []
+    return ''
 
-    Returns a list of dictionaries (each key and value is string) to denote the layout of the checklist for additional data items, and two dictionaries (each key and value is a string) detailing the styling (whether its displayed or not)
+def every_year(resolved:dict)->bool:
     '''
-   
-    dt_layout=[] #by default the checklist does not display
-    style = {'display': 'none'}
-
-    if all([state_id, commodity, domain,data_item]): ##returns True if all items are iterable -- returns false if any of them are None or not iterable (None, '' or [''])
-        #if any of them are noniterable, the database will not be able to be queried 
-        if ((data_item!='') and (domain=='TOTAL')) and (mult_dt_q!=''): ##a data item need to be chosen, the multiple data items question needs to be answered, and domain=TOTAL in order to display these additional data item options
-            if mult_dt_q == "Multiple Data Items": #answer to previous question must be Multiple Data Items to display additional data items
-                insert_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]} #input dictionary to get_domain_categories must have its values be lists of strings
-                results = Irr_DB().get_domain_categories(insert_dict, mult_dt_q) #querying the database for valid adiditonal data items
-                if len(results)==0: #indicates no valid results so additional data items to choose from are not displayed
-                    return dt_layout, style, style 
-                
-                style = {'display': 'inherit'}#sets styling to default style of checklist 
-                
-                for i in results: #constructs list of dictionaries that make up the checklist tom-dom-dt, the label is what is presented to user, value is value associated with the label, in this case they are the same
-                    single_dt={'label': i, 'value': i}
-                    dt_layout+=[single_dt]
-       
-                ##found that the callback would remember previous user selections for additional data items in init_vals that didn't apply to most recent other data specifications
-                ## to combat this checked if the the values already chosen by the user are within the results of asking the database for more data items, 
-                # and if the data items already chosen by the user have the same units as the data item selected by the user and held in data_item
-
-                filtered_vals=[]
-                unit=data_item.split(' - ')[-1]
-                for i in init_vals:
-                    if i in results: ##making sure whatever data items previsouly picked for a previous data item apply still
-                        i_unit=i.split(' - ')[-1]
-                        if i_unit==unit: #further ensures by checking the units of these items
-                            filtered_vals+=[i]
-             
-                if len(filtered_vals)>=4: ##limiting the amount of items a user can select to 4 (making so a total of 5 data items can be display on the visualizations)
-                    dt_layout = [
-                    {
-                        "label": option["label"],
-                        "value": option["value"],
-                        "disabled": option["value"] not in filtered_vals,
-                    }
-                    for option in dt_layout ##dictionary comprehension
-                ]
- 
-    return dt_layout, style, style
+    Takes in the resolved selection held in 'selection-store'
 
+    Returns whether it is a map or an animated bar plot (a boolean), which show one year at a time out of every year with data, all from one query (see get_final_results)
+    '''
+    selection=resolved['selection']
+    return selection['viz_type']=='Map' or (selection['viz_type']=='Bar Plot' and selection.get('animate', False))
 
-##Domain Category selection (checklist) section
-##Only displays if user didn't pick TOTAL as domain, user can choose mulitple options, overall selection held as a lsit of strings
+def map_slider(resolved:dict)->bool:
+    '''
+    Takes in the resolved selection held in 'selection-store'
 
-@callback(Output('dc-cl', 'options'),
-        Output('dc-cl', 'style'),
-        Output('dc-label', 'style'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input('dc-cl', 'value') 
+    Returns whether it is a map that isn't animated (a boolean), the year such a map shows is chosen with the year slider under it
+    '''
+    return resolved['selection']['viz_type']=='Map' and not resolved['selection'].get('animate', False)
+
+
+##Sections after the state section
+#Each of these sections only presents the options held in the resolved selection in 'selection-store', and is displayed when it has options.
+#They run in the browser (functions with the same names in assets/selection.js) rather than sending a request to the server on every click:
+#   display_coms: commodity dropdown, displayed once states have been chosen
+#   update_doms: domain dropdown, options dependent on the state(s) and commodity chosen
+#   update_dts: data item dropdown, options dependent on the state(s), commodity, and domain chosen
+#   ask_mult_dt: if domain=TOTAL, asks whether the user wants to visualize/analyze multiple data items or one ('Multiple Data Items' or 'One Data Item')
+#   update_mult_dts_items: checklist of additional data items (domain=TOTAL and 'Multiple Data Items'), limited to 4 (no limit in large selection mode)
+#   update_dc: checklist of domain categories (domain isn't TOTAL), limited to 5 (no limit in large selection mode)
+#   update_years: checklist of valid years, limited to 5 (no limit in large selection mode)
+#   ask_stat: statistic to visualize/analyze (Average, Sum, Minimum, Maximum, or Percent Change, Annual Growth Rate, and Ratio derived from the sum)
+#   ask_ratio_item: if the statistic is Ratio, dropdown of the data items with domain TOTAL the sum can be divided by
+#   ask_barplot_xax: for bar plots of one piece of data with multiple states and multiple years (or one state and one year), asks whether states or years are on the x axis
+#   ask_linegraph_line_n: for line graphs of one piece of data with multiple states, asks whether the user wants multiple lines (one per state) or one line
+#   display_g_or_dt_buttons: displays the Generate Graph, Save Figure, Generate Data Table, and Export Data Table buttons once the resolved selection is complete
+
+for section_id, label_id, function_name in [('com-dd', 'com-label', 'display_coms'),
+                                            ('dom-dd', 'dom-label', 'update_doms'),
+                                            ('dt-dd', 'dt-label', 'update_dts'),
+                                            ('mult-dt-r', 'mult-dt-r-label', 'ask_mult_dt'),
+                                            ('tot-dom-dt', 'tot-dom-dt-label', 'update_mult_dts_items'),
+                                            ('dc-cl', 'dc-label', 'update_dc'),
+                                            ('year-cl', 'year-cl-label', 'update_years'),
+                                            ('statq-r', 'statq-r-label', 'ask_stat'),
+                                            ('ratio-dd', 'ratio-label', 'ask_ratio_item'),
+                                            ('barxax-r', 'barxax-r-label', 'ask_barplot_xax'),
+                                            ('line-n-r', 'line-n-r-label', 'ask_linegraph_line_n')]:
+    clientside_callback(
+        ClientsideFunction(namespace='selection', function_name=function_name),
+        Output(section_id, 'options'),
+        Output(section_id, 'style'),
+        Output(label_id, 'style'),
+        Input('selection-store', 'data')
+    )
 
-          )
+clientside_callback(
+    ClientsideFunction(namespace='selection', function_name='display_g_or_dt_buttons'),
+    Output('fig-bt-div', 'style'),
+    Input('selection-store', 'data')
+)
 
 
-def update_dc(state_id:list[str],commodity: str, domain: str, data_item:str, init_vals: list[str])->Tuple[list[dict[str,str]], dict[str,str], dict[str,str]]:
+def get_final_results(resolved:dict, keyed:bool=False)->Tuple[dict[str,list[str]], Union[list[float], list[list[float]], pd.DataFrame], Union[str, None]]:
     '''
-    Displays a checklist of domain categories the user can choose to visualize, only if they didn't selected TOTAL as the domain, and therefore only chose 1 data item (as well as chose items for all previous selections possible)
-    Otherwise doesn't display to the user.
-    
-    To query database for domain categories the user can choose from, takes in all previous user data specifications (states as state_id, a list of stirngs, commodity as a string commodity, domain as a string domain, data item as a string data_item) because
-    domain category is dependent on these choices
-    
-    Callback remembers past selections for this item (init_vals, as list of strings), even if they were for different previous data specifications (state, commoodity, domain, data item)
-    To combat this, finds items already selected that match the results of domain categories returned by the get_domain_categories function in the Irr_DB class 
+    Called by display_graph and display_table once the resolved selection held in 'selection-store' is complete
 
-    Limits the amount of domain categories a user can choose to 5, based upon the valid domain categories already chosen 
-    
-    Returns a list of dictionaries (each key and value is string) to denote the layout of the checklist for domain categories, and two dictionaries(each key and value is a string) detailing the styling (whether its displayed or not)
+    Uses the valid user specifications held in resolved['params'] to construct and execute the final query to the irrigation database (uses final_query and execute_final_query functions found in the Irr_DB class defined in Irr_DB.py)
+    If the user had to answer whether they want multiple lines or one line (line graph), or states or years on the x axis (bar plot), their answer is used to set the group by in the final query
 
+    For maps and animated bar plots, the query is one grouped aggregate over every state and year (matrix_query and execute_matrix_query in the Irr_DB class),
+    so every year on the map's slider (or every frame of the animation) comes from the same cached results
+    If keyed is True (for the data table), the results of the final query are kept with the columns they were grouped by (execute_keyed_query in the Irr_DB class),
+    the same query as the graph's so only the first of them queries the database
+
+    Returns the dictionary of user specifications, the results of the final query (a list of floats for bar plots, a list of lists of floats for line graphs,
+        a pandas DataFrame of the keyed results if keyed is True, a pandas DataFrame of every state and year for maps and animated bar plots), and the encoded answer to the line graph or bar plot question
+        ('multiple' or 'one' for line graphs, 'state_id' or 'year' for bar plots, None if it wasn't required)
     '''
-    dc_layout=[] #by default checklist doesn't display
-    style={'display':'none'}
-    if (domain!="TOTAL"): #domain can't be TOTAL in order for checklist to display
-        insert_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-        results=Irr_DB().get_domain_categories(insert_dict, None) #querying the database for domain categories to choose from according to user's previosu selections
-
-        if len(results): #if there are any results display the checklist, if not, doesn't display checklist
-            style = {'display': 'inherit'} #sets styling to default style of checklist 
-        
-
-            for i in results: #constructs list of dictionaries that make up the checklist dc-cl, the label is what is presented to user, value is value associated with the label, in this case they are the same
-                single_dc={'label': i, 'value': i}
-                dc_layout+=[single_dc]
-      
-            #checking the the values already chosen by the user are within the results of asking the database for domain categories
-            filtered_vals=[]
-            for i in init_vals:
-                if i in results:
-                    filtered_vals+=[i]
-
-            if len(filtered_vals)>=5: #set the amount of items that can chosen by the user to 5, and determines validity of the options by using the filtered values
-                dc_layout = [
-                {
-                    "label": option["label"],
-                    "value": option["value"],
-                    "disabled": option["value"] not in filtered_vals,
-                }
-                for option in dc_layout ##dictionary comprehension
-            ]
-
-
-    return dc_layout, style, style
-
-
-
-##Year section, a checklist (user can choose multiple, value is stored as a list of strings)
-
-@callback(Output('year-cl', 'options'),
-        Output('year-cl', 'style'),
-        Output('year-cl-label', 'style'),
-        Input("mult-dt-r", 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input('tot-dom-dt', 'value'), 
-        Input('dc-cl', 'value'),
-        Input('year-cl', 'value')
-        )
-def update_years(mult_dt_q:str,state_id:list[str], commodity:str, domain:str, data_item:str, add_data_item:list[str], domain_category:list[str], init_vals: list[str])->Tuple[list[dict[str,str]], dict[str,str], dict[str,str]]: 
-   
-    
-    '''
-    Constructs checklist of valid years user can choose for their data specified above to reflect
-    
-    Valid years is dependent on all previous selections, so needs to account for cases in which user chose domain= TOTAL (so includes choice of multiple data items or one data item) and when they didn't
-    If any essential specifications haven't been filled out, checklist doesn't display
-    
-    Since dependent on all previous selections, which types are dependent on the type of item they are, takes in answer to multiple data item as a string mult_dt_q, state(s) as a list of strings state_id,
-    commodity as a string commodity, domain as a string domain, data item as a string data_item, possible additional data items as a list of strings add_data_item, and possible domain categories as a list of strings domain_category
-    
-    Because of callback remembering issue, needs to check for validity of domain categories stored in domain_category('dc-cl' value) in case domain !=TOTAL, 
-    or needs to check for validity of data items stored in add_data_item('tom-dom-dt' value) in case domain == TOTAL and user chose 'Multiple Data Items' when asked with the radio items in mult-dt-r
-    
-    Sets up unique dictionary to send to get_years function in the Irr_DB class for each of these cases in order to adhere to how get_years works in its own conditional statements
-    
-    Then checks validity of years already chosen by user in a previous callback, stored as init_vals, a list of strings, and determines whether any of those are still valid based upon results of the get_years function
+    params=resolved['params']
+    if every_year(resolved):
+        matrix_query=data_service.db.matrix_query(operation=resolved['selection']['stat_type'], params=params)
+        return params, data_service.db.execute_matrix_query(matrix_query, params), None
+    lin_bool=encode_viz_type(resolved['selection']['viz_type']) #encoding the user choice of visualizatin type to match the input required for final_query, execute_final_query
+    s_multiple_or_one=resolved['s_multiple_or_one']
+    yr_or_states=resolved['yr_or_states']
+    final_query=data_service.db.final_query(operation=resolved['selection']['stat_type'], params=params, s_multiple_or_one=s_multiple_or_one, yr_or_states=yr_or_states, line_graph=lin_bool) #makes sql string for query
+    if keyed:
+        final_results=data_service.db.execute_keyed_query(final_query, params)
+    else:
+        final_results=data_service.db.execute_final_query(final_query, params, lin_bool) #executes query to irrigation database
+    if s_multiple_or_one!=None:
+        return params, final_results, data_service.db.set_group_by_line(s_multiple_or_one)
+    if yr_or_states!=None:
+        return params, final_results, encode_key_name_ys(yr_or_states)
+    return params, final_results, None
 
-    Limits the amount of years a user can choose to 5, based upon the amount already valid and checked by the user
 
-    Returns a list of dictionaries (each key and value is string) to denote the layout of the checklist for years, and two dictionaries detailing the styling (whether its displayed or not)
+def get_figure_json(resolved:dict, set_progress:Callable=None)->str:
+    '''
+    Called by get_figure, display_graph, and the prefetcher once the resolved selection held in 'selection-store' is complete
+
+    Looks up the figure for the resolved selection in the figure cache of the data service (keyed by selection_key in figure_cache.py, so the same selection made by any user shares one figure)
+    If it isn't cached, gets the results from the final query to the database with get_final_results and creates line graph or bar plot depending on earlier user choice
+    by calling make_bar_plot or make_line_graph found in visualization.py, and caches it as serialized plotly JSON
+    (with the values of its traces as typed arrays if the app's typed_arrays setting is on, see figure_json in figure_encoding.py)
+    For maps, each year is its own figure (made by make_map), the year is held in resolved['map_year'] and is the latest year if it isn't given
+    Animated maps and bar plots are one figure holding every year as a plotly frame (made by make_map_animation and make_bar_animation)
+    If set_progress is given (the function Dash passes to a background callback), the progress of building the figure is reported through it
 
+    Returns the figure as serialized plotly JSON (a string)
     '''
-    
-    yr_layout=[] #by default doesn't display checklist
-    style={'display':'none'}
-    if all([state_id, commodity, domain,data_item])==False: #if any of the essential specifications aren't specified (None, '' or ['']), year checklist isn't displayed
-        return yr_layout, style, style
-    
-    ##Because of callback remembering issue, needs to check for validity of domain categories stored in domain_category('dc-cl' value) in case domain !=TOTAL, 
-    # or needs to check for validity of data items stored in add_data_item('tom-dom-dt' value) in case domain == TOTAL and user chose 'Multiple Data Items' when asked with the radio items in mult-dt-r
+    if map_slider(resolved) and resolved.get('map_year')==None:
+        resolved=dict(resolved, map_year=resolved['params']['year'][-1])
+
+    def build_figure()->str:
+        if set_progress != None:
+            set_progress((25, "Querying the irrigation database"))
+        params, final_results, encoded_answer=get_final_results(resolved)
+        if set_progress != None:
+            set_progress((75, "Building the graph"))
+        operation=data_service.db.which_statistic(resolved['selection']['stat_type'])
+        if map_slider(resolved):
+            fig=make_map(params, final_results, operation, resolved['map_year']) #makes the map of one year
+        elif resolved['selection']['viz_type']=='Map':
+            fig=make_map_animation(params, final_results, operation) #makes the map animated over every year
+        elif every_year(resolved):
+            fig=make_bar_animation(params, final_results, operation) #makes the bar plot animated over every year
+        elif encode_viz_type(resolved['selection']['viz_type']):
+            fig=make_line_graph(params=params, y_data=final_results, operation=operation, s_multiple_or_one=encoded_answer, large=resolved['large']) #makes line graph
+        else:
+            fig=make_bar_plot(params, encoded_answer, final_results, operation, large=resolved['large']) #makes bar plot
+        return figure_json(fig, typed_arrays)
 
-    
+    return data_service.figure_cache.get_or_build(selection_key(resolved), build_figure)
 
-    if (data_item !='') and (domain_category !=[]) and (domain !='TOTAL'): #means single data_item and some sort of domain category is defined
-        ##check domain_categories that are valid w/in callback (remembers past selections even if dont apply to currents specifications)
-        check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-        results=Irr_DB().get_domain_categories(check_dict, None) #gets all domain_category results possible
-        valid_dc=[i for i in domain_category if i in results]  #gets valid domain categories(previous domain category results that are within the ones the user has already chosen)
-        if len(valid_dc)==0: #if no valid domain categories, year checklist doesn't display
-            return yr_layout, style, style
-        insert_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category': valid_dc}
-         
-    elif (domain == 'TOTAL') and (data_item != ''): ##domain ==TOTAL and data item exists
-
-        if (mult_dt_q == 'Multiple Data Items') and (add_data_item!=[]): #user chose Multiple Data Items and items for the additional data items field
-            ##check additional data items that are valid w/in callback (remembers past selections even if dont apply to currents specifications)
-            check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            results = Irr_DB().get_domain_categories(check_dict, mult_dt_q) #gets all additional data items possible
-            valid_adt=[i for i in add_data_item if i in results] #gets valid additional data items(previous additional data item results that are within the ones the user has already chosen)
-            if len(valid_adt)==0: #if no valid additional data items, year checklist doesn't display
-                return yr_layout, style, style
-   
-            insert_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]+valid_adt}
 
-        elif (mult_dt_q == 'One Data Item'): #user chose 'One Data Item', so not using add_data_item in any way
-            insert_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
+def get_figure(resolved:dict, set_progress:Callable=None)->dict:
+    '''
+    Called by save_figure once the resolved selection held in 'selection-store' is complete, gets the figure with get_figure_json
 
-        else: #indicates the question for  Multiple Data Items and One Data Item was not answered so year checklist doesn't display
+    Returns the figure as a dictionary to be placed in the graph or written to an image
+    '''
+    return json.loads(get_figure_json(resolved, set_progress))
+
+
+##Buttons section
+#Which of the Generate Graph, Save Figure, Generate Data Table, and Export Data Table buttons are disabled only depends on what was most recently clicked, so it's decided in the browser (button_states in assets/results.js):
+#   the Save Figure button is disabled until the generate graph button has been clicked, the Export Data Table button until the generate data table button has been clicked,
+#   each button is disabled once clicked, and all of them reset once any earlier choice by the user that filters the data in the irrigation database is changed
+clientside_callback(
+    ClientsideFunction(namespace='results', function_name='button_states'),
+    Output('graph-button', 'disabled'),
+    Output('save-fig-button', 'disabled'),
+    Output('data-table-button', 'disabled'),
+    Output('export-table-button', 'disabled'),
+    Input('graph-button', 'n_clicks'),
+    Input('save-fig-button', 'n_clicks'),
+    Input('data-table-button', 'n_clicks'),
+    Input('export-table-button', 'n_clicks'),
+    Input('selection-store', 'data')
+)
 
-            return yr_layout, style, style
-    else:#checklist doesn't display if any of the base conditions aren't met
-        return yr_layout, style, style
-    
-    results=Irr_DB().get_years(insert_dict) #querying database for years according to the valid specifications
-
-    if len(results): #if there were any results, displays the year checklist of available years, if not, doesn't display checklist
-        style={'display':'inherit'}#{'display':'initial'}
-        #constructs list of dictionaries that make up the checklist year-cl, the label is what is presented to user, value is value associated with the label, in this case they are the same
-        for i in results:
-            single_yr={'label': i, 'value': i}
-            yr_layout+=[single_yr]
-        #checks for valid years alredy checked by user for past combination of data specifications
-        filtered_vals=[]
-        for i in init_vals:
-            if i in results:
-                filtered_vals+=[i]
-        
-        ##Limits amount of years that can be chosen by user to be 5, sets the rest of the items as disabled once 5 items are checked
-        if len(filtered_vals)>=5:
-            yr_layout = [
-            {
-                "label": option["label"],
-                "value": option["value"],
-                "disabled": option["value"] not in filtered_vals, 
-            }
-            for option in yr_layout ##dictionary comprehension
-        ]
-
-    return yr_layout, style, style
-
-#Type of Statistic Section, presented as radio buttons (user can only choose one, when selected value is stored as a string )
-
-@callback(Output('statq-r', 'options'),
-        Output('statq-r', 'style'),
-        Output('statq-r-label', 'style'),
-        Input("mult-dt-r", 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input("year-cl", 'value'),
-        Input("dom-dd", 'value'),
-        Input('dt-dd', 'value'),
-        Input('tot-dom-dt', 'value'),
-        Input('dc-cl', 'value')
+#Once a map's selection is complete, its year slider is set to every year the map can show (map_years in assets/results.js)
+clientside_callback(
+    ClientsideFunction(namespace='results', function_name='map_years'),
+    Output('map-year', 'marks'),
+    Output('map-year', 'min'),
+    Output('map-year', 'max'),
+    Output('map-year', 'value'),
+    Input('selection-store', 'data')
+)
+
+#Once any earlier choice is changed, the graph, data table, and saved figure and data table messages no longer match the user's selections so they are hidden (hide_results in assets/results.js)
+#A background job still running for the old selections is cancelled by the same change (see cancel in the callbacks below)
+clientside_callback(
+    ClientsideFunction(namespace='results', function_name='hide_results'),
+    Output('graph', 'style', allow_duplicate=True),
+    Output('table-container', 'style', allow_duplicate=True),
+    Output('map-year-div', 'style', allow_duplicate=True),
+    Output('save-fig-status', 'children', allow_duplicate=True),
+    Output('export-table-status', 'children', allow_duplicate=True),
+    Input('selection-store', 'data'),
+    prevent_initial_call=True
 )
 
-##need to include all past arguments and whether some are checked out not
 
-def ask_stat(mult_dt_q:str, state_id: list[str], commodity:str,year:list[str], domain:str,data_item:str, add_data_item:list[str],  domain_category: list[str])->Tuple[list[str], dict[str,str], dict[str,str]]:
+##Display Graph section
+#Runs as a background callback: the progress bar shows while the graph is being built, and the job is cancelled if the user changes their selections in the meantime
+
+@callback(Output('graph', 'figure'),
+        Output('graph', 'style', allow_duplicate=True),
+        Output('graph-key', 'data'),
+        Output('map-year-div', 'style'),
+        Input('graph-button', 'n_clicks'),
+        State('selection-store', 'data'),
+        State('graph-key', 'data'),
+        State('map-year', 'value'),
+        background=True,
+        running=[(Output('graph-progress', 'style'), {'display': 'flex'}, {'display': 'none'})],
+        progress=[Output('graph-progress', 'value'), Output('graph-progress', 'label')],
+        cancel=[Input('selection-store', 'data')],
+        prevent_initial_call=True
+        )
+@measured
+def display_graph(set_progress:Callable, n_clicks:int, resolved:dict, shown_key:Union[str, None], map_year:Union[int, None])->Tuple[Union[dict, Patch], dict[str,str], Union[str, None], dict[str,str]]:
     '''
-    Presents radio buttons that represent the statistic the user can choose to visualize for the specific data they have chosen( based on previous choices if certain conditions are met, otherwise doesn't display radio buttons)
+    Determines whether the corresponding graph to all the user's specifications, holding the results from the query to the irrigation database, is displayed or not
 
-    Dependent on all previous specifications possibly made, so takes in the answer to multiple data item question as a string mult_dt_q, state(s) as a list of strings state_id,
-    commodity as a string commodity, domain as a string domain, data item as a string data_item, possible additional data items as a list of strings add_data_item, and possible domain categories as a list of strings domain_category
+    Takes in the function Dash uses to report the progress of the background job (set_progress, takes a tuple of the progress bar value and its label),
+    the number of times the generate graph button has been clicked (an int n_clicks), the resolved selection held in 'selection-store',
+    the key of the figure the graph already shows (shown_key, held in 'graph-key', None if it doesn't show one yet), and the year chosen on the map's year slider (map_year, an int)
 
-    Needs to check if all specifications are made for each possible case of domain=TOTAL (and thus whether or not additional data items were specified, and the question of displaying multiple data items or not has been answered), 
-    and domain isn't equal to TOTAL (whether domain categories have been specified )
+    Only called when the generate graph button is clicked (the graph is hidden and the button reset by hide_results and button_states once the user changes a selection)
 
-    Because of this and the callback remembering previous selections discussed above, checks validity of either additional data items, and in that whether the multiple data item question has been answered,
-    or checks validity of domain categories selected
-    In each case constructs a valid query to the database to check for years possible 
-    From there also checks the validity of years chosen by the user, as the callback remembers year selections for different data specifications as well 
-    
-    If all required conditions have been met and there are valid years selected by the user, presents the radio buttons (Sum, Minimum, Maximum, Average)
+    If all required selections are made (the resolved selection is complete), gets the line graph or bar plot for the selection with get_figure_json
+    (reusing the cached figure if the same selection has already been graphed), and graph is set to be displayed
+    If the figure already shown is still cached, only what changed from it is sent to the browser as a dash Patch (see figure_patch.py),
+    such as the y values and title after only the statistic changed, rather than the full figure with its layout and template
 
-    Returns a list of strings to denote labels of the radio buttons, and two dictionaries detailing the styling (whether they are displayed or not)
+    Returns the plotly figure as a dictionary (or a Patch of the figure already shown), a dictionary (key and value are strings) to describe whether graph is displayed,
+    the key of the figure now shown, and a dictionary describing whether the map's year slider is displayed (only under a map)
     '''
-    
-    
-    options=[] #by default radio buttons don't display
-    style={'display':'none'}
-
-    if all([state_id, commodity, year, domain, data_item])==False: #checks if all essential arguments are iterable , if False (items are either None, '' or ['']) radio buttons don't display
-        return options, style, style
-
-    if domain=="TOTAL" and (mult_dt_q=='' or mult_dt_q==None): #if domain==TOTAL, the answer to the multiple data items question must be answered, if not radio buttons don't display
-        return options, style, style
-
-    if domain =="TOTAL" and mult_dt_q=="Multiple Data Items": #if domain=TOTAL and Multiple Data Items chosen, the additional data items must be filled and there must be valid entries
-        check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-        results = Irr_DB().get_domain_categories(check_dict, mult_dt_q) #gets all possible additional data items based upon most current data specifications
-        valid_adt=[i for i in add_data_item if i in results] #valid additional data items from previous user selection
-        if len(valid_adt)==0:
-            return options, style, style
-        ##sets up checking for valid years
-        year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]+valid_adt}
-    elif domain!="TOTAL" and data_item!='' and len(domain_category)>0: #user didn't chose TOTAL as domain and has filled out domain categpry field
-        #checks for if valid domain categories have been chosen by the user
-        check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]} 
-        results=Irr_DB().get_domain_categories(check_dict, None) #gets all possible domain categories based upon most current data specifications
-        valid_dc=[i for i in domain_category if i in results] #valid domain categories from previous user selection
-        if len(valid_dc)==0: #if no valid domain categories chosen, radio buttons dont display
-            return options, style, style
-        year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category':valid_dc}
-    elif domain!="TOTAL" and data_item!='' and len(domain_category)==0: #radio buttons dont display if domain(domain!=TOTAL) and data item fields have been filled, but the domain category field has been filled 
-        return options, style, style
-    
-    else: ##Last case possible is where domain=TOTAL and user has specified One Data Item, sets up year checking dictionary
-        year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
 
-    year_results=Irr_DB().get_years(year_dict) #gets all possible years based upon most current data specifications
-    valid_yrs=[i for i in year if i in year_results] #checks validity of previously selected years
-    if len(valid_yrs)==0: #if there are no valid years then radio buttons don't display
-        return options, style, style
-    else: #if valid years have been chosen the radio buttons are displayed 
-        options=['Average', 'Sum', 'Minimum', 'Maximum']
-        style={'display':'inherit'}
+    if n_clicks==0 or resolved['complete']==False: ##this means a required selection from the user was not made, so the graph is not displayed
+        style={'display': 'none'}
+        fig={}
+        return fig, style, None, style
 
+    slider_style={'display': 'none'}
+    if map_slider(resolved): #animated maps have their own slider
+        resolved=map_selection(resolved, map_year)
+        slider_style={'display': 'block', 'width': '940px'}
+    set_progress((0, "Looking up the graph"))
+    fig=shown_figure(resolved, shown_key, set_progress)
+    return fig, {'display': 'inherit'}, selection_key(resolved), slider_style
 
-    return options, style, style
 
+def map_selection(resolved:dict, map_year:Union[int, None])->dict:
+    '''
+    Takes in the resolved selection of a map held in 'selection-store', and the year chosen on the map's year slider (map_year, an int, None if it hasn't been set)
 
-#Bar Plot States vs. Years section (radio buttons where user can only choose, when selected value is stored as a string)
+    Returns a copy of the resolved selection holding the year the map shows under 'map_year' (a string, the latest year if map_year isn't one of the map's years)
+    '''
+    years=resolved['params']['year']
+    year=str(map_year) if map_year!=None and str(map_year) in years else years[-1]
+    return dict(resolved, map_year=year)
 
-##In the case the user chose Bar Plot, and only chose either 1 data item and one domain category when domain!=TOTAL, or 1 data item when domain=TOTAL
-##and where there were either multiple states and multiple years chosen, or one state and one year chosen
-#tool needs to know whether states or years is on the x axis, and therefore what the statistic specified by statq-r is representative of)
 
+def shown_figure(resolved:dict, shown_key:Union[str, None], set_progress:Callable=None)->Union[dict, Patch]:
+    '''
+    Called by display_graph and update_map_year, gets the figure of the resolved selection with get_figure_json to be sent to the graph,
+    which already shows the figure under shown_key (held in 'graph-key', None if it doesn't show one yet)
 
-@callback(Output('barxax-r', 'options'),
-        Output('barxax-r', 'style'),
-        Output('barxax-r-label', 'style'),
-        Input('viz-r', 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input("mult-dt-r", 'value'), 
-        Input('dc-cl', 'value'),
-        Input('year-cl', 'value'),
-        Input('statq-r', 'value')
-          )
+    If the figure already shown is still cached, only what changed from it is sent to the browser as a dash Patch (see figure_patch.py)
 
-def ask_barplot_xax(viz_type:str,state_id:list[str], commodity:str, domain:str, data_item:str, mult_dt_q:str, domain_category:Union[list[str],list], year:list[str], stat_type:str) ->Tuple[list[str], dict[str,str], dict[str,str]]:
+    Returns no_update if the figure is already shown, otherwise the Patch of the figure already shown or the full figure as a dictionary
     '''
-    If the user specified bar plot, and only chose one piece of data (either one data item if domain=TOTAL, or one data item and one domain category if domain !=TOTAL),
-        and user has also either chosen multiple states and multiple years, or one state and one year, tool needs to know whether states or years are represented on the x axis of the bar plot
+    fig_json=get_figure_json(resolved, set_progress)
+    if shown_key==selection_key(resolved): #already shown, only needs to be displayed again
+        return no_update
+    fig=json.loads(fig_json)
+    shown_json=data_service.figure_cache.get(shown_key) if shown_key!=None else None
+    if shown_json!=None:
+        patch=figure_patch(json.loads(shown_json), fig, len(fig_json))
+        if patch!=None:
+            return patch
+    return fig
+
+
+##Map year section
+#Moving the year slider under a map shows the map of that year. Every year comes from the same cached query (see get_final_results), and each year's figure is cached,
+#so this isn't run as a background callback, and only what changed from the year already shown is sent (usually only the values of the states and the title)
+
+@callback(Output('graph', 'figure', allow_duplicate=True),
+        Output('graph-key', 'data', allow_duplicate=True),
+        Input('map-year', 'value'),
+        State('selection-store', 'data'),
+        State('graph-key', 'data'),
+        prevent_initial_call=True
+        )
+@measured
+def update_map_year(map_year:Union[int, None], resolved:dict, shown_key:Union[str, None])->Tuple[Union[dict, Patch], Union[str, None]]:
+    '''
+    Takes in the year chosen on the map's year slider (map_year, an int), the resolved selection held in 'selection-store',
+    and the key of the figure the graph already shows (shown_key, held in 'graph-key')
 
-    Presents radio buttons 'State' and 'Years' for user to choose
+    Only updates the graph when it shows a map of the same selection for another year (the slider is also set when a new map selection is made, before its map is generated)
 
-    Existence dependent on all previous specifications, including the visualization type stored as a string viz_type and the type of statistic chosen stored as string stat_type. This means it also takes the answer to multiple data item question as a string mult_dt_q, year(s) as a list of strings year, state(s) as a list of strings state_id,
-    commodity as a string commodity, domain as a string domain, data item as a string data_item, and possible domain categories as a list of strings domain_category (doesn't need to take in additional data items because mult_dt_q must be 'One Data Item' for the buttons to display)
-    
-    To account for all cases where domain=TOTAL and where it doesn't equal TOTAL, function checks validity of either item(s) in domain_category, and whether 'One Data Item' was specifed by mult_dt_q
-    It then determines whether years have been selected by the user, and if they are valid by querying the irrigation database (if there aren't any valid domain categories or years, or 'One Data Item' has not been chosen, the buttons don't display )
-    
-    Returns a list of strings to denote labels of the radio buttons, and two dictionaries detailing the styling (whether they are displayed or not)
+    Returns the map of the chosen year (a Patch of the map already shown, or the full figure as a dictionary), and the key of the figure now shown
     '''
-    vals=[] #by default radio buttons don't display
-    style = {'display': 'none'}
-    if all([state_id, commodity, year, domain, data_item, stat_type, viz_type])==False: ## if any previous essential data specification hasn't been made (isn't iterable like None, '' or ['']), radio buttons don't display
-        return vals, style, style
+    if map_year==None or shown_key==None or resolved['complete']==False or not map_slider(resolved):
+        return no_update, no_update
+    shown_year=json.loads(shown_key).get('map_year')
+    if shown_key!=selection_key(dict(resolved, map_year=shown_year)): #the graph doesn't show a map of this selection
+        return no_update, no_update
+    resolved=map_selection(resolved, map_year)
+    return shown_figure(resolved, shown_key), selection_key(resolved)
 
-    
-    lin_bool=encode_viz_type(viz_type) #checking the type of visualization specified by user, if thye specified line graph these radio buttons aren't displayed
-    if lin_bool==False:
-
-        if (domain!="TOTAL") & (data_item!='') & (len(domain_category)>=1): #if user didn't choose domain= TOTAL, they must have chosen a domain category
-            #retrieves the valid domain categories for the current set of data specifications that the user has already chosen
-            check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            results=Irr_DB().get_domain_categories(check_dict, None)
-            valid_dc=[i for i in domain_category if i in results]
-   
-            if len(valid_dc)!=1: #the amount of valid domain categories must be 1, if not the radio buttons don't display
-                return vals, style, style
-
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category':valid_dc}
-        elif (domain == 'TOTAL') & (data_item!='') & (mult_dt_q=="One Data Item"): #if the user chose domain=TOTAL, they must have needed to choose 'One Data Item' to require this question to be asked, if not buttons don't display
-            
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-
-        else: #catches any cases where domain_category hasn't been defined for domain !=TOTAL or where domain=TOTAL and mult_dt_q either has no answer or is 'Multiple Data Items'
-            #does not display the radio buttons in these cases
-            return vals, style, style
-        #checks validity of years specified by user since callback remembers years previously chosen for different data specifications
-        year_results=Irr_DB().get_years(year_dict)
-        valid_yrs=[i for i in year if i in year_results]
-        if len(valid_yrs)==0: #if there are no valid years that have been chosen, the buttons don't display
-            return vals, style, style
-       
-        if ((len(state_id)==1) & (len(valid_yrs) ==1)) | ((len(state_id)>1) & (len(valid_yrs)>1)): #checks final condition to display radio buttons (multiple states and multiple years, or one state and one year)
-            #if these conditions aren't met radio buttons don't display
-         
-            style = {'display': 'inherit'}
-            vals=['States', 'Years']
-
-    return vals, style, style
-
-
-
-#Line Graph Multiple Lines vs. One Line section (radio buttons where user can only choose, when selected value is stored as a string) 
-
-##In the case the user chose Line Graph, and only chose either 1 data item and one domain category when domain!=TOTAL, or 1 data item when domain=TOTAL
-##and chose multiple states
-#tool needs to know whether user wants multiple lines, each line representing a state, or one line representing the aggregation method (the value in statq-r) done over all the states
-
-@callback(Output('line-n-r', 'options'),
-        Output('line-n-r', 'style'),
-        Output('line-n-r-label', 'style'),
-        Input('viz-r', 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input("mult-dt-r", 'value'), 
-        Input('dc-cl', 'value'),
-        Input('year-cl', 'value'),
-        Input('statq-r', 'value')
-          )
 
+#Save Figure section (button already determined to be displayed or not in display_g_or_dt_buttons function, and disabled or not in button_states)
+#Runs as a background callback: the progress bar shows while the figure is being saved, and the job is cancelled if the user changes their selections in the meantime
+#The figure is rendered by one of the kaleido renderers the export service keeps running in the processes serving the app, so the job only waits on it
 
-def ask_linegraph_line_n(viz_type:str, state_id:list[str], commodity:str,domain:str, data_item:str, mult_dt_q:str, domain_category:Union[list[str],list], year:list[str],stat_type:str)->Tuple[list[str], dict[str,str], dict[str,str]]:
+@callback(Output('fig-download', 'data'),
+        Output('save-fig-status', 'children'),
+        Input('save-fig-button', 'n_clicks'),
+        State('fig-format-r', 'value'),
+        State('gzip-switch', 'value'),
+        State('selection-store', 'data'),
+        State('map-year', 'value'),
+        background=True,
+        running=[(Output('save-fig-progress', 'style'), {'display': 'flex'}, {'display': 'none'})],
+        progress=[Output('save-fig-progress', 'value'), Output('save-fig-progress', 'label')],
+        cancel=[Input('selection-store', 'data')],
+        prevent_initial_call=True
+        )
+@measured
+def save_figure(set_progress:Callable, n_clicks:int, fmt:str, compressed:bool, resolved:dict, map_year:Union[int, None])->Tuple[Union[dict, None], str]:
     '''
-    If the user specified line graph, with either domain=TOTAL and one data item, or domain isn't equal to TOTAL and there is one data item and one domain category, 
-    and the user has specified multiple states, tool needs to know whether user wants multiple lines, each line representing a state, or one line representing the statistic the user should have chosen by this step
-    
+    Downloads the graph figure once the Save Figure button is clicked
 
-    Present the options a user can pick to answer the question (multiple lines or one) through radio buttons ('Multiple Lines' and 'One Line')
-    To ask this question, conditions above must be met, if they are not the buttons are not displayed
+    Takes in the function Dash uses to report the progress of the background job (set_progress, takes a tuple of the progress bar value and its label), the number of times the save figure button has been clicked (an int n_clicks), the format the user chose to save the figure as (fmt, png, svg, or pdf),
+    whether the user wants the download compressed with gzip (a bool compressed),
+    the resolved selection held in 'selection-store' (the figure is looked up from it with get_figure, so the figure doesn't need to be sent back from the browser),
+    and the year chosen on the map's year slider (map_year, an int, only used for maps, the map of that year is saved, animations are saved as their first year)
 
-    Existence dependent on all previous specifications, including the visualization type stored as a string viz_type and the type of statistic chosen stored as string stat_type. This means it also takes the answer to multiple data item question as a string mult_dt_q, year(s) as a list of strings year, state(s) as a list of strings state_id,
-    commodity as a string commodity, domain as a string domain, data item as a string data_item, and possible domain categories as a list of strings domain_category (doesn't need to take in additional data items because mult_dt_q must be 'One Data Item' for the buttons to display)
-    
-    To account for all cases where domain=TOTAL and where it doesn't equal TOTAL, function checks validity of either item(s) in domain_category, and whether 'One Data Item' was specifed by mult_dt_q
-    It then determines whether years have been selected by the user, and if they are valid by querying the irrigation database (if there aren't any valid domain categories or years, or 'One Data Item' has not been chosen, the buttons don't display )
-    
+    Renders the figure (the cached figure of the resolved selection) in memory with the export service (queued to the renderers of a process serving the app)
+    and sends it straight to the user's browser, named by a hash of the figure. Nothing is written to the server's disk unless the app was created with archive mode on
+
+    Returns the download sent to the 'fig-download' item (None if there was nothing to save), and a string telling the user the name of the downloaded file
     '''
-    
-    
-    
-    vals=[] #by default radio buttons don't display
-    style={'display':'none'} 
-    if all([state_id, commodity, year, domain, data_item, stat_type, viz_type])==False: #if any of these essential fields haven't been filled (are not iterable like None, '' or ['']), the radio buttons do not display
-        return vals, style, style
-    
-    
-    lin_bool=encode_viz_type(viz_type)  #encodes viz_type to match the input of functions in Irr_DB.py
-    if lin_bool==True: #checks whether the user specified Line Graph, if they did not the radio buttons do not display
-        if len(state_id)>1: ##checking whether multiple states have been chosen, if not radio buttons don't display
-            if (domain!="TOTAL") & (data_item!='') & (len(domain_category)>=1): #if domain!=TOTAL, domain_category list shoudl exist
-                #check validity of items in domain_category (callback remembes previosu selections for different data specifications)
-                check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-                results=Irr_DB().get_domain_categories(check_dict, None)
-                valid_dc=[i for i in domain_category if i in results]
-                if (len(valid_dc)!=1): #only 1 valid domain category must have been chosen by the user, if not the radio buttons don't display
-                    return vals, style, style
-                year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category': valid_dc}
-
-            elif (domain == 'TOTAL') & (data_item!='') & (mult_dt_q=="One Data Item"): #if the user chose domain=TOTAL, they must have needed to choose 'One Data Item' to require this question to be asked, if not buttons don't display
-                year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            else: #catches any cases where domain_category hasn't been defined for domain !=TOTAL or where domain=TOTAL and mult_dt_q either has no answer or is 'Multiple Data Items'
-            #does not display the radio buttons in these cases
-                return vals, style, style
-        
-            #checks validity of years specified by user since callback remembers years previously chosen for different data specifications
-            year_results=Irr_DB().get_years(year_dict)
-            valid_yrs=[i for i in year if i in year_results]
-            if len(valid_yrs)==0: #if there are no valid years that have been chosen, the buttons don't display
-                return vals, style, style
-            style = {'display': 'inherit'} #If valid years have been chosen, buttons to answer the question multiple lines or one line are presented as 'Multiple Lines' and 'One Line'
-            vals=['Multiple Lines', 'One Line']
-                
-    return vals, style, style 
-
-
-
-
-
-##Display buttons to generate graph, save figure, and generate data table section
-# All of these buttons held in the html.Div fig-bt-div
-@callback(Output('fig-bt-div', 'style'),
-        Input('viz-r', 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input('tot-dom-dt', 'value'),
-        Input("mult-dt-r", 'value'), 
-        Input('dc-cl', 'value'),
-        Input('year-cl', 'value'),
-        Input('statq-r', 'value'),
-        Input('barxax-r', 'value'),
-        Input('line-n-r', 'value')
-          )
-
-def display_g_or_dt_buttons(viz_type:str,
-                            state_id:list[str],
-                            commodity:str,
-                            domain:str,
-                            data_item:str, 
-                            add_data_item:list[str],
-                            mult_dt_q:str, 
-                            domain_category:Union[list[str],list], 
-                            year:list[str],
-                            stat_type:str,
-                            barax:str,
-                            line_n:str) -> dict[str,str]:
-    
+
+    if n_clicks==0 or resolved['complete']==False:
+        return None, ''
+    if map_slider(resolved):
+        resolved=map_selection(resolved, map_year)
+    set_progress((25, "Building the figure"))
+    fig=get_figure(resolved)
+    set_progress((50, "Rendering the figure"))
+    file_name, data=export_service.download(fig, fmt)
+    if compressed:
+        set_progress((90, "Compressing the figure"))
+        file_name, data=compress(file_name, data)
+    return dcc.send_bytes(data, file_name), "Figure downloaded as "+file_name
+
+
+def get_table(resolved:dict)->Tuple[pd.DataFrame, str]:
     '''
-    Determines whether final buttons (Generate Graph, Save Figure, Generate Data Table) are displayed
+    Called by display_table and export_table once the resolved selection held in 'selection-store' is complete
 
-    Checks whether all required specifications have been selected by the user based on their selections, including the instances in which they have to answer targeted questions 
-    (such as multiple lines or one line for line graphs, or states or years on the x axis for bar plots)
-    
-    Because of this, takes in all of these parameters: visualization type described by a string viz_type, the statistic type described by a string stat_type,
-    the possible answer to the x axis question for bar plots (a string barax (default value is an empty string)), 
-    the possible answer to the number of lines question for line graphs (a string line_n (default value is an empty string)),
-    the state(s) selected as a list of strings state_id, year(s) as a list of strings year, commodity as a string commodity, domain as a string domain, data item as a string data_item,
-    possible additional data items as a list of strings add_data_item, and possible domain categories as a list of strings domain_category
-    
-    Checks validity of domain categories and additional data items entries if they are specified by the user since callback remembers past selections for different combinations of data specifications
-    Takes into account whether domain=TOTAL and the answer to the multiple data items or one stored in mult_dt_q
-    Then checks validity of years chosen by the user according to those valid domain categories or addiaiotnal data items 
-    If there are no valid items for these fields, depending on whether domain=TOTAL or not, the three buttons do not display
+    Gets the keyed results from the final query to the database with get_final_results and constructs the data table with the get_statistics function defined in data_table.py,
+    in the appropriate format for the line graph or bar plot the user chose (or with get_matrix_statistics for maps and animated bar plots, every state and year they show)
 
-    Then checks the cases in which barax or line_n need to have an answer, if they do not in these cases, the three buttons do not display
+    Gets the title of the data table, matching the title of the corresponding graph to the user's data specifications (retrieved by the get_full_title function in visualization.py),
+    with the line breaks within it removed
 
-    Returns a dictionary (key and value are strings) describing the display of the final three buttons held in a html.Div (describes whether the buttons are shown to the user or not)
+    Returns the data table as a pandas DataFrame, and its title as a string
     '''
-    
-    style={'display':'none'} #by default the three buttons are nto shown to the user
-
-    if all([state_id, commodity, domain, data_item, year, stat_type, viz_type])==False: #if any of these essential fields do not have a item selected (None, '' or ['']), the buttons do not display
-        return style
-
-    valid_dc=[]
-    valid_adt=[]
-    if (domain=='TOTAL') and (mult_dt_q=="Multiple Data Items"): 
-        #if domain=TOTAL and user wants to visualize multiple data items, 
-        #the additional data item field must at least one item, if not the buttons are not displayed
-        if len(add_data_item)==0:
-            return style
-        #checking validity of already selected data items since callback remembers selections from different data specifications
-        check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-        results = Irr_DB().get_domain_categories(check_dict, mult_dt_q)
-        valid_adt=[i for i in add_data_item if i in results]
-        if len(valid_adt)==0: #if there are no valid additional data items when domain=='TOTAL' and mult_dt_q=="Multiple Data Items" the buttons are not displayed
-            return style
-        ##sets up validity checking for years selected by user
-        year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]+valid_adt}
-    elif domain=='TOTAL' and mult_dt_q=="One Data Item": #no further validity checking when mult_dt_q=="One Data Item"
-        year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-
-    elif(domain!="TOTAL") & (data_item!='') & (len(domain_category)>=1):
-        #check validity of items in domain_category
-        check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-        results=Irr_DB().get_domain_categories(check_dict, None)
-        valid_dc=[i for i in domain_category if i in results]
-        if (len(valid_dc)==0): #if there are no valid domain categories selected by the user the three buttons aren't displayed
-            return style
-        ##sets up validity checking for years selected by user
-        year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category': valid_dc}
-    else: #this accounts for the instances in which there is no answer to mult_dt_q for when domain=TOTAL, and when domain!=TOTAL and one data item has been chosen, but no domain category(ies) have been chosen
-        return style #buttons do not display for these cases
-    
-    ##checking years and whether ones already specified are valid for current data specifications
-    year_results=Irr_DB().get_years(year_dict)
-    valid_yrs=[i for i in year if i in year_results]
-    if len(valid_yrs)==0: #if no valid years are selected by the user, the three buttons are not displayed
-        return style#, style
-    
-    ##Now checking for whether barax or line_n need to be more than empty strings
-    
-    lin_bool=encode_viz_type(viz_type) #encodes viz_type to match the input of functions in Irr_DB.py 
-    if lin_bool == True: #user specified Line Graph
-   
-        ##check for conditions that would require line_n 
-        if ((len(state_id)>1) & (domain!="TOTAL") & (len(valid_dc)==1)) | ((len(state_id)>1)&(domain == 'TOTAL') & (mult_dt_q=="One Data Item")):
-            if line_n!='': 
-                #if line_n does not have answer for how many lines should represent the multiple states specified by the user, 
-                # exits conditional to final return, making it so the three buttons do not display, buttons display otherwise
-                style = {'display': 'inherit'}
-        else: #buttons display if line_n can be an empty string
-            style = {'display': 'inherit'}
-
-    else: #user specified Bar Plot
-        ##check for conditions that would require bar_ax, since there are many cases (whether domain=TOTAL, amount of states selected, amount of years selected) broke it up into two conditionals
-        if ((len(state_id)==1) & (len(valid_yrs) ==1)) | ((len(state_id)>1) & (len(valid_yrs)>1)):
-            #cases where this is only one piece of data to be visualized withthe exception of states and years, requires barax to have a value 
-            if ((domain!="TOTAL") & (len(valid_dc)==1)) | ((domain == 'TOTAL') & (mult_dt_q=="One Data Item")):
-                if barax!='': #if barax does not have answer for what should be on the x axis (states or years)
-                # exits conditional to final return, making it so the three buttons do not display, buttons display otherwise
-                    style = {'display': 'inherit'}
-            else:
-                style = {'display': 'inherit'}
-        else:
-            style = {'display': 'inherit'}
+    params, final_results, encoded_answer=get_final_results(resolved, keyed=True)
+    if every_year(resolved): #data table of every state and year of the map or animation
+        df=get_matrix_statistics(final_results)
+    elif encode_viz_type(resolved['selection']['viz_type']): #data table in appropriate format for line graph
+        df=get_statistics(results=final_results, params=params, yr_or_states=None, s_multiple_or_one=encoded_answer, line_graph=True)
+    else: #data table in appropriate format for bar plot
+        df=get_statistics(results=final_results, params=params, yr_or_states=encoded_answer, s_multiple_or_one=None, line_graph=False)
 
-    return style
+    operation=data_service.db.which_statistic(resolved['selection']['stat_type'])
+    t_title=get_full_title(operation=operation, params=params, y_ax_title=value_units(params, operation))
+    table_title=t_title.replace('<br>', ' ')
+    return df, table_title
 
 
-##Display Graph section
+#Display Data Table section (whether the generate data table button is disabled is determined in button_states)
+#Runs as a background callback: the progress bar shows while the data table is being made, and the job is cancelled if the user changes their selections in the meantime
 
-@callback(Output('graph', 'figure'),
-        Output('graph', 'style'),
-        Output('graph-button', 'disabled'),
-        Input('graph-button', 'n_clicks'),
-        Input('viz-r', 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input('tot-dom-dt', 'value'),
-        Input("mult-dt-r", 'value'), #if dom == TOTAL
-        Input('dc-cl', 'value'),
-        Input('year-cl', 'value'),
-        Input('statq-r', 'value'),
-        Input('barxax-r', 'value'),
-        Input('line-n-r', 'value')
+@callback(Output('table-container', 'children'),
+        Output('table-container', 'style', allow_duplicate=True),
+        Input('data-table-button', 'n_clicks'),
+        State('selection-store', 'data'),
+        background=True,
+        running=[(Output('table-progress', 'style'), {'display': 'flex'}, {'display': 'none'})],
+        progress=[Output('table-progress', 'value'), Output('table-progress', 'label')],
+        cancel=[Input('selection-store', 'data')],
+        prevent_initial_call=True
         )
-def display_graph(n_clicks:int,
-                    viz_type:str,
-                    state_id:list[str],
-                    commodity:str,
-                    domain:str,
-                    data_item:str, 
-                    add_data_item:list[str],
-                    mult_dt_q:str, 
-                    domain_category:Union[list[str],list], 
-                    year:list[str],
-                    stat_type:str,
-                    barax:str,
-                    line_n:str)->Tuple[plotly.graph_objs._figure.Figure, dict[str,str], dict[str,str]]:
+@measured
+def display_table(set_progress:Callable, n_clicks:int, resolved:dict)->Tuple[list, dict[str,str]]:
     '''
-    Determines whether the corresponding graph to all the user's specifications, holding the results from the query to the irrigation database, is displayed or not, 
-    and whether the button the user clicks to generate the graph gets disabled
-
-    Since needs access to all previous user selections, takes in all of these parameters: visualization type described by a string viz_type, the statistic type described by a string stat_type,
-    the possible answer to the x axis question for bar plots (a string barax (default value is an empty string)), 
-    the possible answer to the number of lines question for line graphs (a string line_n (default value is an empty string)),
-    the state(s) selected as a list of strings state_id, year(s) as a list of strings year, commodity as a string commodity, domain as a string domain, data item as a string data_item,
-    possible additional data items as a list of strings add_data_item, and possible domain categories as a list of strings domain_category
-
-    If the generate graph button has not been clicked for a particular combination of user selections, graph does not display
-    If generate graph button has been clicked for a particular combination of user selections, it is disabled
-    Uses ctx.triggered to determine what has been most recently clicked (what triggered the callback)
-    
-    Uses previous function display_g_or_dt_buttons to determine whether all required selections (accounting for all cases regarding the value for domain and the amount of states and years specified) from the user are made, if not the graph is not displayed
-    If all required selections are made, acquires applicable valid selections (due to callback remembering past selections) to then use in a final query to the irrigation database (uses final_query and execute_final_query functions found in the Irr_DB class defined in Irr_DB.py)
-    Gets result from final query to the database and creates line graph or bar plot depending on earlier user choice by calling make_bar_plot or make_line_graph found in visualization.py, and graph is set to be displayed when the generate graph button is clicked
+    Determines whether data table holding the results from the query to the irrigation database, is displayed or not
 
-    Returns a plotly graph object, a dictionary (key and value are strings) to describe whether graph is displayed, and a boolean to describe whether the generate graph button is disabled (True for disabled, False for not disabled)
-    '''
-    
-    style = {'display': 'inherit'} #by default the graph is shown (but its default value is {} so empty graph will appear), and the button to generate the graph is disabled
-    disabled=False 
+    The data table and its appropriate title are created here and act as the children to the item 'table-container', which is what actually determined to be displayed or not
 
-    if n_clicks==0 or ctx.triggered[0]['prop_id']!='graph-button.n_clicks': 
-        #if the generate graph button hasn't been clicked at all, or isn't the most recent item interacted with by the user, 
-        #the graph is not shown and the generate graph button is disabled
-        style = {'display': 'none'}
-        fig={}
-        return fig, style,disabled
+    If data table is displayed, also displays a title over it as a html.Label matching the title of the corresponding graph to the user's data specifications
 
-    if ctx.triggered[0]['prop_id']=='graph-button.n_clicks': 
-        #once the generate graph button has been clicked (is the most recent action), the button should be disabled
-        #the button resets once any earlier choice by the user that filters the data in the irrigation database is changed 
-        disabled=True
-    
-    #calls the previous function display_g_or_dt_buttons because it already checks validity of every possible combination of domain, domain category, addiitonal data item, whether essential specifications have been defined by the user,
-    #and whether targeted specifications have been made by the user (special case for line graph with having to display multiple states, and special case for bar plot when determining if states or years are on the x axis)
-    check_button_conditions=display_g_or_dt_buttons(viz_type, state_id, commodity, domain, data_item, add_data_item, 
-                                                    mult_dt_q, domain_category, year, stat_type, barax, line_n)
-    ##returns a dictionary:
-    #   either {'display': 'inherit'}, meaning valid specifications set by user 
-    #   or {'display': 'none'} (both elements are the same) meaning invalid specifications/some haven't been filled out yet
-    
-    if check_button_conditions=={'display': 'none'}: ##this means a required selection from the user was not made, so the graph is not displayed
-        style={'display': 'none'}
-        fig={}
-        return fig, style, disabled
-    else: #all required data specifications made by the user are valid, 
-        #however still need to access the valid domain categories if applicable, valid additional data items if applicable, and corresponding valid years since callback remembers past year selection for different data specifications
-
-        valid_dc=[]
-        valid_adt=[]
-        ##if domain!=Total, need to access valid domain categories, and then related years
-        if domain !="TOTAL" and len(domain_category)>=1:
-            check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            results=Irr_DB().get_domain_categories(check_dict, None)
-            valid_dc=[i for i in domain_category if i in results]
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category':valid_dc}
-        
-        ##if domain=Total and mult_dt_q==Multiple data items, need to access valid addtional data items and then related years
-        elif domain == "TOTAL" and len(add_data_item)>=1 and mult_dt_q=="Multiple Data Items":
-            check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            results = Irr_DB().get_domain_categories(check_dict, mult_dt_q)
-            valid_adt=[i for i in add_data_item if i in results]
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]+valid_adt}
-        else: ##(domain==Total and mult_dt_q == One data item) 
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-
-        ##retrieving valid years (which should exist because check_button_conditions!={'display': 'none'})
-        year_results=Irr_DB().get_years(year_dict)
-        valid_yrs=[i for i in year if i in year_results]
-
-        year_dict['year']=valid_yrs ##adds valid years to existing dictionary checking for years (the last specification needed in the dictionary), 
-        #so then this dictionary can be used in querying the irrigation database for the final results to be displayed on the final graphs
-    
-        lin_bool=encode_viz_type(viz_type) #encoding the user choice of visualizatin type to match the input reuired for Irr_DB().final_query, Irr_DB().execute_final_query
-        if lin_bool == True:
-            ##checking for conditions that would require line_n to be more than '' (such as "Multiple Lines" or "One Line")
-            if ((len(state_id)>1) & (domain!="TOTAL") & (len(valid_dc)==1)) | ((len(state_id)>1)&(domain == 'TOTAL') & (mult_dt_q=="One Data Item")):
-                ##line_n should exist -- now can be interpreted as s_multiple_or_one to fit input of Irr_DB().final_query and Irr_DB().execute_final_query
-                final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=line_n, yr_or_states=None, line_graph=True) #makes sql string for query
-                final_results=Irr_DB().execute_final_query(final_query, year_dict, True) #executes query to irrigation database
-                fig=make_line_graph(params=year_dict, y_data=final_results, operation=Irr_DB().which_statistic(stat_type), s_multiple_or_one=Irr_DB().set_group_by_line(line_n)) #makes line graph
-                
-            else: #line_n does not need to be more than '', so final query, its execution, and resulting line graph are created
-                final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=None, yr_or_states=None, line_graph=True)
-                final_results=Irr_DB().execute_final_query(final_query, year_dict, True)
-                fig=make_line_graph(params=year_dict, y_data=final_results, operation=Irr_DB().which_statistic(stat_type), s_multiple_or_one=None)
-                
-        
-        else: #user specified Bar Plot
-
-        ##checking for condiitons that would require barax to be more than '' (such as "States" or "Years")
-            if ((len(state_id)==1) & (len(valid_yrs) ==1)) | ((len(state_id)>1) & (len(valid_yrs)>1)):
-     
-                if ((domain!="TOTAL") & (len(valid_dc)==1)) | ((domain == 'TOTAL') & (mult_dt_q=="One Data Item")):
-                    ##barax should exist, can now be interpreted as bar_ax to fit format of Irr_DB().final_query and Irr_DB().execute_final_query
-                    final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=None, yr_or_states=barax, line_graph=False) 
-           
-                    final_results=Irr_DB().execute_final_query(final_query, year_dict, False)
-    
-                    fig=make_bar_plot(year_dict, encode_key_name_ys(barax), final_results, Irr_DB().which_statistic(stat_type))
-    
-                    return fig, style, disabled
-    
-            #a barax does not need to be more than '', so final query, its execution, and resulting bar plot are created
-            final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=None, yr_or_states=None, line_graph=False)
-            final_results=Irr_DB().execute_final_query(final_query, year_dict, False)
-            fig=make_bar_plot(year_dict, None, final_results, Irr_DB().which_statistic(stat_type))
-    
+    The data table is made in memory with get_table (nothing is written to disk),
+    and is displayed as a paginated dash DataTable, so large data tables only send and render one page at a time
 
-        return fig,style, disabled
+    Only called when the generate data table button is clicked (the data table is hidden and the button reset by hide_results and button_states once the user changes a selection)
+    The progress of the background job is reported through set_progress (the function Dash passes in, takes a tuple of the progress bar value and its label)
 
+    Takes in the resolved selection held in 'selection-store'. If all required selections are made (the resolved selection is complete), the data table is made
 
-#Disable Save Figure button (and save figure) section (button already determined to be displayed or not in display_g_or_dt_buttons function)
-@callback(Output('save-fig-button', 'disabled'),
-        Input('save-fig-button', 'n_clicks'),
-        Input('graph-button', 'n_clicks'),
-        Input('graph','figure')
-)
-
-def display_save_fig_button(n_clicks:int, graph_clicks:int, output_fig:plotly.graph_objs._figure.Figure)->dict[str,str]:
-    '''
-    Determines whether the Save Figure button is disabled, and saves the graph figure if the button is clicked
-    
-    Takes in the number of times the save figure button has been clicked (an int n_clicks), the number of times the generate graph button has been clicked (an int graph_clicks),
-    and the resulting figure made once user clicks the generate graph button (a plotly graph object called output_fig)
-    
-    Uses ctx.triggered to determine what most recently triggered the callback
-    If the generate graph button has not been clicked (using graph_clicks), the save figure button is disabled
-    If most recent click was the generate graph button, enables the save figure button to be clicked
-    
-    If most recent click was the save figure button, saves the figure (output_fig) as a png to a folder called figures in a folder called user_results, 
-    names newly created figure using the number of times the save figure button has been clicked (n_clicks), so user should rename the file
-    and button is then disabled. The figure is written to a static image by using kaleido, as described by plotly documentation. 
-    
-    Returns a boolean determining whether the save figure button is disabled (True) or not (False)
+    Returns a list (one item a str for the label above the table, and the other a dash DataTable),
+    and a dictionary (key and value are strings) that describes whether the container holding the data table and its title is displayed or not
     '''
-    
-    disabled=False #by default button is not disabled
-    
-    if graph_clicks==0: #if the generate graph button has not been clicked, the save figure button is disabled
-        disabled=True
-        return disabled 
-    elif ctx.triggered[0]['prop_id']=='save-fig-button.n_clicks': 
-        #if the save figure button has been clicked, saves the resulting graph to a folder called figures in a folder called user_results, 
-        # with the name dependent on how many times thesave figure button has been clicked in a session (user should rename this once file is created)
-        write_image(output_fig,"user_results/figures/fig_"+str(n_clicks)+".png")
-        disabled=True #disables save figure button
-    elif (ctx.triggered[0]['prop_id']=='graph.figure'): 
-        #this accounts cases in which the most recent item that triggered the callback was graph.figure, 
-        # if any data specification was changed by the user, this is what triggers this callback (even if the generate graph button or save figure button wouldn't be clicked)
-        #accounts for this to make it specifcally the user clicking on the generate graph button to enable the save figure button, and then only the user clicking the save figure button is what disables it
-        disabled=True
-        return disabled 
-
-    return disabled
-
-
-#Display Data Table, and whether the generate data table button is disabled, section
 
-@callback(Output('table-container', 'children'),
-        Output('table-container', 'style'),
-        Output('data-table-button', 'disabled'),
-        Input('data-table-button', 'n_clicks'),
-        Input('viz-r', 'value'),
-        Input('state-cl', 'value'),
-        Input('com-dd', 'value'),
-        Input('dom-dd', 'value'),
-        Input('dt-dd', 'value'),
-        Input('tot-dom-dt', 'value'),
-        Input("mult-dt-r", 'value'), 
-        Input('dc-cl', 'value'),
-        Input('year-cl', 'value'),
-        Input('statq-r', 'value'),
-        Input('barxax-r', 'value'),
-        Input('line-n-r', 'value')
+    if n_clicks==0 or resolved['complete']==False: ##this means a required selection from the user was not made, so the data table is not displayed
+        style={'display': 'none'}
+        children=[]
+        return children, style
+
+    set_progress((25, "Querying the irrigation database"))
+    df, table_title=get_table(resolved)
+    set_progress((75, "Making the data table"))
+    style={'display': 'inherit'} #container holding data table will be displayed
+
+    final_t_title=html.Label(table_title, style={'font-weight':'bold'}) #sets the label to be bold
+    #converts the data frame to a dash DataTable, showing 25 rows per page and keeping the header in view while scrolling
+    table=dash_table.DataTable(data=df.to_dict('records'),
+                               columns=[{'name': col, 'id': col} for col in df.columns],
+                               page_size=25,
+                               fixed_rows={'headers': True},
+                               sort_action='native',
+                               style_table={'overflowX': 'auto', 'maxHeight': '600px'},
+                               style_header={'fontWeight': 'bold'},
+                               style_cell={'textAlign': 'left', 'minWidth': '100px'})
+    children=[final_t_title, table] #adds the label and data table to the container holding them
+    return children, style
+
+
+#Export Data Table section (button already determined to be displayed or not in display_g_or_dt_buttons function, and disabled or not in button_states)
+#Runs as a background callback: the progress bar shows while the data table is being written, and the job is cancelled if the user changes their selections in the meantime
+
+@callback(Output('table-download', 'data'),
+        Output('export-table-status', 'children'),
+        Input('export-table-button', 'n_clicks'),
+        State('table-format-r', 'value'),
+        State('table-compression-r', 'value'),
+        State('selection-store', 'data'),
+        background=True,
+        running=[(Output('export-table-progress', 'style'), {'display': 'flex'}, {'display': 'none'})],
+        progress=[Output('export-table-progress', 'value'), Output('export-table-progress', 'label')],
+        cancel=[Input('selection-store', 'data')],
+        prevent_initial_call=True
         )
-def display_table(n_clicks:int,
-                    viz_type:str,
-                    state_id:list[str],
-                    commodity:str,
-                    domain:str,
-                    data_item:str, 
-                    add_data_item:list[str],
-                    mult_dt_q:str, 
-                    domain_category:Union[list[str],list], 
-                    year:list[str],
-                    stat_type:str,
-                    barax:str,
-                    line_n:str)->Tuple[list, dict[str,str], dict[str,str]]:
+@measured
+def export_table(set_progress:Callable, n_clicks:int, fmt:str, compression:str, resolved:dict)->Tuple[Union[dict, None], str]:
     '''
-    Determines whether data table holding the results from the query to the irrigation database, is displayed or not, 
-    and whether the button the user clicks to generate the data table gets disabled
+    Downloads the data table once the Export Data Table button is clicked
 
-    The data table and its appropriate title are created here and act as the children to the item 'table-container', which is what actually determined to be displayed or not
-    
-    If data table is displayed, also displays a title over it as a html.Label matching the title of the corresponding graph to the user's data specifications (retrieved by the get_full_title function in visualization.py)
-    
-    To display the data table, writes the data table to a .csv with the get_statistics function defined in data_table.py, 
-    the name of the file is uniquely identified with how many times the generate data table button has been clicked in a session (an int passed in as n_clicks), 
-    and is saved a folder called tables within another folder called user_results (user should rename file once table is created)
-    Then reads that .csv file to become a dash bootstrap table component to match the dash bootstrap theme, and the table is then added to 'table-container', along with the appropriate title 
-    
-    If the generate data table button has not been clicked for a particular combination of user selections, data table does not display
-    If generate data table button has been clicked for a particular combination of user selections, it is disabled
-    Uses ctx.triggered to determine what has been most recently clicked (what triggered the callback)
-    
-    Format of visualization is needed to be known in order to format the data table appropriately (passed in as a string viz_type)
-    To construct the data table independent of making the corresponding graph, needs access to all previous user data selections.
-
-    Takes in all of these additional parameters: the statistic type described by a string stat_type,
-    the possible answer to the x axis question for bar plots (a string barax (default value is an empty string)), 
-    the possible answer to the number of lines question for line graphs (a string line_n (default value is an empty string)),
-    the state(s) selected as a list of strings state_id, year(s) as a list of strings year, commodity as a string commodity, domain as a string domain, data item as a string data_item,
-    possible additional data items as a list of strings add_data_item, and possible domain categories as a list of strings domain_category
-    
-    Uses previous function display_g_or_dt_buttons to determine whether all required selections (accounting for all cases regarding the value for domain and the amount of states and years specified) from the user are made, if not the graph is not displayed
-    If all required selections are made, acquires applicable valid selections (due to callback remembering past selections) to then use in a final query to the irrigation database (uses final_query and execute_final_query functions found in the Irr_DB class defined in Irr_DB.py)
-    Gets result from final query to the database and constructs data table with get_statistics function defined in data_table.py
-    
-    
-    Returns a list (one item a dash bootstrap table component, and the other a str for the label above the table), 
-    and a dictionary (key and value are strings) that describes whether the container holding the data table and its title is displayed or not,
-    and a boolean that describes whether the generate data table button is disabled (True for disabled, False for not disabled) 
+    Takes in the function Dash uses to report the progress of the background job (set_progress, takes a tuple of the progress bar value and its label), the number of times the export data table button has been clicked (an int n_clicks), the format the user chose to download the data table as (fmt, csv, parquet, xlsx, or jsonl),
+    the compression they chose (none, gzip, or zstd, see table_export.py), and the resolved selection held in 'selection-store'
+
+    Writes the data table (made again with get_table, the query results are cached so the database isn't queried again) as fmt with compression in memory
+    and sends it straight to the user's browser, named by a hash of its content. Nothing is written to the server's disk unless the app was created with archive mode on
+
+    Returns the download sent to the 'table-download' item (None if there was nothing to save), and a string telling the user the name of the downloaded file
+    (or why it couldn't be downloaded, such as the package the format needs not being installed)
     '''
+    if n_clicks==0 or resolved['complete']==False:
+        return None, ''
+    set_progress((25, "Querying the irrigation database"))
+    df, _=get_table(resolved)
+    set_progress((50, "Writing the data table"))
+    try:
+        file_name, data=export_service.download_table(df, fmt, compression)
+    except ValueError as e:
+        return None, str(e)
+    return dcc.send_bytes(data, file_name), "Data table downloaded as "+file_name
+
+
+#Export Raw Data section
+#The link's address holds the selections' params, format, and compression (raw_export_link in assets/results.js), so the browser downloads the file straight from the export_raw route
+clientside_callback(
+    ClientsideFunction(namespace='results', function_name='raw_export_link'),
+    Output('raw-export-link', 'href'),
+    Output('raw-export-link', 'style'),
+    Input('selection-store', 'data'),
+    Input('table-format-r', 'value'),
+    Input('table-compression-r', 'value')
+)
 
-    disabled=False #by default the button to generate the data table is enabled
 
-    if ctx.triggered[0]['prop_id']=='data-table-button.n_clicks': #if the generate data table button has been clicked, the button is disabled
-        disabled=True
-    
-    if n_clicks==0 or ctx.triggered[0]['prop_id']!='data-table-button.n_clicks': 
-        #if the generate data table button hasn't been clicked, the html.div container meant to hold the data table is not displayed
-        style = {'display': 'none'}
-        children=[]
-        return children, style, disabled
-    #the generate data table button has now been clicked
-
-    #calls the previous function display_g_or_dt_buttons because it already checks validity of every possible combination of domain, domain category, addiitonal data item, whether essential specifications have been defined by the user,
-    #and whether targeted specifications have been made by the user (special case for line graph with having to display multiple states, and special case for bar plot when determining if states or years are on the x axis)
-    check_button_conditions=display_g_or_dt_buttons(viz_type, state_id, commodity, domain, data_item, add_data_item, 
-                                                    mult_dt_q, domain_category, year, stat_type, barax, line_n)
-    ##returns a dictionary:
-    #   either {'display': 'inherit'}, meaning valid specifications set by user 
-    #   or {'display': 'none'} (both elements are the same) meaning invalid specifications/some haven't been filled out yet
-    
-    
-    if check_button_conditions=={'display': 'none'}: ##this means a required selection from the user was not made, so the data table is not displayed
-        style={'display': 'none'}
-        children=[]
-        return children, style, disabled
-
-
-    else:  #all required data specifications made by the user are valid, 
-        #however still need to access the valid domain categories if applicable, valid additional data items if applicable, and corresponding valid years since callback remembers past year selection for different data specifications
-        valid_dc=[]
-        valid_adt=[]
-        ##if domain!=Total, need to access valid domain categories, and then related years
-        if domain !="TOTAL" and len(domain_category)>=1:
-            check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            results=Irr_DB().get_domain_categories(check_dict, None)
-            valid_dc=[i for i in domain_category if i in results]
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category':valid_dc}
-        
-        ##if domain=Total and mult_dt_q==Multiple data items, need to access valid addtional data items and then related years
-        elif domain == "TOTAL" and len(add_data_item)>=1 and mult_dt_q=="Multiple Data Items":
-            check_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-            results = Irr_DB().get_domain_categories(check_dict, mult_dt_q)
-            valid_adt=[i for i in add_data_item if i in results]
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]+valid_adt}
-        else: ##(domain==Total and mult_dt_q == One data item) 
-            year_dict={'state_id':state_id,'commodity': [commodity], 'domain':[domain], 'data_item':[data_item]}
-
-       
-        ##retrieving valid years (which should exist because check_button_conditions!={'display': 'none'})
-        year_results=Irr_DB().get_years(year_dict)
-        valid_yrs=[i for i in year if i in year_results]
-
-        year_dict['year']=valid_yrs #adds valid years to existing dictionary checking for years (the last specification needed in the dictionary), 
-        #so then this dictionary can be used in querying the irrigation database for the final results to be displayed on the final graphs
-    
-        
-        final_path=PATH_DT+str(n_clicks)+".csv" #constructs unique .csv file name for this paritcular session on the webpage
-
-        lin_bool=encode_viz_type(viz_type) #encoding the user choice of visualizatin type to match the input required for Irr_DB().final_query, Irr_DB().execute_final_query
-        
-        if lin_bool == True:
-            ##checking for conditions that would require line_n to be more than '' (such as "Multiple Lines" or "One Line")
-
-            if ((len(state_id)>1) & (domain!="TOTAL") & (len(valid_dc)==1)) | ((len(state_id)>1)&(domain == 'TOTAL') & (mult_dt_q=="One Data Item")):
-                ##line_n should exist -- now can be interpreted as s_multiple_or_one to fit input of Irr_DB().final_query and Irr_DB().execute_final_query
-                final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=line_n, yr_or_states=None, line_graph=True) #makes sql string to be final query to the irrigation database
-                final_results=Irr_DB().execute_final_query(final_query, year_dict, True) #gets results from the query to the database 
-                get_statistics(path=final_path, vals=final_results, params=year_dict, yr_or_states=None, s_multiple_or_one=Irr_DB().set_group_by_line(line_n), line_graph=True) #writes .csv file in appropriate format for line graph
-            
-            else: #line_n does not need to be more than '', so final query, its execution, and resulting data table in a .csv file are created
-                final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=None, yr_or_states=None, line_graph=True) #makes sql string to be final query to the irrigation database
-                final_results=Irr_DB().execute_final_query(final_query, year_dict, True)#gets results from the query to the database 
-                get_statistics(path=final_path, vals=final_results, params=year_dict, yr_or_states=None, s_multiple_or_one=None, line_graph=True) #writes .csv file in appropriate format for line graph
-
-        
-        else: #user specified Bar Plot as visualization type
- 
-        ##checking for condiitons that would require barax to be more than '' (such as "States" or "Years")
-    
-            if ((len(state_id)==1) & (len(valid_yrs) ==1)) | ((len(state_id)>1) & (len(valid_yrs)>1)):
-              
-                if ((domain!="TOTAL") & (len(valid_dc)==1)) | ((domain == 'TOTAL') & (mult_dt_q=="One Data Item")):
-                    ##barax should exist, can now be interpreted as bar_ax to fit format of Irr_DB().final_query and Irr_DB().execute_final_query
-                    final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=None, yr_or_states=barax, line_graph=False)
-                    final_results=Irr_DB().execute_final_query(final_query, year_dict, False)
-        
-                    get_statistics(path=final_path, vals=final_results, params=year_dict, yr_or_states=encode_key_name_ys(barax), s_multiple_or_one=None, line_graph=False)
-                    
-                    #obtains .csv file written with get_statistics
-                    df = pd.read_csv(final_path)
-                    style={'display': 'inherit'} #container holding data table will be displayed
-
-                    
-                    #obtaining table to be placed above the data table as an html.Label using get_full_title in visualization.py
-                    #removes the line breaks that are within it
-                    t_title=get_full_title(operation=Irr_DB().which_statistic(stat_type), params=year_dict, y_ax_title=year_dict['data_item'][0].split(' - ')[-1])
-                    table_title=t_title.replace('<br>', ' ')
-                    final_t_title=html.Label(table_title, style={'font-weight':'bold'}) #sets the label to be bold
-                    table=dbc.Table.from_dataframe(df,  bordered=True, hover=True, index=False) #converts the data frame to a dash bootstrap table component (allows hovering, and gets rid of an index column)
-                    children=[final_t_title, table] #adds the label and data table to the container holding them 
-
-                    return children, style, disabled
-
-            #a barax does not need to be more than '', so final query, its execution, and resulting data table is a .csv file are created
-            
-            final_query=Irr_DB().final_query(operation=stat_type, params=year_dict, s_multiple_or_one=None, yr_or_states=None, line_graph=False)
-            final_results=Irr_DB().execute_final_query(final_query, year_dict, False)
-            get_statistics(path=final_path, vals=final_results, params=year_dict, yr_or_states=None, s_multiple_or_one=None, line_graph=False)
- 
-        
-        #obtains .csv file written with get_statistics (in case where barax could be '')
-        df = pd.read_csv(final_path)
-        style={'display': 'inherit'} #container holding data table will be displayed
-
-        #obtaining table (when barax could be '') to be placed above the data table as an html.Label using get_full_title in visualization.py
-        #removes the line breaks that are within it
-        t_title=get_full_title(operation=Irr_DB().which_statistic(stat_type), params=year_dict, y_ax_title=year_dict['data_item'][0].split(' - ')[-1])
-        table_title=t_title.replace('<br>', ' ')
-        final_t_title=html.Label(table_title, style={'font-weight':'bold'}) #sets the label to be bold
-        table=dbc.Table.from_dataframe(df,  bordered=True, hover=True, index=False) #converts the data frame to a dash bootstrap table component (allows hovering, and gets rid of an index column)
-        children=[final_t_title, table] #adds the label and data table to the container holding them
-        return children, style, disabled 
+def export_raw()->Response:
+    '''
+    Flask route (export/raw, added to the app's server in create_app) downloading the raw rows of tMain matching the params given in its query string as JSON
+    (such as the params of the resolved selection held in 'selection-store', see raw_query in the Irr_DB class), as the format and compression given (csv, parquet, or jsonl, see table_export.py)
+
+    The rows are fetched in batches (stream_raw_rows in the Irr_DB class) and each batch is written and sent to the user's browser before the next one is fetched (stream_table in table_export.py),
+    so the server only holds one batch in memory however many rows match. dcc.Download can't be used since it sends the whole file at once from a callback.
+    The file is named by a hash of the params, format, and compression, since its content isn't known until every row is sent
+
+    Returns the response streaming the file, or a response with status 400 saying why the file can't be made (params that aren't valid JSON or aren't columns of tMain, or a format that can't be streamed)
+    '''
+    fmt=request.args.get('format', 'csv')
+    compression=request.args.get('compression', 'none')
+    try:
+        params=json.loads(request.args.get('params', '{}'))
+        if not isinstance(params, dict):
+            raise ValueError('params must be a JSON object')
+        query=data_service.db.raw_query(params)
+        chunks=stream_table(data_service.db.stream_raw_rows(query, params), fmt, compression)
+    except ValueError as e: #json.JSONDecodeError is a ValueError
+        return Response(str(e), status=400, mimetype='text/plain')
+    key=hashlib.sha256(json.dumps([params, fmt, compression], sort_keys=True).encode()).hexdigest()[:16]
+    file_name='raw_'+key+'.'+table_extension(fmt, compression)
+    return Response(chunks, mimetype='application/octet-stream', headers={'Content-Disposition': 'attachment; filename="'+file_name+'"'})
 
     
 if __name__ == '__main__':
-    # debug=True will show some errors on the webpage if they occur
+    app=create_app()
+    # debug=True will show some errors on the webpage if they occur (only for running the tool locally, wsgi.py serves the app without it)
     app.run(debug=True)
     
@@ -0,0 +1,301 @@
+'''
+Batch report generator of the tool, makes the graphs and data tables of many selections at once without the Dash app. Run from the root of the repository with:
+    python report.py --commodities WATER WELLS --states CA,NE,TX CO --stats Sum Average
+
+The selections are a grid of visualization types x commodities x domains x data items x state groups x statistics, each over the same years:
+    --states takes groups of states (each a comma separated list), every group is its own graph
+    --stats also takes the statistics derived from the sum (Percent Change, Annual Growth Rate, and Ratio, which divides by the data item in --ratio-item)
+    --domains defaults to TOTAL only (--domains with nothing after it takes every domain), a domain other than TOTAL graphs every domain category of each of its data items
+    --data-items defaults to every data item of each commodity and domain available for the states, --years defaults to every year available for the states
+    bar plots of several states and years have states on the x axis, line graphs of several states have a line per state (--barax and --line-n change these)
+
+The graphs and data tables are made in parallel by a pool of processes (--processes), each querying the database itself.
+Every graph is rendered (as each format in --formats) by the export service's pool of kaleido processes, all at once so they are rendered in parallel,
+and every data table is written as --table-format (csv by default, or parquet, xlsx, or jsonl) compressed with --table-compression (see table_export.py).
+
+The manifest (manifest.json in the output folder) lists the files made for every selection, under a key hashing the resolved selection and when the database last changed.
+Rerunning a report skips every selection whose key and files are still there without making its graph or data table again, and marks it unchanged.
+Files are named by a hash of their content, so a selection that is made again (the database changed) only renders and writes the files whose content changed
+'''
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.data_service import DataService
+from src.Irr_DB import Irr_DB, PATH_DB, AGGREGATE_STATISTICS, YEAR_STATISTICS, RATIO_STATISTIC
+from src.export_service import ExportService, EXPORT_FORMATS, write_file
+from src.table_export import TABLE_FORMATS, TABLE_COMPRESSIONS, table_bytes, table_extension, check_table_format
+from src.visualization import make_bar_plot, make_line_graph, encode_viz_type, encode_key_name_ys, get_full_title, value_units
+from src.data_table import get_statistics
+
+##folder reports are written to by default, graphs go in its figures folder and data tables in its tables folder
+PATH_REPORTS='user_results/reports'
+
+##the irrigation database each process of the pool making the graphs and data tables queries, opened once the process starts (see start_report_process)
+process_db=None
+
+
+def report_selections(db, viz_types:list[str], commodities:list[str], data_items:list[str], state_groups:list[list[str]], years:list[str],
+                      stats:list[str], barax:str, line_n:str, ratio_item:str='', domains:list[str]=['TOTAL'])->list[dict]:
+    '''
+    Takes in the irrigation database (db, an Irr_DB), and each dimension of the grid of selections (lists of strings, state_groups is a list of lists of state abbreviations)
+    An empty list of commodities, domains, data items, or years means every one available, ratio_item (a string) is the data item the Ratio statistic divides by, named with its commodity (see total_data_items in Irr_DB.py)
+    When every domain is taken, the data items listed are only crossed with the domains that have them
+
+    Resolves every selection in the grid with resolve_selection in the Irr_DB class, in the same way the Dash app does for a user making the same choices
+    (one data item, every domain category of it for a domain other than TOTAL, and the answer barax or line_n to the bar plot or line graph question if it is asked)
+
+    Returns a list of the selections (dictionaries as held in 'selection-store' in main_dash.py), selections that aren't complete
+    (the data item isn't available for the states, none of the years are, or the statistic can't be used, such as a year statistic of a single year) hold the reason under 'skipped'
+    '''
+    selections=[]
+    for viz_type, states in itertools.product(viz_types, state_groups):
+        base={'viz_type':viz_type, 'state_id':states, 'mult_dt_q':'One Data Item', 'barax':barax, 'line_n':line_n, 'ratio_item':ratio_item}
+        for commodity in commodities or db.resolve_selection(base)['options']['commodity']:
+            for domain in domains or db.resolve_selection(dict(base, commodity=commodity))['options']['domain']:
+                available=db.resolve_selection(dict(base, commodity=commodity, domain=domain))['options']['data_item']
+                items=data_items or available
+                if len(domains)==0: #every domain, the data items listed are only made for the domains that have them
+                    items=[i for i in items if i in available]
+                selections+=resolve_items(db, dict(base, commodity=commodity, domain=domain), items, years, stats)
+    return selections
+
+
+def resolve_items(db, base:dict, data_items:list[str], years:list[str], stats:list[str])->list[dict]:
+    '''
+    Resolves the selection of every data item (in data_items) and statistic (in stats, lists of strings) of a group of states, commodity and domain (base, a dictionary of choices),
+    over the years of years (a list of strings, every year available if empty), for report_selections
+
+    Returns a list of the resolved selections, those that aren't complete hold the reason under 'skipped'
+    '''
+    selections=[]
+    for data_item, stat_type in itertools.product(data_items, stats):
+        selection=dict(base, data_item=data_item, stat_type=stat_type)
+        if base['domain']!='TOTAL': #every domain category of the data item
+            selection['domain_category']=db.resolve_selection(selection)['options']['domain_category']
+        valid_yrs=db.resolve_selection(selection)['options']['year']
+        selection['year']=[i for i in years if i in valid_yrs] if years else valid_yrs
+        resolved=db.resolve_selection(selection)
+        resolved['selection']=selection
+        if not resolved['complete'] and len(resolved['valid']['year'])>0:
+            resolved['skipped']=stat_type+' not available for the selection' #a year statistic of one year or of states on the x axis, or a ratio to a data item not available
+        elif not resolved['complete']:
+            resolved['skipped']='no data for the states and years' if len(valid_yrs) else 'data item not available for the states'
+        selections+=[resolved]
+    return selections
+
+
+def make_report_item(db, resolved:dict)->tuple[object, object, str]:
+    '''
+    Makes the graph and data table of a complete resolved selection (resolved, made by report_selections) with the same functions the Dash app uses:
+    final_query, execute_final_query, and execute_keyed_query in the Irr_DB class, make_bar_plot or make_line_graph in visualization.py, and get_statistics in data_table.py
+
+    Returns the graph (a plotly figure), the data table (a pandas DataFrame), and the title of the graph with its line breaks removed (a string)
+    '''
+    params=resolved['params']
+    selection=resolved['selection']
+    line_graph=encode_viz_type(selection['viz_type'])
+    s_multiple_or_one=resolved['s_multiple_or_one']
+    yr_or_states=resolved['yr_or_states']
+    query=db.final_query(operation=selection['stat_type'], params=params, s_multiple_or_one=s_multiple_or_one, yr_or_states=yr_or_states, line_graph=line_graph)
+    final_results=db.execute_final_query(query, params, line_graph)
+    keyed_results=db.execute_keyed_query(query, params)
+    operation=db.which_statistic(selection['stat_type'])
+    if line_graph:
+        encoded_answer=db.set_group_by_line(s_multiple_or_one) if s_multiple_or_one!=None else None
+        fig=make_line_graph(params=params, y_data=final_results, operation=operation, s_multiple_or_one=encoded_answer)
+        df=get_statistics(results=keyed_results, params=params, yr_or_states=None, s_multiple_or_one=encoded_answer, line_graph=True)
+    else:
+        encoded_answer=encode_key_name_ys(yr_or_states) if yr_or_states!=None else None
+        fig=make_bar_plot(params, encoded_answer, final_results, operation)
+        df=get_statistics(results=keyed_results, params=params, yr_or_states=encoded_answer, s_multiple_or_one=None, line_graph=False)
+    title=get_full_title(operation=operation, params=params, y_ax_title=value_units(params, operation)).replace('<br>', ' ')
+    return fig, df, title
+
+
+def start_report_process(path_db:str)->None:
+    '''
+    Runs once in each process of the pool making the graphs and data tables when it starts, opens the irrigation database at path_db (a string) for it to query
+
+    Returns None
+    '''
+    global process_db
+    process_db=Irr_DB(path_db)
+    return
+
+
+def make_process_item(resolved:dict)->tuple[object, object, str]:
+    '''
+    Runs in a process of the pool, makes the graph and data table of the complete resolved selection (resolved) with make_report_item over the database of the process
+
+    Returns the same as make_report_item
+    '''
+    return make_report_item(process_db, resolved)
+
+
+def item_key(resolved:dict, db_mtime:float)->str:
+    '''
+    Gets the key of a resolved selection (resolved, made by report_selections) in the manifest, a hash of the resolved selection (its choices, params and answers)
+    and of when the database last changed (db_mtime, a float of seconds), so a selection is only made again if it or the database changed
+
+    Returns the key as a string
+    '''
+    return hashlib.sha256((json.dumps(resolved, sort_keys=True, default=str)+str(db_mtime)).encode()).hexdigest()[:16]
+
+
+def unchanged_item(previous:dict, key:str, out_dir:str, formats:list[str], table_format:str)->dict:
+    '''
+    Finds the item with key (a string, see item_key) in the previous manifest of the report (previous, a dictionary of items by key, read from out_dir, a string),
+    as long as it has a file of each format in formats and table_format (strings) and they are all still in out_dir
+
+    Returns the item of the previous manifest (a dictionary), None if the selection has to be made again
+    '''
+    item=previous.get(key)
+    if item==None or 'files' not in item:
+        return None
+    for fmt in formats+[table_format]:
+        if fmt not in item['files'] or not os.path.exists(os.path.join(out_dir, item['files'][fmt])):
+            return None
+    return item
+
+
+def read_manifest(out_dir:str, table_format:str, table_compression:str)->dict:
+    '''
+    Reads the manifest of the report last written to out_dir (a string), if its data tables were written as table_format with table_compression (strings)
+
+    Returns a dictionary of the items of the manifest by their key (empty if there is no manifest to reuse)
+    '''
+    path=os.path.join(out_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        manifest=json.load(f)
+    if manifest.get('table_format')!=table_format or manifest.get('table_compression')!=table_compression:
+        return {}
+    return {item['key']: item for item in manifest['items'] if 'key' in item}
+
+
+def make_report(selections:list[dict], db, export_service:ExportService, formats:list[str], out_dir:str, table_format:str='csv', table_compression:str='none',
+                processes:int=1)->dict:
+    '''
+    Makes the graph and data table of every complete selection in selections (made by report_selections) with make_report_item,
+    in a pool of processes (processes, an int, each opening its own connection to the database) if there is more than one,
+    then renders every graph as each format in formats (strings in EXPORT_FORMATS) with export_many of the export service (in parallel across its pool of processes)
+    and writes every data table to its table folder as table_format with table_compression (strings, see table_export.py). Graphs and data tables whose file (named by a hash of its content) already exists aren't rendered or written again
+
+    Every selection is keyed by a hash of the resolved selection and of when the database last changed (see item_key). A selection already in the last manifest written to out_dir
+    under the same key, with every file it needs still there, is left as it was without making its graph or data table
+
+    Writes the manifest of the report to manifest.json in out_dir (a string): for every selection, its key, choices, the title of its graph,
+    the paths of its files (relative to out_dir) and whether each was made by this run ('written') or left as it was ('unchanged'), or why it was skipped
+
+    Returns the manifest as a dictionary
+    '''
+    check_table_format(table_format, table_compression) #before any graph is made, so a missing package is reported right away
+    db_mtime=os.path.getmtime(db.path_db)
+    previous=read_manifest(out_dir, table_format, table_compression)
+    items=[]
+    to_make=[]
+    for resolved in selections:
+        selection=resolved['selection']
+        item={'viz_type':selection['viz_type'], 'commodity':selection['commodity'], 'domain':selection['domain'], 'data_item':selection['data_item'],
+              'state_id':sorted(selection['state_id']), 'year':resolved['params']['year'] if resolved['params']!=None else [], 'stat_type':selection['stat_type']}
+        if selection['domain']!='TOTAL':
+            item['domain_category']=selection.get('domain_category', [])
+        if selection['stat_type']==RATIO_STATISTIC:
+            item['ratio_item']=selection['ratio_item']
+        if 'skipped' in resolved:
+            items+=[dict(item, skipped=resolved['skipped'])]
+            continue
+        key=item_key(resolved, db_mtime)
+        unchanged=unchanged_item(previous, key, out_dir, formats, table_format)
+        if unchanged!=None: #neither the selection nor the database changed since the last report
+            items+=[dict(item, key=key, title=unchanged['title'], files={fmt: unchanged['files'][fmt] for fmt in [table_format]+formats},
+                         status={fmt: 'unchanged' for fmt in [table_format]+formats})]
+            continue
+        items+=[dict(item, key=key, files={}, status={})]
+        to_make+=[(items[-1], resolved)]
+
+    ##graphs and data tables of the selections that changed, made in parallel by a pool of processes each querying the database
+    if processes>1 and len(to_make)>1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(to_make)), mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=start_report_process, initargs=(db.path_db,)) as pool:
+            made=list(pool.map(make_process_item, [resolved for _, resolved in to_make]))
+    else:
+        made=[make_report_item(db, resolved) for _, resolved in to_make]
+    figs=[]
+    for (item, _), (fig, df, title) in zip(to_make, made):
+        item['title']=title
+        figs+=[(item, fig, df)]
+
+    ##data tables, written unless a table with the same content already exists
+    written=set() #tables written by this run, two selections can have the same data table
+    for item, _, df in figs:
+        data=table_bytes(df, table_format, table_compression)
+        path=os.path.join(export_service.table_dir, export_service.table_file_name(data, table_extension(table_format, table_compression)))
+        if not os.path.exists(path):
+            write_file(path, data)
+            written.add(path)
+        item['status'][table_format]='written' if path in written else 'unchanged'
+        item['files'][table_format]=os.path.relpath(path, out_dir)
+
+    ##graphs, every format is queued to the pool at once
+    for fmt in formats:
+        existed=[os.path.exists(export_service.file_path(export_service.serialize(fig), fmt)) for _, fig, _ in figs]
+        paths=export_service.export_many([fig for _, fig, _ in figs], fmt)
+        for (item, _, _), path, exists in zip(figs, paths, existed):
+            item['files'][fmt]=os.path.relpath(path, out_dir)
+            item['status'][fmt]='unchanged' if exists else 'written'
+
+    manifest={'database': os.path.abspath(db.path_db), 'database_mtime': db_mtime, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'formats': formats,
+              'table_format': table_format, 'table_compression': table_compression, 'items': items}
+    write_file(os.path.join(out_dir, 'manifest.json'), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Makes the graphs and data tables of a grid of selections')
+    parser.add_argument('--viz', nargs='+', default=['Bar Plot'], choices=['Bar Plot', 'Line Graph'], help='visualization types')
+    parser.add_argument('--commodities', nargs='*', default=[], help='commodities (every commodity by default)')
+    parser.add_argument('--domains', nargs='*', default=['TOTAL'], help='domains (TOTAL by default, every domain if none are listed), other domains graph every domain category of each data item')
+    parser.add_argument('--data-items', nargs='*', default=[], help='data items (every data item of each commodity and domain by default)')
+    parser.add_argument('--states', nargs='+', required=True, help='groups of states, each a comma separated list of state abbreviations (such as CA,NE,TX)')
+    parser.add_argument('--years', nargs='*', default=[], help='years (every year available for the states by default)')
+    parser.add_argument('--stats', nargs='+', default=['Sum'], choices=AGGREGATE_STATISTICS+YEAR_STATISTICS+[RATIO_STATISTIC], help='statistics')
+    parser.add_argument('--ratio-item', default='', help='data item with domain TOTAL the Ratio statistic divides by, named with its commodity (such as "WATER: ACRES IRRIGATED - ACRES")')
+    parser.add_argument('--barax', default='States', choices=['States', 'Years'], help='x axis of bar plots of several states and years')
+    parser.add_argument('--line-n', default='Multiple Lines', choices=['Multiple Lines', 'One Line'], help='lines of line graphs of several states')
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=EXPORT_FORMATS, help='formats the graphs are rendered as')
+    parser.add_argument('--table-format', default='csv', choices=TABLE_FORMATS, help='format the data tables are written as')
+    parser.add_argument('--table-compression', default='none', choices=TABLE_COMPRESSIONS, help='compression of the data tables (snappy only for parquet)')
+    parser.add_argument('--out', default=PATH_REPORTS, help='folder the report is written to')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2, help='processes making and rendering graphs in parallel')
+    parser.add_argument('--db', default=PATH_DB, help='path of the irrigation database')
+    args=parser.parse_args()
+    try:
+        check_table_format(args.table_format, args.table_compression)
+    except ValueError as e:
+        parser.error(str(e))
+    if RATIO_STATISTIC in args.stats and args.ratio_item=='':
+        parser.error('--stats '+RATIO_STATISTIC+' needs --ratio-item')
+
+    start=time.perf_counter()
+    data_service=DataService(path_db=args.db)
+    data_service.start()
+    export_service=ExportService(export_dir=os.path.join(args.out, 'figures'), processes=args.processes, table_dir=os.path.join(args.out, 'tables'))
+    try:
+        selections=report_selections(data_service.db, args.viz, args.commodities, args.data_items, [g.split(',') for g in args.states],
+                                     args.years, args.stats, args.barax, args.line_n, args.ratio_item, args.domains)
+        manifest=make_report(selections, data_service.db, export_service, args.formats, args.out, args.table_format, args.table_compression, args.processes)
+    finally:
+        export_service.stop()
+        data_service.stop()
+
+    made=[i for i in manifest['items'] if 'skipped' not in i]
+    statuses=[s for i in made for s in i['status'].values()]
+    print(f'{len(made)} selections ({len(manifest["items"])-len(made)} skipped): {statuses.count("written")} files written, {statuses.count("unchanged")} unchanged '
+          f'in {time.perf_counter()-start:.1f} s, manifest at {os.path.join(args.out, "manifest.json")}')
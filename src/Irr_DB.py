@@ -1,20 +1,38 @@
 import numpy as np
+import pandas as pd
 import sqlite3
 import json
 from src.irrigation_base import DB
-from typing import Union
+from typing import Union, Iterator
 
 
 PATH_DB='data/irrigation.db'
 
+##columns of tMain the raw rows can be filtered on (the keys raw_query takes), and every column of the raw rows in the order they are exported (the state's name is joined from tState)
+RAW_FILTERS=['commodity', 'domain', 'data_item', 'domain_category', 'state_id', 'year']
+RAW_COLUMNS=['state_id', 'state', 'year', 'commodity', 'domain', 'data_item', 'domain_category', 'value']
+
+##rows fetched from the database at once when streaming raw rows
+RAW_BATCH_ROWS=10000
+
+##statistics the user can choose from: the sql aggregates of each group, then the statistics derived from the sum of each group (see derived_query),
+#the percent change from the previous year and the compound annual growth rate since the first year (only when the results are grouped by year),
+#and the ratio of the sum to the sum of another data item with domain TOTAL (ratio_item) over the same states and years, such as expenses per acre irrigated
+AGGREGATE_STATISTICS=['Average', 'Sum', 'Minimum', 'Maximum']
+YEAR_STATISTICS=['Percent Change', 'Annual Growth Rate']
+RATIO_STATISTIC='Ratio'
+
+##sql aggregate the derived statistics are computed from
+DERIVED_AGGREGATE='SUM'
+
 class Irr_DB(DB):
-    def __init__(self) -> None:
+    def __init__(self, path_db:str=PATH_DB) -> None:
         '''
-        Constructor for instance of the irrigation database
+        Constructor for instance of the irrigation database, stored at path_db (a string)
 
         Returns None
         '''
-        super().__init__(path_db=PATH_DB, create=True) ##calls the constructor of the parent class DB, even if the path already exists, database will not be made again
+        super().__init__(path_db=path_db, create=True) ##calls the constructor of the parent class DB, even if the path already exists, database will not be made again
         if self.exists == False: #if self.exists (specified in the parent class's constrcutor) is False, the database gets made, where the path is PATH_DB
             self.build_tables() #build_tables() and load_data() specified in parent class DB (found in irrigation_base.py)
             self.load_data()
@@ -263,13 +281,25 @@ class Irr_DB(DB):
         The names of these buttons corresponds with the keys specifed in the dictionary encoding 
         
         This converts that selection (stored as string in user_click) to its correspondign SQL aggregate function (needed to sufficently build the final sql query in final_query(operation, params, line_graph))
+        For the statistics derived from the sum (see derived_query), converts it to the name of the statistic shown in titles instead (a ratio names the data item it divides by after its own, see get_full_title in visualization.py)
     
         Returns a string
         '''
         
-        encoding={'Minimum':'MIN', 'Maximum':'MAX', 'Average': 'AVG', 'Sum':'SUM'}
+        encoding={'Minimum':'MIN', 'Maximum':'MAX', 'Average': 'AVG', 'Sum':'SUM',
+                  'Percent Change':'PERCENT CHANGE IN SUM', 'Annual Growth Rate':'ANNUAL GROWTH RATE OF SUM', 'Ratio':'RATIO OF SUM'}
         return encoding[user_click]
 
+    def which_aggregate(self, user_click:str)->str:
+        '''
+        Converts the statistic chosen by the user (user_click, a string) to the SQL aggregate function each group is computed with, the sum for the derived statistics
+
+        Returns a string
+        '''
+        if user_click in YEAR_STATISTICS or user_click==RATIO_STATISTIC:
+            return DERIVED_AGGREGATE
+        return self.which_statistic(user_click)
+
     
 
     def execute_final_query(self, query:str, params: dict[str,list[str]], line_graph: bool=False) -> Union[list[float], list[list[float]]]:
@@ -301,6 +331,15 @@ class Irr_DB(DB):
             return yr_based_results
         return results.iloc[:,-1].values.tolist()##gets last column detailing the results associated with the operation performed 
 
+    def execute_keyed_query(self, query:str, params: dict[str,list[str]])->pd.DataFrame:
+        '''
+        Queries the database for the same values as execute_final_query(query, params, line_graph) with the same string output of final_query passed in as query,
+        but keeps each value with the columns it was grouped by rather than relying on their order. Both share the results cached by run_query, so only the first of them queries the database
+
+        Returns a pandas DataFrame with a column for each column grouped by (such as state_id and year) and the column value, one row for each group with data
+        '''
+        return self.run_query(query, params={'params': json.dumps(params)})
+
     def final_query(self, operation:str, params:dict[str,list[str]], s_multiple_or_one:Union[str, None], yr_or_states:Union[str, None],line_graph=False) -> str:
         """
         Constructs a string detailing the final query to the database 
@@ -316,10 +355,12 @@ class Irr_DB(DB):
             If the user chose multiple states and multiple years, or one state and one year, looks further with set_group_by_bar(params:dict[str,list[str]], yr_or_states:str=None)
             where yr_or_states is either 'States' or 'Years' or None
     
+        The columns grouped by are selected along with the value (the last column), so the same query gives keyed results to execute_keyed_query
+
         Returns a string to be used as query in execute_final_query(query, params, line_graph)
         """
-        operation=self.which_statistic(operation) ##gets sql operation equivalent to user selection (Minimum, Maximum, Sum, Average), which is passed in as operartion, in final Dash app
-        start="SELECT 1.*"+operation+"(value) from tMain"
+        statistic=operation
+        operation=self.which_aggregate(operation) ##gets sql operation equivalent to user selection (Minimum, Maximum, Sum, Average), which is passed in as operartion, in final Dash app
         
         middle="""
         WHERE commodity IN (SELECT value FROM json_tree(:params) WHERE path = '$.commodity')
@@ -353,8 +394,56 @@ class Irr_DB(DB):
             else: ##multiple data items selected so data item is along the x axis
                 group_by='data_item'    
             suffix="GROUP BY "+group_by+';'    
+        keys=suffix[len("GROUP BY "):-1] #the columns grouped by are selected before the value, so each value is keyed by them (see execute_keyed_query)
+        start="SELECT "+keys+", 1.*"+operation+"(value) AS value from tMain"
         new=start+middle+suffix
-        return new 
+        return self.derived_query(statistic, new, [k.strip() for k in keys.split(',')])
+
+    def derived_query(self, statistic:str, query:str, keys:list[str])->str:
+        '''
+        Called by final_query and matrix_query with the statistic chosen by the user (a string), the query of the sum of each group (query, a string) and the columns it selects before the value (keys, a list of strings)
+
+        If statistic is derived from the sum, wraps query so the derived statistic is computed from its results in the same statement, so a selection still queries the database once
+        and its results are cached by run_query like every other query. The rows, their keys, and their order are the same as the sum's, only the values change:
+            Percent Change: the percent change of each group from the same group in the previous year with data (window function LAG over the years of each line, NULL for the first year)
+            Annual Growth Rate: the compound annual growth rate (in percent) of each group since its first year with data, (value/first value)^(1/years between them)-1 (NULL for the first year)
+            Ratio: the sum of each group divided by the sum of the data item in params['ratio_item'] (domain TOTAL, of the commodity in params['ratio_commodity']) over the same states and years, grouped by the state and year
+                columns of keys (so every domain category or data item of a state and year is divided by the same value), NULL where that data item has no data or sums to 0
+        The year statistics are only offered when the results are grouped by year (see resolve_statistic)
+
+        Returns the query as a string (query itself if statistic isn't derived)
+        '''
+        if statistic not in YEAR_STATISTICS and statistic!=RATIO_STATISTIC:
+            return query
+        base=query.strip().rstrip(';')
+        if statistic==RATIO_STATISTIC:
+            ratio_keys=[k for k in keys if k in ['state_id', 'year']]
+            ratio_select="".join(k+", " for k in ratio_keys)
+            group_by="GROUP BY "+", ".join(ratio_keys) if len(ratio_keys)>0 else ""
+            on=" AND ".join("base."+k+" = ratio."+k for k in ratio_keys) if len(ratio_keys)>0 else "1"
+            return """
+        WITH base AS ("""+base+"""),
+        ratio AS (SELECT """+ratio_select+"1.*"+DERIVED_AGGREGATE+"""(value) AS value FROM tMain
+            WHERE domain = 'TOTAL'
+               AND commodity IN (SELECT value FROM json_tree(:params) WHERE path = '$."ratio_commodity"')
+               AND data_item IN (SELECT value FROM json_tree(:params) WHERE path = '$."ratio_item"')
+               AND state_id IN (SELECT value FROM json_tree(:params) WHERE path = '$."state_id"')
+               AND year IN (SELECT value FROM json_tree(:params) WHERE path = '$.year')
+            """+group_by+""")
+        SELECT """+", ".join("base."+k for k in keys)+""", base.value/ratio.value AS value FROM base
+        LEFT JOIN ratio ON """+on+"""
+        ORDER BY """+", ".join("base."+k for k in keys)+";" #the same order sql presents the grouped sums in
+        lines=[k for k in keys if k!='year'] #the columns telling the lines (or the states of a map) apart, each has its own years
+        window="WINDOW w AS ("+("PARTITION BY "+", ".join(lines)+" " if len(lines)>0 else "")+"ORDER BY year)"
+        if statistic=='Percent Change':
+            value="100.*(value-LAG(value) OVER w)/LAG(value) OVER w"
+        else: #power is registered on every connection (see register_functions in irrigation_base.py), sqlite only has it when built with its math functions
+            value="100.*(power(value/FIRST_VALUE(value) OVER w, 1./(year-FIRST_VALUE(year) OVER w))-1)"
+        return """
+        WITH base AS ("""+base+""")
+        SELECT """+", ".join(keys)+", "+value+""" AS value FROM base
+        """+window+"""
+        ORDER BY """+", ".join(keys)+";"
 
     def set_line_state_groupby(self, state_id_list:list[str], s_multiple_or_one: str=None)->str:
         '''
@@ -434,4 +523,314 @@ class Irr_DB(DB):
 
         encoder={'States':'state_id', 'Years':'year'}
         return encoder[user_click]
-   
\ No newline at end of file
+
+    def resolve_selection(self, partial_selection:dict[str, Union[str, list[str], None]])->dict[str, Union[list[str], dict, bool, None]]:
+        '''
+        Resolves every option list downstream of what the user has already chosen in the Dash app with one query to the database
+
+        partial_selection is a dictionary holding the raw values of the Dash app components, keys not yet chosen can be left out or be '', [] or None:
+            viz_type (str), state_id (list of str), commodity (str), domain (str), data_item (str), mult_dt_q (str), add_data_item (list of str),
+            domain_category (list of str), year (list of str), stat_type (str), ratio_item (str, the data item a ratio divides by), barax (str), line_n (str),
+            animate (bool, whether a bar plot or map is animated over every year)
+
+        Runs one sql statement returning every distinct (state_id, commodity, domain, data_item, domain_category, year) row for the chosen states and commodity,
+            along with the commodities available for the chosen states (rows where state_id is NULL)
+        The option lists for domains, data items, additional data items or domain categories, and years are then found in one pass over those rows,
+            following the same rules as get_domains, get_data_items, get_domain_categories, intermediate_domain_categories, and get_years
+        Because the callbacks remember past selections for different data specifications, the selected additional data items, domain categories, and years are
+            checked against the newly found options and only the valid ones are kept
+
+        Returns a dictionary where
+            'options' holds a list of strings for each section of the app (commodity, domain, data_item, mult_dt_q, add_data_item, domain_category, year, stat_type, ratio_item, barax, line_n)
+            'valid' holds the valid selections for add_data_item, domain_category, and year (lists of strings)
+            'params' holds the dictionary of user specifications to be passed into final_query and execute_final_query (None if the years can't be found yet),
+                with the data item a ratio divides by under 'ratio_item' (see resolve_statistic)
+            's_multiple_or_one' and 'yr_or_states' hold the answers to the line graph and bar plot questions if they are required (None otherwise)
+            'complete' is True when all required selections have been made and are valid
+        '''
+
+        sel={'viz_type':'', 'state_id':[], 'commodity':'', 'domain':'', 'data_item':'', 'mult_dt_q':'', 'add_data_item':[],
+             'domain_category':[], 'year':[], 'stat_type':'', 'ratio_item':'', 'barax':'', 'line_n':'', 'animate':False}
+        sel.update({k: v for k, v in partial_selection.items() if v is not None}) #None values (components that haven't been set) use the defaults
+        if sel['viz_type']=='Map': #a map shows every state, so states aren't chosen by the user
+            sel['state_id']=self.get_states()
+        state_id, commodity, domain, data_item = sel['state_id'], sel['commodity'], sel['domain'], sel['data_item']
+
+        options={'commodity':[], 'domain':[], 'data_item':[], 'mult_dt_q':[], 'add_data_item':[], 'domain_category':[], 'year':[], 'stat_type':[], 'ratio_item':[], 'barax':[], 'line_n':[]}
+        resolved={'options':options, 'valid':{'add_data_item':[], 'domain_category':[], 'year':[]}, 'params':None,
+                  's_multiple_or_one':None, 'yr_or_states':None, 'complete':False}
+        if len(state_id)==0: #nothing can be chosen until states are chosen
+            return resolved
+
+        my_params=json.dumps({'state_id':state_id, 'commodity':[commodity]})
+        sql="""
+        SELECT DISTINCT state_id, commodity, domain, data_item, domain_category, year FROM tMain
+        WHERE commodity IN (SELECT value FROM json_tree(:params) WHERE path = '$.commodity')
+           AND state_id IN (SELECT value FROM json_tree(:params) WHERE path = '$."state_id"')
+        UNION ALL
+        SELECT DISTINCT NULL, commodity, NULL, NULL, NULL, NULL FROM tMain
+        WHERE state_id IN (SELECT value FROM json_tree(:params) WHERE path = '$."state_id"')
+        ;"""
+        rows=self.run_query(sql, params={'params': my_params})
+        comm_rows=rows['state_id'].isna() #rows only listing the commodities for the chosen states
+        options['commodity']=rows.loc[comm_rows, 'commodity'].tolist()
+        rows=rows[~comm_rows] #only rows for the chosen commodity are left
+
+        options['domain']=rows['domain'].unique().tolist()
+        dom_rows=rows[rows['domain']==domain]
+        options['data_item']=dom_rows['data_item'].unique().tolist()
+        if sel['viz_type']=='Map' or (sel['viz_type']=='Bar Plot' and sel['animate']):
+            return self.resolve_every_year(sel, dom_rows, resolved)
+
+        ##finding the valid domain categories or additional data items, and setting up the dictionary used to find valid years (same cases as update_years in main_dash.py)
+        year_params=None
+        valid_dc=[]
+        valid_adt=[]
+        if domain!='TOTAL':
+            options['domain_category']=dom_rows.loc[dom_rows['data_item']==data_item, 'domain_category'].unique().tolist()
+            valid_dc=[i for i in sel['domain_category'] if i in options['domain_category']]
+            if data_item!='' and len(valid_dc):
+                year_params={'state_id':state_id, 'commodity':[commodity], 'domain':[domain], 'data_item':[data_item], 'domain_category':valid_dc}
+        elif data_item!='':
+            options['mult_dt_q']=['Multiple Data Items', 'One Data Item']
+            if sel['mult_dt_q']=='Multiple Data Items':
+                unit=data_item.split(' - ')[-1] #additional data items must use the same units as the initial data item (see intermediate_domain_categories)
+                same_unit=dom_rows['data_item'].str.upper().str.endswith(unit.upper()) & (dom_rows['data_item']!=data_item)
+                options['add_data_item']=dom_rows.loc[same_unit, 'data_item'].unique().tolist()
+                valid_adt=[i for i in sel['add_data_item'] if i in options['add_data_item']]
+                if len(valid_adt):
+                    year_params={'state_id':state_id, 'commodity':[commodity], 'domain':[domain], 'data_item':[data_item]+valid_adt}
+            elif sel['mult_dt_q']=='One Data Item':
+                year_params={'state_id':state_id, 'commodity':[commodity], 'domain':[domain], 'data_item':[data_item]}
+        resolved['valid']['domain_category']=valid_dc
+        resolved['valid']['add_data_item']=valid_adt
+        if year_params==None: #years can't be chosen yet
+            return resolved
+
+        options['year']=self.rows_years(dom_rows, year_params)
+        valid_yrs=[i for i in sel['year'] if i in options['year']]
+        resolved['valid']['year']=valid_yrs
+        if len(valid_yrs)==0:
+            return resolved
+        resolved['params']=self.normalize_params(dict(year_params, year=valid_yrs))
+        one_piece=((domain!='TOTAL') & (len(valid_dc)==1)) | ((domain=='TOTAL') & (sel['mult_dt_q']=='One Data Item'))
+        ##line graphs are always grouped by year, bar plots of one piece of data over several years have years on the x axis (when asked, see below)
+        by_year=len(valid_yrs)>1 and (sel['viz_type']=='Line Graph' or (sel['viz_type']=='Bar Plot' and one_piece))
+        if not self.resolve_statistic(sel, resolved, by_year) or sel['viz_type']=='':
+            return resolved
+
+        ##checking whether the bar plot (states or years on the x axis) or line graph (multiple lines or one line) questions need an answer, same conditions as display_g_or_dt_buttons in main_dash.py
+        if sel['viz_type']=='Line Graph':
+            if one_piece and len(state_id)>1:
+                options['line_n']=['Multiple Lines', 'One Line']
+                resolved['s_multiple_or_one']=sel['line_n'] if sel['line_n']!='' else None
+                resolved['complete']=sel['line_n']!=''
+            else:
+                resolved['complete']=True
+        else:
+            if one_piece and (((len(state_id)==1) & (len(valid_yrs)==1)) | ((len(state_id)>1) & (len(valid_yrs)>1))):
+                #the year statistics need years on the x axis, so a bar plot of several states can only have years there
+                options['barax']=['Years'] if sel['stat_type'] in YEAR_STATISTICS and len(state_id)>1 else ['States', 'Years']
+                resolved['yr_or_states']=sel['barax'] if sel['barax'] in options['barax'] else None
+                resolved['complete']=sel['barax'] in options['barax']
+            else:
+                resolved['complete']=True
+        return resolved
+
+    def resolve_every_year(self, sel:dict[str, Union[str, list[str]]], dom_rows, resolved:dict)->dict[str, Union[list[str], dict, bool, None]]:
+        '''
+        Called by resolve_selection(partial_selection) when the user chose a map or an animated bar plot, which show one data item (and one domain category if the domain isn't TOTAL)
+        for each state (every state for a map) over every year any of the states has data for, one year at a time (chosen with a slider or played as an animation)
+        The years aren't chosen by the user, so the selection is complete once the statistic is chosen
+
+        Takes in the user's selections (sel, a dictionary of the values of the Dash app components, with every state filled in for maps),
+        the rows already retrieved for the chosen states and domain (dom_rows, a pandas DataFrame), and the resolved selection found so far (resolved)
+
+        Returns resolved, where 'params' holds every state and year with data for the data item (to be passed into matrix_query and execute_matrix_query)
+        '''
+        options=resolved['options']
+        data_item=sel['data_item']
+        if data_item=='':
+            return resolved
+        rows=dom_rows[dom_rows['data_item']==data_item]
+        item_params={'commodity':[sel['commodity']], 'domain':[sel['domain']], 'data_item':[data_item]}
+        if sel['domain']!='TOTAL': #only one domain category can be shown
+            options['domain_category']=rows['domain_category'].unique().tolist()
+            valid_dc=[i for i in sel['domain_category'] if i in options['domain_category']][:1]
+            resolved['valid']['domain_category']=valid_dc
+            if len(valid_dc)==0:
+                return resolved
+            rows=rows[rows['domain_category'].isin(valid_dc)]
+            item_params['domain_category']=valid_dc
+        resolved['params']=self.normalize_params(dict(item_params, state_id=rows['state_id'].unique().tolist(), year=rows['year'].unique().tolist()))
+        resolved['complete']=self.resolve_statistic(sel, resolved, len(resolved['params']['year'])>1) #grouped by state and year
+        return resolved
+
+    def resolve_statistic(self, sel:dict[str, Union[str, list[str]]], resolved:dict, by_year:bool)->bool:
+        '''
+        Called by resolve_selection(partial_selection) and resolve_every_year(sel, dom_rows, resolved) once resolved['params'] holds the user's specifications,
+        sets the statistics the user can choose from: the sql aggregates, the year statistics if by_year is True (the results are grouped by year over more than one year,
+        so each group has a previous year), and the ratio to another data item (see derived_query in this class)
+        If the user chose the ratio, sets the data items it can divide by (every data item with domain TOTAL for the chosen states, of any commodity, but the data item itself, see total_data_items)
+        and adds the chosen one to resolved['params'] under 'ratio_item' and its commodity under 'ratio_commodity', so they are part of the query's params and of every key the selection is cached under
+
+        Takes in the user's selections (sel, a dictionary of the values of the Dash app components) and the resolved selection found so far (resolved)
+
+        Returns whether the statistic (and the data item a ratio divides by) has been chosen and is valid as a boolean
+        '''
+        options=resolved['options']
+        options['stat_type']=AGGREGATE_STATISTICS+(YEAR_STATISTICS if by_year else [])+[RATIO_STATISTIC]
+        if sel['stat_type'] not in options['stat_type']: #not chosen yet, or a year statistic once the results are no longer grouped by year
+            return False
+        if sel['stat_type']!=RATIO_STATISTIC:
+            return True
+        itself=sel['commodity']+': '+sel['data_item']
+        options['ratio_item']=[i for i in self.total_data_items(resolved['params']['state_id']) if sel['domain']!='TOTAL' or i!=itself]
+        if sel['ratio_item'] not in options['ratio_item']:
+            return False
+        commodity, data_item=sel['ratio_item'].split(': ', 1)
+        resolved['params']['ratio_commodity']=[commodity]
+        resolved['params']['ratio_item']=[data_item]
+        return True
+
+    def total_data_items(self, state_id:list[str])->list[str]:
+        '''
+        Gets every data item with domain TOTAL (of any commodity) with data for any of the states in state_id (a list of strings), the data items a ratio can divide by
+        Each is named with its commodity, ex. WATER: ACRES IRRIGATED - ACRES, since the same data item can be reported under more than one commodity
+
+        Returns a list of strings in alphabetical order (by commodity, then data item)
+        '''
+        sql="""
+        SELECT DISTINCT commodity || ': ' || data_item AS ratio_item FROM tMain
+        WHERE domain = 'TOTAL'
+           AND state_id IN (SELECT value FROM json_tree(:params) WHERE path = '$."state_id"')
+        ORDER BY commodity, data_item
+        ;"""
+        return self.run_query(sql, params={'params': json.dumps({'state_id': state_id})})['ratio_item'].tolist()
+
+    def matrix_query(self, operation:str, params:dict[str,list[str]])->str:
+        '''
+        Constructs a string detailing the query for a map or an animated bar plot, one grouped aggregate over every state and year at once
+        (so every year of the map's slider, or every frame of the animation, comes from the same query)
+        Gets a value using the aggregation method chosen by the user (operation is the full name of the method, ex. Minimum) for each state and year, or the statistic derived from their sums (see derived_query)
+        matching the states, commodity, domain, data item and possibly domain category held in params (a dictionary where each key is a string and each value is a list of strings)
+        The name of each state is joined from tState, to be shown when hovering over the map
+
+        Returns a string to be used as query in execute_matrix_query(query, params)
+        '''
+        statistic=operation
+        operation=self.which_aggregate(operation)
+        sql="""
+        SELECT tMain.state_id, tState.state, tMain.year, 1.*"""+operation+"""(tMain.value) AS value FROM tMain
+        JOIN tState ON tState.state_id = tMain.state_id
+        WHERE commodity IN (SELECT value FROM json_tree(:params) WHERE path = '$.commodity')
+               AND domain IN (SELECT value FROM json_tree(:params) WHERE path = '$.domain')
+               AND data_item IN (SELECT value FROM json_tree(:params) WHERE path = '$."data_item"')
+               AND tMain.state_id IN (SELECT value FROM json_tree(:params) WHERE path = '$."state_id"')
+        """
+        if 'domain_category' in params.keys():
+            sql=sql+"""AND domain_category IN(SELECT value FROM json_tree(:params) WHERE path = '$."domain_category"')
+        """
+        return self.derived_query(statistic, sql+"GROUP BY tMain.state_id, tMain.year;", ['state_id', 'state', 'year'])
+
+    def execute_matrix_query(self, query:str, params:dict[str,list[str]])->pd.DataFrame:
+        '''
+        Queries the database for the values shown on a map or an animated bar plot, called after matrix_query(operation, params) with its string output passed in as query
+        The results are cached by run_query like every other query, so moving the map's year slider back and forth never queries the database again
+
+        Returns a pandas DataFrame with the columns state_id, state, year, and value (one row for each state and year with data)
+        '''
+        return self.run_query(query, params={'params': json.dumps(params)})
+
+    def raw_query(self, params:dict[str,list[str]])->str:
+        '''
+        Constructs a string detailing the query for the raw rows of tMain matching params (a dictionary where each key is one of RAW_FILTERS and each value is a list of strings),
+        with no aggregate and no limit on how many items each key holds. A key params doesn't have isn't filtered on, so an empty dictionary matches every row
+        The rows are ordered by the primary key of tMain, so the same params always export the same file
+
+        Raises a ValueError if params has a key that isn't one of RAW_FILTERS, or a value that isn't a list of strings
+
+        Returns a string to be used as query in stream_raw_rows(query, params)
+        '''
+        for key, value in params.items():
+            if key not in RAW_FILTERS:
+                raise ValueError(str(key)+' is not a column raw rows can be filtered on, choose from '+', '.join(RAW_FILTERS))
+            if not isinstance(value, list) or not all(isinstance(i, str) for i in value):
+                raise ValueError('the values of '+key+' must be a list of strings')
+        sql="""
+        SELECT """+', '.join('tState.state' if c=='state' else 'tMain.'+c for c in RAW_COLUMNS)+""" FROM tMain
+        JOIN tState ON tState.state_id = tMain.state_id
+        """
+        conditions=[]
+        for key in RAW_FILTERS:
+            if key in params.keys():
+                path='$.'+key if key.isalpha() else '$."'+key+'"' #json_tree quotes the keys holding an underscore in the paths it gives (as in final_query)
+                conditions+=["tMain."+key+" IN (SELECT value FROM json_tree(:params) WHERE path = '"+path+"')"]
+        if len(conditions)>0:
+            sql=sql+"WHERE "+"""
+               AND """.join(conditions)+"""
+        """
+        return sql+"ORDER BY tMain.state_id, tMain.year, tMain.commodity, tMain.data_item, tMain.domain, tMain.domain_category;"
+
+    def stream_raw_rows(self, query:str, params:dict[str,list[str]], batch_rows:int=RAW_BATCH_ROWS)->Iterator[pd.DataFrame]:
+        '''
+        Queries the database for the raw rows of tMain, called after raw_query(params) with its string output passed in as query
+        The rows are fetched batch_rows (an int) at a time with fetchmany from a cursor of a read-only connection opened for this query alone
+        (the query may run for as long as the user takes to download its rows, so it doesn't hold a connection of the pool), so only one batch is held in memory at once
+        and results aren't cached. The connection is closed once every row is fetched, or once the generator is closed (such as when the user cancels the download)
+
+        Returns a generator of pandas DataFrames with the columns in RAW_COLUMNS, one for each batch (only an empty one if no row matches)
+        '''
+        conn=sqlite3.connect('file:'+self.path_db+'?mode=ro', uri=True, check_same_thread=False)
+        try:
+            curs=conn.execute(query, {'params': json.dumps(params)})
+            rows=curs.fetchmany(batch_rows)
+            yield pd.DataFrame.from_records(rows, columns=RAW_COLUMNS)
+            while len(rows)==batch_rows:
+                rows=curs.fetchmany(batch_rows)
+                if len(rows)>0:
+                    yield pd.DataFrame.from_records(rows, columns=RAW_COLUMNS)
+        finally:
+            conn.close()
+
+    def normalize_params(self, params:dict[str, list[str]])->dict[str, list[str]]:
+        '''
+        Called by resolve_selection(partial_selection), puts the user specifications held in params (a dictionary where each key is a string and each value is a list of strings) in a set order,
+        so the same selection clicked in a different order gives the same final query, figure, and data table
+        States and domain categories are sorted alphabetically and years in ascending order (matching the order sql presents grouped results in),
+        the initial data item stays first (its units are used on the y axis) and any additional data items are sorted after it
+
+        Returns a new dictionary with the same keys as params
+        '''
+        normalized=dict(params)
+        normalized['state_id']=sorted(params['state_id'])
+        normalized['year']=sorted(params['year'], key=int)
+        normalized['data_item']=params['data_item'][:1]+sorted(params['data_item'][1:])
+        if 'domain_category' in params.keys():
+            normalized['domain_category']=sorted(params['domain_category'])
+        return normalized
+
+    def rows_years(self, rows, year_params:dict[str, list[str]])->list[str]:
+        '''
+        Called by resolve_selection(partial_selection), finds valid years in the same way as get_years(year_params) and each_choice_year(key_name, year_params),
+        but over rows (a pandas DataFrame) already retrieved from the database rather than querying the database once per state, data item, or domain category
+
+        A year is valid when it is available for every state in year_params['state_id'], and for every data item or domain category if more than one was specified
+
+        Returns a list of valid years sorted in ascending order (each element is a string)
+        '''
+        rows=rows[rows['data_item'].isin(year_params['data_item'])]
+        if 'domain_category' in year_params.keys():
+            rows=rows[rows['domain_category'].isin(year_params['domain_category'])]
+        key_names=['state_id']
+        if len(year_params['data_item'])>1:
+            key_names+=['data_item']
+        elif 'domain_category' in year_params.keys() and len(year_params['domain_category'])>1:
+            key_names+=['domain_category']
+        year_set=None
+        for key_name in key_names:
+            years_per_item=rows.groupby(key_name)['year'].agg(set) #valid years for each entry in year_params[key_name]
+            for i in year_params[key_name]:
+                item_years=years_per_item.get(i, set()) #an entry with no rows has no valid years
+                year_set=item_years if year_set==None else year_set.intersection(item_years)
+        return sorted(year_set, key=int)
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+import os
+import threading
+from typing import Any, Hashable
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 256) -> None:
+        '''
+        Constructor for a bounded cache shared by every callback of the Dash app (callbacks may run on several threads, so every access holds a lock)
+        Once maxsize (an int) items are held, the least recently used item is dropped when a new item is added
+
+        Returns None
+        '''
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.pid = os.getpid()
+        self.thread_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        return
+
+    @property
+    def lock(self) -> threading.Lock:
+        '''
+        Gets the lock held while the cache is accessed
+        If the cache was copied into a forked process (such as a background job), the lock may have been copied while another thread held it,
+        so the forked process uses a new lock
+
+        Returns the lock
+        '''
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.thread_lock = threading.Lock()
+        return self.thread_lock
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        '''
+        Looks up the item stored under key, and marks it as the most recently used item
+
+        Returns the item, or default if nothing is stored under key
+        '''
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return default
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        '''
+        Stores value under key, dropping the least recently used item if the cache is full
+
+        Returns None
+        '''
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+        return
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.items
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.items)
+
+    def clear(self) -> None:
+        '''
+        Removes every item from the cache
+
+        Returns None
+        '''
+        with self.lock:
+            self.items.clear()
+        return
@@ -0,0 +1,109 @@
+import json
+import os
+from src.Irr_DB import Irr_DB, PATH_DB
+from src.irrigation_base import ConnectionPool
+from src.cache import LRUCache
+from src.figure_cache import FigureCache, DiskFigureCache
+
+##version of what the startup snapshot holds, changed whenever what's in it (or how it is made) changes so old snapshots aren't used
+SNAPSHOT_VERSION=2
+
+class DataService:
+    def __init__(self, path_db: str = PATH_DB, query_cache_size: int = 512, figure_cache_size: int = 128, figure_cache_dir: str = None) -> None:
+        '''
+        Constructor for the data service of the Dash app, created once when the app starts rather than constructing Irr_DB() inside every callback
+        Takes in the path to the irrigation database (a string path_db), how many query results to keep cached (an int query_cache_size),
+        and how many figures to keep cached (an int figure_cache_size)
+        If a directory is given (a string figure_cache_dir), figures are cached on disk there instead so that the background callbacks,
+        which run in their own processes, share them with the app (figure_cache_size doesn't apply then, the disk cache is bounded by size)
+
+        Nothing is opened until start() is called
+
+        Returns None
+        '''
+        self.path_db = path_db
+        self.query_cache = LRUCache(query_cache_size)
+        if figure_cache_dir != None:
+            self.figure_cache = DiskFigureCache(figure_cache_dir)
+        else:
+            self.figure_cache = FigureCache(figure_cache_size)
+        self.pool = None
+        self.db = None
+        return
+
+    def start(self) -> None:
+        '''
+        Constructs the irrigation database once (building it from the .csv files in the data folder if it doesn't exist yet), builds its indexes,
+        and sets up the connection pool and query cache that every query made through self.db then uses
+
+        Returns None
+        '''
+        if self.db != None: #already started
+            return
+        db = Irr_DB(self.path_db)
+        db.build_indexes()
+        self.pool = ConnectionPool(self.path_db)
+        db.pool = self.pool
+        db.query_cache = self.query_cache
+        self.db = db
+        return
+
+    def startup_snapshot(self, path_snapshot: str) -> dict:
+        '''
+        Gets what the app needs from the irrigation database to build its layout: the states for the state checklist ('states')
+        and the resolved selection before the user makes any selections ('initial_selection')
+
+        These are saved as a .json file at path_snapshot (a string) along with the version of the snapshot and when the database was last modified,
+        so later starts of the app (and every worker serving it) read that file instead of querying the database, as long as the database hasn't changed since
+
+        Returns the snapshot as a dictionary
+        '''
+        self.start()
+        stat = os.stat(self.path_db)
+        key = {'version': SNAPSHOT_VERSION, 'db_mtime': stat.st_mtime, 'db_size': stat.st_size}
+        try:
+            with open(path_snapshot) as f:
+                snapshot = json.load(f)
+            if snapshot['key'] == key:
+                return snapshot
+        except (OSError, ValueError, KeyError): #no snapshot yet, or it can't be read, so it is made again
+            pass
+
+        snapshot = {'key': key,
+                    'states': self.db.get_states(),
+                    'initial_selection': self.db.resolve_selection({})}
+        os.makedirs(os.path.dirname(path_snapshot) or '.', exist_ok=True)
+        path_tmp = path_snapshot + '.' + str(os.getpid()) + '.tmp'
+        with open(path_tmp, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path_tmp, path_snapshot) #another process starting at the same time never reads a half written snapshot
+        return snapshot
+
+    def warm_up(self) -> None:
+        '''
+        Called in each worker process after it is forked from the process that started the service (see post_fork in gunicorn.conf.py)
+        Opens the worker's own connection to the irrigation database and runs the queries every new page of the app makes,
+        so the first user served by the worker doesn't wait on them
+
+        Returns None
+        '''
+        self.start()
+        self.pool.connection()
+        self.db.get_states()
+        self.db.resolve_selection({})
+        return
+
+    def stop(self) -> None:
+        '''
+        Closes every connection in the pool, empties the query cache and closes the figure cache (figures cached on disk are kept for the other processes serving the app),
+        the service can be started again afterwards
+
+        Returns None
+        '''
+        if self.pool != None:
+            self.pool.close_all()
+        self.query_cache.clear()
+        self.figure_cache.close()
+        self.pool = None
+        self.db = None
+        return
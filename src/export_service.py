@@ -0,0 +1,359 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+import diskcache
+from flask import Flask
+from src.table_export import table_bytes, table_extension
+
+##folders figures and data tables are archived to when archive mode is on, each file is named by a hash of its content so exports from different users never overwrite each other
+PATH_EXPORTS = 'user_results/figures'
+PATH_TABLES = 'user_results/tables'
+
+##formats a figure can be exported as
+EXPORT_FORMATS = ['png', 'svg', 'pdf']
+
+##a process serving the app marks itself as taking renders from background jobs every second, and is no longer counted on once it hasn't for SERVING_TIMEOUT seconds
+SERVING_TIMEOUT = 5
+
+##how many seconds a render queued by a background job is kept once rendered, if the job was cancelled before collecting it
+RENDER_EXPIRE = 300
+
+
+def write_file(path: str, data: bytes) -> None:
+    '''
+    Writes data (bytes) to the file at path (a string), first to a temporary file that then replaces it,
+    so another user exporting the same file never sees it half written
+
+    Returns None
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    path_tmp = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+    with open(path_tmp, 'wb') as f:
+        f.write(data)
+    os.replace(path_tmp, path)
+    return
+
+
+def compress(file_name: str, data: bytes) -> tuple[str, bytes]:
+    '''
+    Compresses data (the bytes of the file named file_name, a string) with gzip, for downloads the user asked to have compressed
+
+    Returns the name of the compressed file (file_name with .gz added) as a string, and the compressed data as bytes
+    '''
+    return file_name + '.gz', gzip.compress(data)
+
+
+def start_renderer() -> None:
+    '''
+    Runs once in each process of the export pool when it starts, renders a blank figure so that kaleido starts its renderer right away
+    The renderer then stays running for the life of the process, so later figures don't wait on it to start
+
+    Returns None
+    '''
+    import plotly.io as pio
+    pio.to_image({'data': [], 'layout': {}}, format='png', width=10, height=10)
+    return
+
+
+def render_figure(fig_json: str, fmt: str, scale: float) -> bytes:
+    '''
+    Runs in a process of the export pool, renders the figure (fig_json, the figure serialized as plotly JSON) as fmt (a string in EXPORT_FORMATS)
+    with the renderer kaleido keeps running in the process, scale (a float) multiplies the resolution of png images
+    The figure isn't validated against plotly's figure objects, which don't take the typed arrays the app's figures may hold (see figure_encoding.py)
+
+    Returns the rendered file as bytes
+    '''
+    import plotly.io as pio
+    return pio.to_image(json.loads(fig_json), format=fmt, scale=scale, validate=False)
+
+
+class QueuedRender:
+    def __init__(self, service: object, key: str, fig_json: str, fmt: str) -> None:
+        '''
+        Constructor for a figure (fig_json, the serialized figure, as fmt) a background job queued to be rendered by a process serving the app (see ExportService.submit),
+        waited on like the future of a render submitted to the pool. key (a string) is where the rendered file is left for the job in the queue of the export service (service)
+
+        Returns None
+        '''
+        self.service = service
+        self.key = key
+        self.fig_json = fig_json
+        self.fmt = fmt
+        return
+
+    def result(self) -> bytes:
+        '''
+        Waits for the figure to be rendered. If no process is serving the app anymore (the server was stopped before taking the figure off the queue),
+        the figure is rendered in the job's own pool instead
+
+        Returns the rendered file as bytes
+        '''
+        jobs = self.service.jobs
+        while True:
+            rendered = jobs.pop(self.key)
+            if rendered != None:
+                break
+            if jobs.get('serving') == None:
+                self.service.start()
+                return self.service.pool.submit(render_figure, self.fig_json, self.fmt, self.service.scale).result()
+            time.sleep(0.05)
+        if 'error' in rendered:
+            raise RuntimeError('Rendering the figure failed: ' + rendered['error'])
+        return rendered['data']
+
+
+class ExportService:
+    def __init__(self, export_dir: str = PATH_EXPORTS, processes: int = 2, scale: float = 1, archive: bool = False, table_dir: str = PATH_TABLES,
+                 jobs_dir: str = None) -> None:
+        '''
+        Constructor for the export service of the Dash app, which renders figures to png, svg, or pdf files in a pool of processes (processes, an int)
+        that each keep a kaleido renderer running, rather than starting a renderer for every figure saved
+        Figures are queued to the pool, so figures saved by many users at once are rendered in parallel up to the size of the pool
+
+        Exported files are saved in export_dir (a string) and named by a hash of the figure and format, so the same figure is only rendered once
+        and exports made by different users never overwrite each other. scale (a float) multiplies the resolution of png images
+
+        Figures and data tables the user downloads (see download and download_table) are made in memory and sent straight to the browser
+        (data tables as any of the formats and compressions in table_export.py),
+        they are only also saved on the server, in export_dir and table_dir (a string), if archive (a bool) is True
+
+        Background jobs run in their own processes, so rather than each starting renderers of its own, the figures they save are queued on disk in jobs_dir
+        (a string, the folder the background callbacks keep their jobs in) and rendered in the pool of whichever process serving the app takes them first (see serve).
+        Without jobs_dir, or while no process is serving the app, every figure is rendered in the pool of the process saving it
+
+        Nothing is started until start() is called, or a figure is first rendered
+
+        Returns None
+        '''
+        self.export_dir = export_dir
+        self.processes = processes
+        self.scale = scale
+        self.archive = archive
+        self.table_dir = table_dir
+        self.pool = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.serving = set() #ids of the processes serving the app that take renders off the queue, any other process saving a figure is a background job
+        self.jobs = None
+        if jobs_dir != None:
+            self.jobs = diskcache.Cache(os.path.join(jobs_dir, 'exports'))
+        return
+
+    def start(self) -> None:
+        '''
+        Starts the pool of processes and has each of them start its renderer
+        A pool can't be shared with a forked process (such as a worker of the server), so a forked process starts its own pool
+
+        Returns None
+        '''
+        with self.lock:
+            if self.pool != None and self.pid == os.getpid(): #already started in this process
+                return
+            #processes are spawned rather than forked, since the app's process may be running other threads
+            self.pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'), initializer=start_renderer)
+            self.pid = os.getpid()
+            pool = self.pool
+        for _ in range(self.processes): #starts every process of the pool now rather than once figures are queued
+            pool.submit(len, '')
+        return
+
+    def stop(self) -> None:
+        '''
+        Stops every process of the pool, and stops taking renders queued by background jobs, the service can be started again afterwards
+
+        Returns None
+        '''
+        with self.lock:
+            self.serving.discard(os.getpid())
+            if self.pool != None and self.pid == os.getpid():
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            self.pid = None
+        return
+
+    def serve(self, server: Flask) -> None:
+        '''
+        Has every process handling a request to server (the Flask server of the Dash app, app.server) take the figures queued by background jobs off the queue,
+        on a thread of its own started with its first request, and render them in its pool
+
+        Returns None
+        '''
+        @server.before_request
+        def serving():
+            if self.jobs == None or os.getpid() in self.serving:
+                return
+            with self.lock:
+                if os.getpid() in self.serving:
+                    return
+                self.serving.add(os.getpid())
+            threading.Thread(target=self.take_renders, name='export-queue', daemon=True).start()
+        return
+
+    def take_renders(self) -> None:
+        '''
+        Runs on a thread of each process serving the app for as long as it runs, takes every figure queued by a background job off the queue
+        and submits it to the pool (so figures queued at once are rendered in parallel), leaving the rendered file (or the error) in the queue for the job to pick up
+        Marks the process as taking renders every second, so jobs only queue figures while a process is there to render them. Stops once the service is stopped
+
+        Returns None
+        '''
+        marked = 0
+        while os.getpid() in self.serving:
+            if time.monotonic() - marked > 1:
+                self.jobs.set('serving', os.getpid(), expire=SERVING_TIMEOUT)
+                marked = time.monotonic()
+            key, render = self.jobs.pull(prefix='render')
+            if key == None:
+                time.sleep(0.05)
+                continue
+            result_key, fig_json, fmt = render
+            self.start()
+            future = self.pool.submit(render_figure, fig_json, fmt, self.scale)
+            future.add_done_callback(lambda f, result_key=result_key: self.finish_render(result_key, f))
+
+    def finish_render(self, key: str, future: object) -> None:
+        '''
+        Called once a figure queued by a background job is rendered (the future of its render in the pool), leaves the rendered file (or why rendering failed) under key in the queue
+
+        Returns None
+        '''
+        try:
+            rendered = {'data': future.result()}
+        except Exception as e:
+            rendered = {'error': str(e)}
+        self.jobs.set(key, rendered, expire=RENDER_EXPIRE)
+        return
+
+    def submit(self, fig_json: str, fmt: str) -> object:
+        '''
+        Submits the figure (fig_json, the serialized figure) to be rendered as fmt, in the pool of a process serving the app if this is a background job (see the constructor)
+        or in the pool of this process otherwise
+
+        Returns the future of the render (or a QueuedRender waited on the same way), its result is the rendered file as bytes
+        '''
+        if self.jobs != None and os.getpid() not in self.serving and self.jobs.get('serving') != None:
+            key = 'figure-' + uuid.uuid4().hex
+            self.jobs.push((key, fig_json, fmt), prefix='render')
+            return QueuedRender(self, key, fig_json, fmt)
+        self.start() #the pool is only started once a figure needs rendering
+        return self.pool.submit(render_figure, fig_json, fmt, self.scale)
+
+    def serialize(self, fig: Union[dict, object]) -> str:
+        '''
+        Serializes the figure (fig, a plotly figure or a figure dictionary) as plotly JSON with its keys sorted, so the same figure is always serialized the same way
+
+        Returns the serialized figure as a string
+        '''
+        if isinstance(fig, dict):
+            return json.dumps(fig, sort_keys=True)
+        return json.dumps(json.loads(fig.to_json()), sort_keys=True)
+
+    def file_name(self, fig_json: str, fmt: str) -> str:
+        '''
+        Gets the name of the exported file of the figure (fig_json, the serialized figure) in the format fmt, named by the hash of both
+
+        Returns the name as a string
+        '''
+        digest = hashlib.sha256((fmt + str(self.scale) + fig_json).encode()).hexdigest()[:16]
+        return 'figure_' + digest + '.' + fmt
+
+    def file_path(self, fig_json: str, fmt: str) -> str:
+        '''
+        Gets the path of the exported file of the figure (fig_json, the serialized figure) in the format fmt, in the export folder
+
+        Returns the path as a string
+        '''
+        return os.path.join(self.export_dir, self.file_name(fig_json, fmt))
+
+    def check_format(self, fmt: str) -> None:
+        '''
+        Raises a ValueError if fmt (a string) isn't one of EXPORT_FORMATS
+
+        Returns None
+        '''
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(fmt + ' is not a format figures can be exported as, choose from ' + ', '.join(EXPORT_FORMATS))
+        return
+
+    def render(self, fig: Union[dict, object], fmt: str = 'png') -> bytes:
+        '''
+        Renders the figure (fig, a plotly figure or a figure dictionary) as fmt (png, svg, or pdf) in the pool, waiting for it to finish
+
+        Returns the rendered file as bytes
+        '''
+        self.check_format(fmt)
+        return self.submit(self.serialize(fig), fmt).result()
+
+    def download(self, fig: Union[dict, object], fmt: str = 'png') -> tuple[str, bytes]:
+        '''
+        Renders the figure (fig, a plotly figure or a figure dictionary) as fmt (png, svg, or pdf) in memory to be sent to the user's browser
+        Nothing is written to disk unless archive mode is on, then the file is also saved to the export folder (or read from it if it was already exported)
+
+        Returns the name of the file as a string, and the file as bytes
+        '''
+        if self.archive:
+            path = self.export(fig, fmt)
+            with open(path, 'rb') as f:
+                return os.path.basename(path), f.read()
+        fig_json = self.serialize(fig)
+        self.check_format(fmt)
+        return self.file_name(fig_json, fmt), self.submit(fig_json, fmt).result()
+
+    def table_file_name(self, data: bytes, extension: str = 'csv') -> str:
+        '''
+        Gets the name of the file of a data table (data, the bytes of the file) with extension (a string, see table_extension in table_export.py), named by the hash of its content
+
+        Returns the name as a string
+        '''
+        return 'table_' + hashlib.sha256(data).hexdigest()[:16] + '.' + extension
+
+    def download_table(self, df: object, fmt: str = 'csv', compression: str = 'none') -> tuple[str, bytes]:
+        '''
+        Writes the data table (df, a pandas DataFrame) as fmt with compression (strings, see table_export.py) in memory to be sent to the user's browser, named by the hash of its content
+        Nothing is written to disk unless archive mode is on, then the file is also saved to the table folder
+        Raises a ValueError if the format or compression can't be used (see check_table_format in table_export.py)
+
+        Returns the name of the file as a string, and the file as bytes
+        '''
+        data = table_bytes(df, fmt, compression)
+        file_name = self.table_file_name(data, table_extension(fmt, compression))
+        if self.archive:
+            path = os.path.join(self.table_dir, file_name)
+            if not os.path.exists(path):
+                write_file(path, data)
+        return file_name, data
+
+    def export(self, fig: Union[dict, object], fmt: str = 'png') -> str:
+        '''
+        Exports the figure (fig, a plotly figure or a figure dictionary) as fmt (png, svg, or pdf) to the export folder
+
+        Returns the path of the exported file as a string
+        '''
+        return self.export_many([fig], fmt)[0]
+
+    def export_many(self, figs: list, fmt: str = 'png') -> list[str]:
+        '''
+        Exports every figure in figs (a list of plotly figures or figure dictionaries) as fmt (png, svg, or pdf) to the export folder
+        All the figures are queued to the pool at once and rendered in parallel, figures that were already exported aren't rendered again
+
+        Returns a list of the paths of the exported files (strings), in the same order as figs
+        '''
+        self.check_format(fmt)
+        paths = []
+        pending = {}
+        for fig in figs:
+            fig_json = self.serialize(fig)
+            path = self.file_path(fig_json, fmt)
+            paths += [path]
+            if not os.path.exists(path) and path not in pending:
+                pending[path] = self.submit(fig_json, fmt)
+        for path, future in pending.items():
+            write_file(path, future.result())
+        return paths
@@ -0,0 +1,118 @@
+import json
+from typing import Callable
+import diskcache
+from src.cache import LRUCache
+
+
+def selection_key(resolved: dict) -> str:
+    '''
+    Takes in a complete resolved selection (the dictionary held in 'selection-store' in main_dash.py, made by resolve_selection in the Irr_DB class)
+    and builds the key its figure is cached under from everything the figure depends on: the user specifications in resolved['params'] (already in a set order),
+    the visualization type (and whether it is animated), the statistic, the answer to the bar plot x axis or line graph number of lines question, whether large selection mode is on,
+    and for maps the year shown (resolved['map_year'], each year of a map is its own figure)
+
+    Returns the key as a string
+    '''
+    selection = resolved['selection']
+    key = {'params': resolved['params'],
+           'viz_type': selection['viz_type'],
+           'animate': selection.get('animate', False),
+           'stat_type': selection['stat_type'],
+           'yr_or_states': resolved['yr_or_states'],
+           's_multiple_or_one': resolved['s_multiple_or_one'],
+           'large': resolved.get('large', False),
+           'map_year': resolved.get('map_year')}
+    return json.dumps(key, sort_keys=True)
+
+
+class BaseFigureCache:
+    '''
+    Parent class of FigureCache and DiskFigureCache, each of which stores figures with its own get(key) and set(key, value)
+    '''
+
+    def get_or_build(self, key: str, build: Callable[[], str]) -> str:
+        '''
+        Looks up the figure stored under key, if it isn't stored (never built, or dropped from the cache) calls build
+        (a function taking no arguments that returns the serialized figure) and stores its result
+
+        Returns the serialized figure as a string
+        '''
+        fig_json = self.get(key)
+        if fig_json == None:
+            fig_json = build()
+            self.set(key, fig_json)
+        return fig_json
+
+
+class FigureCache(BaseFigureCache, LRUCache):
+    def __init__(self, maxsize: int = 128) -> None:
+        '''
+        Constructor for the bounded cache of figures shared by every user of the Dash app
+        Each figure is stored as its serialized plotly JSON under the key made by selection_key(resolved)
+
+        Returns None
+        '''
+        super().__init__(maxsize)
+        return
+
+    def close(self) -> None:
+        '''
+        Called when the app shuts down, the figures are only held in memory so they are removed
+
+        Returns None
+        '''
+        self.clear()
+        return
+
+
+class DiskFigureCache(BaseFigureCache):
+    def __init__(self, directory: str, size_limit: int = 2**27) -> None:
+        '''
+        Constructor for the cache of figures kept on disk in directory (a string), used instead of FigureCache when figures are built by background callbacks
+        Background callbacks run in their own process, so a figure built by one of them is only seen by the app and later jobs if the cache is shared through the disk
+        Once the figures take up size_limit bytes (an int, 128 MB by default), the least recently used figures are dropped
+
+        Returns None
+        '''
+        self.cache = diskcache.Cache(directory, size_limit=size_limit, eviction_policy='least-recently-used')
+        self.cache.stats(enable=True)
+        return
+
+    @property
+    def hits(self) -> int:
+        return self.cache.stats()[0]
+
+    @property
+    def misses(self) -> int:
+        return self.cache.stats()[1]
+
+    def get(self, key: str, default: str = None) -> str:
+        return self.cache.get(key, default)
+
+    def set(self, key: str, value: str) -> None:
+        self.cache.set(key, value)
+        return
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.cache
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def clear(self) -> None:
+        '''
+        Removes every figure from the cache
+
+        Returns None
+        '''
+        self.cache.clear()
+        return
+
+    def close(self) -> None:
+        '''
+        Called when a process serving the app shuts down, closes its connection to the cache but keeps the figures for the other processes
+
+        Returns None
+        '''
+        self.cache.close()
+        return
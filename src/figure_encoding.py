@@ -0,0 +1,88 @@
+import base64
+from typing import Union
+import numpy as np
+import plotly.io as pio
+
+##properties of a trace whose values are sent as typed arrays, every other property (labels, colors, text) is sent as it is
+TYPED_ARRAY_KEYS = ('x', 'y', 'z')
+
+##arrays shorter than this are sent as JSON lists, the dtype and base64 padding of a typed array outweigh what it saves on only a few values
+TYPED_ARRAY_MIN_LENGTH = 8
+
+##values are sent as float32 if the number each float32 is written as is within this relative difference of the value,
+#which allows for the rounding error of the database summing values in float64 (such as 217638.80000000002 for 217638.8) but nothing more
+FLOAT32_RTOL = 1e-9
+
+
+def numeric_array(values: Union[list, tuple, np.ndarray]) -> Union[np.ndarray, None]:
+    '''
+    Takes in the values of a property of a trace (a list, tuple, or numpy array)
+
+    Returns the values as a numpy array of float64 (None values become NaN, which plotly.js treats as missing like it treats null),
+    or None if any value isn't a number (such as the year or state labels on the x axis) or there are too few values to be worth encoding
+    '''
+    if len(values) < TYPED_ARRAY_MIN_LENGTH:
+        return None
+    array = np.asarray(values)
+    if array.dtype.kind in 'iuf':
+        return array.astype('f8')
+    if array.dtype.kind != 'O': #strings, booleans, or dates
+        return None
+    if not all(v is None or (isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_))) for v in values):
+        return None
+    return np.array([np.nan if v is None else v for v in values], dtype='f8')
+
+
+def typed_array(values: Union[list, tuple, np.ndarray]) -> Union[dict, list, tuple, np.ndarray]:
+    '''
+    Takes in the values of a property of a trace (a list, tuple, or numpy array)
+
+    Encodes numeric values as a plotly typed array: a dictionary of the dtype and the bytes of the values in base64 ('bdata'), which plotly.js reads straight into a typed array.
+    The values are float32 ('f4', half the bytes) if every value is written the same way as a float32 (up to FLOAT32_RTOL), which holds for the values in the irrigation database
+    (at most 7 significant digits), so the graph and its hovertext show the same numbers. Otherwise they stay float64 ('f8')
+
+    Returns the typed array as a dictionary, or values as they were if they can't be encoded (see numeric_array)
+    '''
+    array = numeric_array(values)
+    if array is None:
+        return values
+    as_f4 = array.astype('f4')
+    written = np.array([float(str(v)) for v in as_f4]) #str is the shortest repr of a float32, the number plotly.js shows for it
+    if np.all(np.isclose(written, array, rtol=FLOAT32_RTOL, atol=0) | np.isnan(array)):
+        array = as_f4
+    array = array.astype(array.dtype.newbyteorder('<')) #typed arrays are read as little endian
+    return {'dtype': array.dtype.str[1:], 'bdata': base64.b64encode(array.tobytes()).decode()}
+
+
+def encode_traces(traces: list[dict]) -> None:
+    '''
+    Replaces the numeric arrays (TYPED_ARRAY_KEYS) of every trace in traces (a list of trace dictionaries) with typed arrays made by typed_array
+
+    Returns None
+    '''
+    for trace in traces:
+        for key in TYPED_ARRAY_KEYS:
+            if key in trace and isinstance(trace[key], (list, tuple, np.ndarray)):
+                trace[key] = typed_array(trace[key])
+    return
+
+
+def figure_json(fig: object, typed_arrays: bool = False) -> str:
+    '''
+    Serializes fig (a plotly figure) as plotly JSON to be sent to the browser
+
+    If typed_arrays is True, the numeric values of its traces and of the traces of its frames (if it is an animation) are sent as typed arrays (see typed_array)
+    rather than as JSON lists of floats, which makes long traces smaller and faster to parse in the browser (a line of one state has only a value per census year,
+    too few to be encoded, so what it saves depends on the figure, see benchmarks/payload.py).
+    Plotly's own figure objects only take values as lists or numpy arrays, so the values are encoded on the figure's dictionary once the figure is built.
+    Figures with typed arrays are rendered by kaleido as they are, as long as they aren't validated against plotly's figure objects (see render_figure in export_service.py)
+
+    Returns the serialized figure as a string
+    '''
+    if not typed_arrays:
+        return fig.to_json()
+    fig_dict = fig.to_plotly_json()
+    encode_traces(fig_dict.get('data', []))
+    for frame in fig_dict.get('frames', []):
+        encode_traces(frame.get('data', []))
+    return pio.to_json(fig_dict, validate=False)
@@ -0,0 +1,62 @@
+import json
+from typing import Union
+from dash import Patch
+
+##a patch is only sent if it is at most this fraction of the size of the full figure, otherwise (the chart changed too much) the full figure is sent
+MAX_PATCH_RATIO = 0.5
+
+
+def diff_dict(patch: Patch, old: dict, new: dict, depth: int) -> int:
+    '''
+    Adds to patch (a dash Patch pointing at a dictionary of the figure, such as one trace or the layout) every key of new (a dictionary) that differs from old (a dictionary),
+    and removes every key of old that new doesn't have. Keys holding dictionaries in both are compared key by key down to depth (an int) levels,
+    so changing only the title text of the layout replaces only the text rather than the whole title
+
+    Returns the size (in characters of JSON) of the values added to the patch, as an int
+    '''
+    size = 0
+    for key in old.keys() - new.keys():
+        del patch[key]
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        if depth > 1 and isinstance(value, dict) and isinstance(old.get(key), dict):
+            size += diff_dict(patch[key], old[key], value, depth - 1)
+        else:
+            patch[key] = value
+            size += len(json.dumps(value))
+    return size
+
+
+def figure_patch(old: Union[dict, None], new: dict, new_size: int) -> Union[Patch, None]:
+    '''
+    Takes in the figure the browser already shows (old, a figure dictionary, None if it isn't known), the figure to show next (new, a figure dictionary)
+    and the size of the new figure (new_size, in characters of its JSON)
+
+    Builds a dash Patch that turns old into new by only sending what changed: the values of each trace that changed (such as its y values after the statistic changed),
+    traces added or removed, the parts of the layout that changed (such as the title), and the frames if it is an animation. Everything else, like the layout's template, stays in the browser
+
+    Returns the Patch, or None if the full figure should be sent instead (old isn't known, a trace changed its type, or the patch would be more than MAX_PATCH_RATIO of the full figure)
+    '''
+    if old == None:
+        return None
+    old_data = old.get('data', [])
+    new_data = new.get('data', [])
+    patch = Patch()
+    size = 0
+    for i in range(min(len(old_data), len(new_data))):
+        if old_data[i].get('type') != new_data[i].get('type'): #a different kind of chart, nothing to reuse
+            return None
+        size += diff_dict(patch['data'][i], old_data[i], new_data[i], 1)
+    if len(new_data) > len(old_data):
+        patch['data'].extend(new_data[len(old_data):])
+        size += len(json.dumps(new_data[len(old_data):]))
+    for i in reversed(range(len(new_data), len(old_data))): #removed from the end so the index of every trace before it stays the same
+        del patch['data'][i]
+    size += diff_dict(patch['layout'], old.get('layout', {}), new.get('layout', {}), 3)
+    if old.get('frames') != new.get('frames'): #the frames of an animation are replaced as a whole
+        patch['frames'] = new.get('frames', [])
+        size += len(json.dumps(new.get('frames', [])))
+    if size > MAX_PATCH_RATIO * new_size:
+        return None
+    return patch
@@ -1,8 +1,91 @@
 import pandas as pd
 import sqlite3
 import os
+import json
+import threading
 from typing import Union
 
+
+def sql_power(base: Union[float, None], exponent: Union[float, None]) -> Union[float, None]:
+    '''
+    Takes in the base and exponent of a power in a sql query (floats, or None for NULL)
+
+    Returns base raised to exponent as a float, or None (NULL) if either is NULL or the power isn't a real number (a negative base with a fractional exponent)
+    '''
+    if base == None or exponent == None:
+        return None
+    try:
+        result = float(base) ** float(exponent)
+    except (OverflowError, ZeroDivisionError):
+        return None
+    return result if isinstance(result, float) else None #a negative base with a fractional exponent gives a complex number
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    '''
+    Adds the functions the queries of the tool use that sqlite may not have to conn (a sqlite3 connection): power(base, exponent) (see sql_power),
+    which sqlite only has when built with its math functions, used for the annual growth rate (see derived_query in Irr_DB.py)
+
+    Returns None
+    '''
+    conn.create_function('power', 2, sql_power, deterministic=True)
+    return
+
+
+class ConnectionPool:
+    def __init__(self, path_db: str) -> None:
+        '''
+        Constructor for a pool of read-only connections to the database at path_db (a string)
+        Each thread gets its own connection, which stays open between queries instead of being opened and closed for every query
+
+        Returns None
+        '''
+        self.path_db = path_db
+        self.reset()
+        return
+
+    def reset(self) -> None:
+        '''
+        Forgets every connection in the pool, done when the pool is made and when the process has been forked (connections can't be shared between processes)
+
+        Returns None
+        '''
+        self.pid = os.getpid()
+        self.local = threading.local()
+        self.conns = []
+        self.lock = threading.Lock()
+        return
+
+    def connection(self) -> sqlite3.Connection:
+        '''
+        Gets the connection of the current thread, opening it if the thread hasn't used the database yet
+
+        Returns a sqlite3 connection
+        '''
+        if self.pid != os.getpid(): #the pool was copied into a forked worker process
+            self.reset()
+        conn = getattr(self.local, 'conn', None)
+        if conn == None:
+            conn = sqlite3.connect('file:' + self.path_db + '?mode=ro', uri=True, check_same_thread=False)
+            register_functions(conn)
+            self.local.conn = conn
+            with self.lock:
+                self.conns += [conn]
+        return conn
+
+    def close_all(self) -> None:
+        '''
+        Closes every connection in the pool
+
+        Returns None
+        '''
+        with self.lock:
+            for conn in self.conns:
+                conn.close()
+        self.reset()
+        return
+
+
 class DB:
     def __init__(self,
                  path_db: str , # Path to the database file
@@ -25,16 +108,19 @@ class DB:
         else:
             self.exists=True #the file exists so the database does not need to get made again in the Irr_DB class constructor
         self.path_db = path_db
+        self.pool = None #set by the DataService in data_service.py so queries reuse open connections
+        self.query_cache = None #set by the DataService in data_service.py so repeated queries aren't sent to the database again
         return
     
     def connect(self) -> None:
         '''
         Sets up connection to database, so it can then be queried
-        Enables foriegn key constraint checking
+        Adds the functions the queries use that sqlite may not have (see register_functions), and enables foriegn key constraint checking
         
         Returns None
         '''
         self.conn = sqlite3.connect(self.path_db)
+        register_functions(self.conn)
         self.curs = self.conn.cursor()
         self.curs.execute("PRAGMA foreign_keys=ON;")
         return
@@ -54,12 +140,40 @@ class DB:
         Another input possible for params is None because the user specifies commodity first, which does not change dynamically so no additional input is needed
         Uses pd.read_sql to query database
         
+        If a connection pool has been set, uses the current thread's open connection rather than opening and closing a new one
+        If a query cache has been set, the results of the same query with the same params are only retrieved from the database once
+
         Returns the results of the query in a pandas DataFrame
         '''
+        if self.query_cache != None:
+            key = (sql, json.dumps(params, sort_keys=True))
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                return cached.copy() #copy so the caller can't change the cached results
+        if self.pool != None:
+            results = pd.read_sql(sql, self.pool.connection(), params=params)
+        else:
+            self.connect()
+            results = pd.read_sql(sql, self.conn,params=params)
+            self.close()
+        if self.query_cache != None:
+            self.query_cache.set(key, results.copy())
+        return results
+
+    def build_indexes(self) -> None:
+        '''
+        Builds the indexes used by the queries of the Dash app if they don't exist yet
+        The primary key of tMain starts with state_id and year, so an index starting with commodity is added for queries filtering on commodity, domain, and data item
+
+        Returns None
+        '''
         self.connect()
-        results = pd.read_sql(sql, self.conn,params=params)
+        self.curs.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tMain_selection ON tMain (commodity, domain, data_item, state_id, domain_category, year)
+        ;""")
+        self.conn.commit()
         self.close()
-        return results
+        return
 
 
     def drop_all_tables(self) -> None:
@@ -0,0 +1,120 @@
+import importlib
+from typing import Callable
+import diskcache
+import multiprocess
+import multiprocess.forkserver
+import psutil
+from dash import DiskcacheManager
+
+
+class FunctionRef:
+    def __init__(self, func: Callable) -> None:
+        '''
+        Constructor for a reference to func (a function defined at the top of a module) by the name of its module and its own name,
+        so a job process calls the function of its own copy of the module rather than a copy of the function sent to it
+        (a function of the script being run, __main__, would otherwise be sent whole, without the state the job sets up in its module)
+
+        Returns None
+        '''
+        self.module = func.__module__
+        self.name = func.__name__
+        return
+
+    def __call__(self, *args, **kwargs) -> object:
+        '''
+        Looks up the function in its module (importing the module if this process hasn't yet) and calls it with args and kwargs
+
+        Returns what the function returns
+        '''
+        return getattr(importlib.import_module(self.module), self.name)(*args, **kwargs)
+
+
+def run_job(setup: FunctionRef, setup_args: tuple, job_fn: Callable, *job_args) -> None:
+    '''
+    Runs in the process of a background job: calls setup with setup_args (a tuple) to set up what the callbacks need in a new process,
+    then the job itself (job_fn, the function Dash made for the background callback, called with job_args)
+
+    Returns None
+    '''
+    setup(*setup_args)
+    job_fn(*job_args)
+    return
+
+
+class JobManager(DiskcacheManager):
+    def __init__(self, cache: diskcache.Cache, setup: Callable, setup_args: tuple = (), preload: list[str] = None,
+                 cache_by: list[Callable] = None, expire: int = None) -> None:
+        '''
+        Constructor for the manager of the background callbacks of the Dash app, a DiskcacheManager (results are kept in cache, a diskcache.Cache,
+        see DiskcacheManager for cache_by and expire) whose jobs are started from a fork server rather than forked from the process serving the app
+
+        Forking the app's process copies whatever its other threads (the prefetcher's, the server's) were holding at that moment, such as a lock on a module being imported,
+        which the job would then wait on forever. The fork server is a process of its own running no other threads, started once the first job is,
+        that imports the modules in preload (a list of module names) once, and forks every job from itself. Where there is no fork server (Windows), jobs are spawned
+
+        A job doesn't inherit the app's state, so each one calls setup (a function defined at the top of a module) with setup_args (a tuple) before running the callback,
+        to set up what the callbacks need (see start_services in main_dash.py)
+
+        Returns None
+        '''
+        self.setup = FunctionRef(setup)
+        self.setup_args = setup_args
+        method = 'forkserver' if 'forkserver' in multiprocess.get_all_start_methods() else 'spawn'
+        self.context = multiprocess.get_context(method)
+        if method == 'forkserver' and preload != None:
+            self.context.set_forkserver_preload(preload)
+        super().__init__(cache, cache_by=cache_by, expire=expire)
+        return
+
+    def start(self) -> None:
+        '''
+        Starts the fork server now (importing the modules in preload) rather than when the first job is started, so the first user to start a job doesn't wait on it
+        Nothing to start where jobs are spawned
+
+        Returns None
+        '''
+        if self.context.get_start_method() == 'forkserver':
+            multiprocess.forkserver.ensure_running()
+        return
+
+    def terminate_job(self, job: object) -> None:
+        '''
+        Stops the job of a background callback (job, its process id) and its child processes, as DiskcacheManager does
+        Jobs are child processes of the fork server, which reaps them as soon as they end, so a job that ends while it is being stopped is already gone
+
+        Returns None
+        '''
+        try:
+            super().terminate_job(job)
+        except psutil.NoSuchProcess:
+            pass
+        return
+
+    def job_running(self, job: object) -> bool:
+        '''
+        Returns whether the job of a background callback (job, its process id) is still running, False once it has ended (see terminate_job)
+        '''
+        try:
+            return super().job_running(job)
+        except psutil.NoSuchProcess:
+            return False
+
+    def make_job_fn(self, fn: Callable, progress: bool, key: str = None) -> Callable:
+        '''
+        Makes the job of the background callback fn (a function, which takes in set_progress first if progress is True) the way DiskcacheManager does,
+        with fn sent to the job by reference (see FunctionRef)
+
+        Returns the job function
+        '''
+        return super().make_job_fn(FunctionRef(fn), progress, key)
+
+    def call_job_fn(self, key: str, job_fn: Callable, args: object, context: dict) -> int:
+        '''
+        Starts the job of a background callback (job_fn, made by make_job_fn, called with the key its result is stored under, the key of its progress,
+        the callback's arguments (args), and the callback context) in a process of its own from the fork server, the process sets itself up first (see run_job)
+
+        Returns the process id of the job (an int)
+        '''
+        process = self.context.Process(target=run_job, args=(self.setup, self.setup_args, job_fn, key, self._make_progress_key(key), args, context))
+        process.start()
+        return process.pid
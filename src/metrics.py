@@ -0,0 +1,233 @@
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable
+import diskcache
+from dash import ctx
+from dash.exceptions import MissingCallbackContextException
+from flask import Flask, Response
+from plotly.io.json import to_json_plotly
+
+##upper bounds (in seconds) of the buckets of the callback latency histogram
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+##most calls measured by background jobs kept waiting to be collected, the oldest are dropped once there are more (no process has rendered the metrics in a while)
+JOB_QUEUE_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+
+def callback_name(output: str) -> str:
+    '''
+    Takes in the output of a callback as Dash sends it (a string such as '..graph.figure...graph.style@1a2b..' for a callback with several outputs)
+    and names the callback after its outputs, without the dots around them or the hashes Dash adds to outputs that allow duplicates
+
+    Returns the name as a string (such as 'graph.figure,graph.style')
+    '''
+    output = re.sub(r'@[0-9a-f]+', '', output)
+    return ','.join(o for o in output.strip('.').split('...') if o)
+
+
+def escape(value: str) -> str:
+    '''
+    Escapes value (a string) to be used as the value of a label in the Prometheus text format
+
+    Returns the escaped string
+    '''
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def outputs_name(outputs_list: Any) -> str:
+    '''
+    Takes in the outputs of the callback being run (ctx.outputs_list, a dictionary for a callback with one output, a list of them for a callback with several)
+    and names the callback after them the same way callback_name does
+
+    Returns the name as a string (such as 'graph.figure,graph.style')
+    '''
+    if isinstance(outputs_list, dict):
+        outputs_list = [outputs_list]
+    names = []
+    for output in outputs_list or []:
+        for o in (output if isinstance(output, list) else [output]): #outputs with pattern matching ids are lists of outputs
+            names += [str(o['id']) + '.' + re.sub(r'@[0-9a-f]+', '', o['property'])] #outputs that allow duplicates have a hash added to their property
+    return ','.join(names)
+
+
+def payload_bytes(value: Any) -> int:
+    '''
+    Takes in a value sent to or from a callback (its arguments, or what it returns)
+
+    Returns how many bytes the value takes up as JSON (as Dash sends it), 0 if it can't be written as JSON
+    '''
+    if isinstance(value, str): #figures are mostly returned already serialized
+        return len(value.encode())
+    try:
+        return len(to_json_plotly(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class CallbackMetrics:
+    def __init__(self, slow_threshold: float = None, jobs_dir: str = None) -> None:
+        '''
+        Constructor for the metrics of the server side callbacks of the Dash app: for every callback and the input that triggered it (ctx.triggered_id),
+        how many times it was called, a histogram of how long it took, and how many bytes were sent to and from it
+        Each callback is measured inside its own body (see call), so a background callback is timed in the job running it rather than by the requests polling for its result
+        Callbacks may run on several threads, so every update holds a lock
+
+        Calls that take longer than slow_threshold (a float of seconds, None to never log) are logged as warnings
+
+        Background jobs run in their own processes, so the calls they measure are sent through a queue kept on disk in jobs_dir (a string, the folder the background callbacks
+        keep their jobs in) and added to the metrics of whichever process serving the app renders them next. Without jobs_dir, every call is kept by the process it ran in
+
+        Only callbacks run on the server are measured, clientside callbacks never reach it.
+        Each process serving the app keeps its own metrics
+
+        Returns None
+        '''
+        self.slow_threshold = slow_threshold
+        self.serving = set() #ids of the processes serving the app, any other process running a callback is a background job
+        self.jobs = None
+        if jobs_dir != None:
+            self.jobs = diskcache.Deque(directory=os.path.join(jobs_dir, 'metrics'), maxlen=JOB_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.buckets = {}
+        self.latency = {}
+        self.request_bytes = {}
+        self.response_bytes = {}
+        return
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        '''
+        Runs the callback function func (a callable) with args and kwargs from inside the callback (so ctx describes the call) and measures it:
+        how long it took, the bytes of its arguments and of what it returns, the callback's outputs (ctx.outputs_list) and the input that triggered it (ctx.triggered_id)
+        The call is measured even if func raises (such as PreventUpdate), nothing is counted as returned then
+
+        Returns what func returns
+        '''
+        start = time.perf_counter()
+        returned = False
+        try:
+            response = func(*args, **kwargs)
+            returned = True
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            try:
+                name = outputs_name(ctx.outputs_list)
+                trigger = '' if ctx.triggered_id == None else str(ctx.triggered_id) #None on the initial call
+            except MissingCallbackContextException: #called directly rather than by Dash
+                name, trigger = func.__name__, ''
+            arguments = [a for a in args if not callable(a)] + [v for v in kwargs.values() if not callable(v)] #leaves out set_progress of background callbacks
+            request_bytes = payload_bytes(arguments)
+            response_bytes = payload_bytes(response) if returned else 0
+            if self.slow_threshold != None and seconds > self.slow_threshold:
+                logger.warning('Slow callback %s (triggered by %s) took %.3f s', name, trigger or 'initial call', seconds)
+            if self.jobs != None and os.getpid() not in self.serving: #a background job, forked from the process serving the app into a process of its own
+                self.jobs.append((name, trigger, seconds, request_bytes, response_bytes))
+            else:
+                self.record(name, trigger, seconds, request_bytes, response_bytes)
+
+    def record(self, name: str, trigger: str, seconds: float, request_bytes: int, response_bytes: int) -> None:
+        '''
+        Records one call of the callback name (a string) triggered by the input trigger (a string, empty on the initial call),
+        that took seconds (a float) with request_bytes and response_bytes (ints) sent to and from the callback
+
+        Returns None
+        '''
+        key = (name, trigger)
+        with self.lock:
+            if key not in self.calls:
+                self.calls[key] = 0
+                self.buckets[key] = [0] * (len(LATENCY_BUCKETS) + 1)
+                self.latency[key] = 0.0
+                self.request_bytes[key] = 0
+                self.response_bytes[key] = 0
+            self.calls[key] += 1
+            self.buckets[key][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency[key] += seconds
+            self.request_bytes[key] += request_bytes
+            self.response_bytes[key] += response_bytes
+        return
+
+    def collect(self) -> None:
+        '''
+        Records every call measured by a background job since the metrics were last collected, taking them off the queue shared through jobs_dir
+
+        Returns None
+        '''
+        if self.jobs == None:
+            return
+        while True:
+            try:
+                call = self.jobs.popleft()
+            except IndexError: #the queue is empty
+                return
+            self.record(*call)
+
+    def render(self) -> str:
+        '''
+        Writes every recorded metric in the Prometheus text format
+
+        Returns the metrics as a string
+        '''
+        self.collect()
+        with self.lock:
+            keys = sorted(self.calls)
+            calls = dict(self.calls)
+            buckets = {key: list(self.buckets[key]) for key in keys}
+            latency = dict(self.latency)
+            request_bytes = dict(self.request_bytes)
+            response_bytes = dict(self.response_bytes)
+
+        lines = ['# HELP dvat_callback_calls_total Calls of each server side callback, by the input that triggered it',
+                 '# TYPE dvat_callback_calls_total counter']
+        for key in keys:
+            lines += ['dvat_callback_calls_total{%s} %d' % (self.labels(key), calls[key])]
+
+        lines += ['# HELP dvat_callback_latency_seconds How long each server side callback took',
+                  '# TYPE dvat_callback_latency_seconds histogram']
+        for key in keys:
+            labels = self.labels(key)
+            count = 0
+            for bound, n in zip(LATENCY_BUCKETS + ['+Inf'], buckets[key]):
+                count += n #buckets are cumulative in the Prometheus format
+                lines += ['dvat_callback_latency_seconds_bucket{%s,le="%s"} %d' % (labels, bound, count)]
+            lines += ['dvat_callback_latency_seconds_sum{%s} %f' % (labels, latency[key]),
+                      'dvat_callback_latency_seconds_count{%s} %d' % (labels, calls[key])]
+
+        for metric, values, help_text in [('dvat_callback_request_bytes_total', request_bytes, 'Bytes sent to each server side callback'),
+                                          ('dvat_callback_response_bytes_total', response_bytes, 'Bytes sent back by each server side callback')]:
+            lines += ['# HELP ' + metric + ' ' + help_text, '# TYPE ' + metric + ' counter']
+            for key in keys:
+                lines += ['%s{%s} %d' % (metric, self.labels(key), values[key])]
+        return '\n'.join(lines) + '\n'
+
+    def labels(self, key: tuple[str, str]) -> str:
+        '''
+        Takes in the key of a callback's metrics (a tuple of the callback name and the input that triggered it)
+
+        Returns the labels of the metrics as a string in the Prometheus text format
+        '''
+        return 'callback="%s",trigger="%s"' % (escape(key[0]), escape(key[1]))
+
+    def serve(self, server: Flask) -> None:
+        '''
+        Adds the /metrics route to server (the Flask server of the Dash app, app.server), which returns the metrics in the Prometheus text format
+        The callbacks themselves are measured by wrapping them (see call, and measured in main_dash.py), every process handling a request to server is remembered as serving the app
+
+        Returns None
+        '''
+        @server.before_request
+        def serving():
+            self.serving.add(os.getpid())
+
+        def metrics():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+        server.add_url_rule('/metrics', 'metrics', metrics)
+        return
@@ -0,0 +1,162 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable
+from src.cache import LRUCache
+
+
+def lower_priority() -> None:
+    '''
+    Runs once in each thread of the prefetch pool when it starts, lowers the thread's scheduling priority so prefetching never slows down the callbacks users are waiting on
+    Only possible on Linux (where each thread has its own priority), elsewhere the threads keep the normal priority
+
+    Returns None
+    '''
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+    return
+
+
+class Prefetcher:
+    def __init__(self, data_service: object, final_results: Callable[[dict], object], figure: Callable[[dict], object],
+                 workers: int = 1, max_pending: int = 8, max_sessions: int = 1024) -> None:
+        '''
+        Constructor for the prefetcher of the Dash app, which guesses the next steps of a user from their resolved selection and runs them ahead of time
+        on a pool of low priority threads (workers, an int), so their results are already in the query cache and figure cache once the user gets there:
+            once states are chosen, the selection is resolved for every commodity (the next dropdown)
+            once years are chosen, the final query is run for every statistic (and every answer to the bar plot or line graph question still to be answered)
+            once the selection is complete, the figure is built, so clicking Generate Graph is a cache hit
+
+        Takes in the data service of the app (data_service, queried through data_service.db), and the functions running the final query (final_results)
+        and building the figure (figure) of a resolved selection, both take in a resolved selection (get_final_results and get_figure_json in main_dash.py)
+
+        Each session (a page the app is open in) only has its latest selection prefetched, prefetching for an older selection is cancelled once a new one is scheduled.
+        At most max_pending (an int) selections wait to be prefetched at once, more are dropped (the app is busy, so prefetching would only compete with users),
+        and the latest selection of up to max_sessions (an int) sessions is remembered
+
+        Background jobs are started from a fork server rather than forked from the app's process (see job_manager.py), so a job never inherits a lock
+        (on the database, or on a module being imported) that a prefetch thread held at that moment
+
+        Nothing is started until a selection is first scheduled
+
+        Returns None
+        '''
+        self.data_service = data_service
+        self.final_results = final_results
+        self.figure = figure
+        self.workers = workers
+        self.max_pending = max_pending
+        self.sessions = LRUCache(max_sessions)
+        self.pool = None
+        self.pid = None
+        self.pending = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.lock = threading.RLock() #cancelling a future calls done right away, which takes the lock again
+        return
+
+    def schedule(self, resolved: dict, session: Hashable = None) -> None:
+        '''
+        Schedules the next steps of the resolved selection (resolved, as held in 'selection-store') of session (the id of the page the app is open in) to be prefetched,
+        cancelling what was scheduled for the session's older selection
+
+        Returns None
+        '''
+        with self.lock:
+            if self.pool == None or self.pid != os.getpid(): #not started yet, or copied into a forked process where the pool's threads don't exist
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch', initializer=lower_priority)
+                self.pid = os.getpid()
+                self.pending = 0
+            previous = self.sessions.get(session)
+            generation = 1 if previous == None else previous['generation'] + 1
+            if previous != None and previous['future'] != None and previous['future'].cancel(): #hadn't started yet
+                self.cancelled += 1
+            if self.pending >= self.max_pending: #still moves the session on, so its older selection stops being prefetched
+                self.sessions.set(session, {'generation': generation, 'future': None})
+                return
+            self.pending += 1
+            latest = {'generation': generation, 'future': None}
+            self.sessions.set(session, latest) #set before submitting, the thread may start right away and checks it is still the latest selection of the session
+            latest['future'] = self.pool.submit(self.run, resolved, session, generation)
+        latest['future'].add_done_callback(self.done)
+        return
+
+    def done(self, future: object) -> None:
+        '''
+        Called once a scheduled selection is prefetched (or cancelled), it no longer counts as pending
+
+        Returns None
+        '''
+        with self.lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+        return
+
+    def current(self, session: Hashable, generation: int) -> bool:
+        '''
+        Returns whether generation (an int) is still the latest selection scheduled for session, prefetching stops once it isn't
+        '''
+        latest = self.sessions.get(session)
+        return latest != None and latest['generation'] == generation
+
+    def run(self, resolved: dict, session: Hashable, generation: int) -> None:
+        '''
+        Runs on a thread of the pool, prefetches the next steps of the resolved selection (see the constructor) as long as it is the latest selection of session
+
+        Returns None
+        '''
+        db = self.data_service.db
+        selection = resolved['selection']
+        if db == None or (len(selection['state_id']) == 0 and selection['viz_type'] != 'Map'): #a map shows every state, so its states are never chosen
+            return
+
+        if selection['commodity'] == '': #the commodity is chosen next, resolves the selection for each of them
+            for commodity in resolved['options']['commodity']:
+                if not self.current(session, generation):
+                    return
+                db.resolve_selection(dict(selection, commodity=commodity))
+            return
+
+        if resolved['params'] == None or selection['viz_type'] == '': #years not chosen yet, the final query can't be guessed
+            return
+
+        if resolved['complete']: #Generate Graph is next, the final query is run while building the figure
+            self.figure(resolved)
+            return
+
+        #the statistic and the bar plot or line graph question are all that is left, runs the final query for every statistic and answer not chosen yet
+        stats = [selection['stat_type']] if selection['stat_type'] != '' else resolved['options']['stat_type']
+        for stat_type in stats:
+            candidate_selection = dict(selection, stat_type=stat_type)
+            candidate = db.resolve_selection(candidate_selection)
+            answers = [('barax', a) for a in candidate['options']['barax']] + [('line_n', a) for a in candidate['options']['line_n']]
+            if candidate['complete'] or len(answers) == 0:
+                answers = [(None, None)]
+            for key, answer in answers:
+                if not self.current(session, generation):
+                    return
+                if key != None:
+                    candidate = db.resolve_selection(dict(candidate_selection, **{key: answer}))
+                if not candidate['complete']:
+                    continue
+                candidate['selection'] = dict(candidate_selection, **({key: answer} if key != None else {}))
+                candidate['large'] = resolved.get('large', False)
+                self.final_results(candidate)
+        return
+
+    def stop(self) -> None:
+        '''
+        Cancels everything waiting to be prefetched and stops the pool, the prefetcher can be used again afterwards
+
+        Returns None
+        '''
+        with self.lock:
+            if self.pool != None and self.pid == os.getpid():
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            self.pid = None
+        self.sessions.clear()
+        return
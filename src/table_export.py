@@ -0,0 +1,262 @@
+import gzip
+import importlib.util
+import io
+from typing import BinaryIO, Iterable, Iterator
+import pandas as pd
+
+##formats a data table can be exported as: comma separated values, Parquet, Excel, and JSON Lines (one JSON object per row)
+TABLE_FORMATS = ['csv', 'parquet', 'xlsx', 'jsonl']
+
+##text formats, written row group by row group and compressed as a whole file (with the compression added to the file's extension)
+TEXT_FORMATS = ['csv', 'jsonl']
+
+##compressions a data table can be exported with: text formats are compressed as a whole file, Parquet files compress each column of each row group
+#with the codec of the same name (snappy, Parquet's usual codec, when none is chosen), Excel files are already zip archives so they are never compressed again
+TABLE_COMPRESSIONS = ['none', 'gzip', 'zstd', 'snappy']
+
+##formats a data table can be streamed as (see stream_table), every format but Excel
+STREAM_FORMATS = ['csv', 'parquet', 'jsonl']
+
+##packages the formats and compressions need that aren't among the requirements of the tool, each is only needed to export as that format or compression
+OPTIONAL_MODULES = {'parquet': 'pyarrow', 'xlsx': 'openpyxl', 'zstd': 'zstandard'}
+
+##rows written at once, each is one row group of a Parquet file, text formats never hold more than this many rows as text
+ROW_GROUP_ROWS = 50000
+
+##most rows an Excel sheet can hold (with its header)
+EXCEL_MAX_ROWS = 1048575
+
+
+def installed(name: str) -> bool:
+    '''
+    Returns whether the format or compression name (a string) can be used, that is whether the package it needs (see OPTIONAL_MODULES) is installed, if it needs one
+    '''
+    return name not in OPTIONAL_MODULES or importlib.util.find_spec(OPTIONAL_MODULES[name]) != None
+
+
+def check_table_format(fmt: str, compression: str = 'none') -> None:
+    '''
+    Raises a ValueError if fmt (a string) isn't one of TABLE_FORMATS, compression (a string) isn't one of TABLE_COMPRESSIONS or can't compress fmt
+    (snappy only compresses Parquet files), or the package either needs isn't installed
+
+    Returns None
+    '''
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(fmt + ' is not a format data tables can be exported as, choose from ' + ', '.join(TABLE_FORMATS))
+    if compression not in TABLE_COMPRESSIONS:
+        raise ValueError(compression + ' is not a compression data tables can be exported with, choose from ' + ', '.join(TABLE_COMPRESSIONS))
+    if compression == 'snappy' and fmt != 'parquet':
+        raise ValueError('snappy only compresses parquet files, choose gzip or zstd for ' + fmt + ' files')
+    for name in [fmt] + ([compression] if fmt != 'parquet' else []): #Parquet's codecs are all part of pyarrow
+        if not installed(name):
+            raise ValueError('Exporting with ' + name + ' needs the ' + OPTIONAL_MODULES[name] + ' package, install it with pip install ' + OPTIONAL_MODULES[name])
+    return
+
+
+def table_extension(fmt: str, compression: str = 'none') -> str:
+    '''
+    Gets the extension of a data table exported as fmt with compression (strings), such as csv.gz for a gzipped .csv file or parquet for any Parquet file
+
+    Returns the extension as a string
+    '''
+    if fmt in TEXT_FORMATS and compression in ['gzip', 'zstd']:
+        return fmt + ('.gz' if compression == 'gzip' else '.zst')
+    return fmt
+
+
+def row_groups(df: pd.DataFrame) -> Iterable[pd.DataFrame]:
+    '''
+    Splits the data table df (a pandas DataFrame) into row groups of at most ROW_GROUP_ROWS rows, each a view of df rather than a copy
+
+    Returns a generator of the row groups (pandas DataFrames), an empty data table is one empty row group so its header is still written
+    '''
+    for start in range(0, max(len(df), 1), ROW_GROUP_ROWS):
+        yield df.iloc[start:start + ROW_GROUP_ROWS]
+
+
+class UnclosedStream(io.RawIOBase):
+    def __init__(self, out: BinaryIO) -> None:
+        '''
+        Constructor for a binary file object that writes straight to out (a binary file object) but leaves it open once closed,
+        so uncompressed text formats are written the same way as compressed ones (see compressed_stream)
+
+        Returns None
+        '''
+        self.out = out
+        return
+
+    def writable(self) -> bool:
+        '''
+        Returns True, the stream is only written to
+        '''
+        return True
+
+    def write(self, data: bytes) -> int:
+        '''
+        Writes data (bytes) to out
+
+        Returns the number of bytes written as an int
+        '''
+        return self.out.write(data)
+
+
+class DrainedStream(io.RawIOBase):
+    def __init__(self) -> None:
+        '''
+        Constructor for a binary file object that keeps what is written to it until it is drained (see drain), used by stream_table to hand on the bytes of a file as it is written
+
+        Returns None
+        '''
+        self.parts = []
+        self.position = 0
+        return
+
+    def writable(self) -> bool:
+        '''
+        Returns True, the stream is only written to
+        '''
+        return True
+
+    def write(self, data: bytes) -> int:
+        '''
+        Keeps data (bytes) until the stream is drained
+
+        Returns the number of bytes written as an int
+        '''
+        self.parts += [bytes(data)]
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        '''
+        Returns the number of bytes written since the stream was made as an int (writers such as Parquet's keep track of where they are in the file)
+        '''
+        return self.position
+
+    def drain(self) -> bytes:
+        '''
+        Returns every byte written since the stream was last drained, and forgets them
+        '''
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def compressed_stream(out: BinaryIO, compression: str) -> BinaryIO:
+    '''
+    Wraps out (a binary file object) so what is written to the wrapper is compressed with compression (none, gzip, or zstd) on its way to out
+    Closing the wrapper finishes the compressed stream without closing out. gzip streams have no timestamp, so the same data table always gives the same file
+
+    Returns the wrapper (a binary file object), or a wrapper writing straight to out if compression is none
+    '''
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=out, mode='wb', mtime=0)
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(out, closefd=False)
+    return UnclosedStream(out)
+
+
+def table_writes(chunks: Iterable[pd.DataFrame], out: BinaryIO, fmt: str, compression: str) -> Iterator[None]:
+    '''
+    Writes the data table made of chunks (pandas DataFrames with the same columns) to out (a binary file object) as fmt with compression, one chunk at a time,
+    so only one chunk is ever held as text (csv and jsonl) or as an Arrow table (parquet), each chunk is a row group of a Parquet file
+    Excel files can't be written a chunk at a time, so the chunks are put together and written at once (at most EXCEL_MAX_ROWS rows)
+    Column names are written as strings (years are the columns of some data tables)
+
+    Returns a generator that yields (None) once each chunk has been written to out, and finishes the file (its compressed stream or Parquet footer) once there are no chunks left
+    '''
+    chunks = (chunk.set_axis([str(c) for c in chunk.columns], axis=1, copy=False) for chunk in chunks)
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer == None:
+                writer = pq.ParquetWriter(out, table.schema, compression='snappy' if compression == 'none' else compression)
+            writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+            yield
+        if writer != None:
+            writer.close()
+        return
+    if fmt == 'xlsx':
+        df = pd.concat(list(chunks), ignore_index=True)
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError('The data table has ' + str(len(df)) + ' rows, more than an Excel sheet can hold, export it as csv, parquet, or jsonl instead')
+        df.to_excel(out, index=False, engine='openpyxl')
+        return
+    stream = compressed_stream(out, compression)
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    for i, chunk in enumerate(chunks):
+        if fmt == 'csv':
+            chunk.to_csv(text, index=False, header=i == 0)
+        elif len(chunk):
+            chunk.to_json(text, orient='records', lines=True, force_ascii=False) #every row ends with a newline, so the next chunk starts on its own line
+        text.flush()
+        yield
+    text.close() #flushes the text and finishes the compressed stream, out stays open
+    return
+
+
+def write_table_chunks(chunks: Iterable[pd.DataFrame], out: BinaryIO, fmt: str = 'csv', compression: str = 'none') -> None:
+    '''
+    Writes the data table made of chunks (pandas DataFrames with the same columns, such as the row groups of one data table made by row_groups) to out (a binary file object)
+    as fmt with compression, one chunk at a time (see table_writes)
+
+    Raises a ValueError if the format or compression can't be used (see check_table_format)
+
+    Returns None
+    '''
+    check_table_format(fmt, compression)
+    for _ in table_writes(chunks, out, fmt, compression):
+        pass
+    return
+
+
+def stream_table(chunks: Iterable[pd.DataFrame], fmt: str = 'csv', compression: str = 'none') -> Iterator[bytes]:
+    '''
+    Writes the data table made of chunks (pandas DataFrames with the same columns, such as the batches of rows from stream_raw_rows in Irr_DB.py) as fmt with compression
+    without ever holding the whole file: the bytes written for each chunk are handed on (such as to the HTTP response sending the file) before the next chunk is read,
+    so memory stays about the size of one chunk however large the file is. Chunks are only read as the returned generator is iterated, closing it stops reading them
+
+    Raises a ValueError right away if the format or compression can't be used (see check_table_format), or if fmt is xlsx (Excel files can't be written a chunk at a time)
+
+    Returns a generator of the bytes of the file, in order
+    '''
+    check_table_format(fmt, compression)
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(fmt + ' files can\'t be streamed, choose from ' + ', '.join(STREAM_FORMATS))
+
+    def stream() -> Iterator[bytes]:
+        out = DrainedStream()
+        for _ in table_writes(chunks, out, fmt, compression):
+            data = out.drain()
+            if len(data) > 0:
+                yield data
+        data = out.drain() #what finishing the file wrote
+        if len(data) > 0:
+            yield data
+
+    return stream()
+
+
+def write_table(df: pd.DataFrame, out: BinaryIO, fmt: str = 'csv', compression: str = 'none') -> None:
+    '''
+    Writes the data table df (a pandas DataFrame) to out (a binary file object) as fmt with compression, one row group at a time (see write_table_chunks)
+
+    Returns None
+    '''
+    write_table_chunks(row_groups(df), out, fmt, compression)
+    return
+
+
+def table_bytes(df: pd.DataFrame, fmt: str = 'csv', compression: str = 'none') -> bytes:
+    '''
+    Writes the data table df (a pandas DataFrame) as fmt with compression in memory (see write_table)
+
+    Returns the file as bytes
+    '''
+    out = io.BytesIO()
+    write_table(df, out, fmt, compression)
+    return out.getvalue()
@@ -1,7 +1,21 @@
+from functools import lru_cache
 from typing import Union
-import plotly
-import plotly.express as px
 import plotly.graph_objects as go
+from plotly.colors import qualitative
+
+##past this many states or years, titles give how many were chosen rather than listing all of them (so titles of large selections fit over the visualization)
+MAX_TITLE_ITEMS=10
+
+##how many formatted labels (tick and legend labels, and data items in titles) are remembered, each label is formatted once and then looked up every time a figure uses it
+#bounded so the registry stays small however many different labels are used, every data item and domain category in the database fits in it
+LABEL_REGISTRY_SIZE=4096
+
+##in large selection mode, a line graph with more lines than this is split into facets (subplots stacked over the same years) of at most this many lines each,
+#and the legend has one group per facet rather than one per line
+LINES_PER_FACET=10
+
+##operations (the statistics derived from the sum, see which_statistic in Irr_DB.py) whose values are percentages rather than in the units of the data item
+PERCENT_OPERATIONS=['PERCENT CHANGE IN SUM', 'ANNUAL GROWTH RATE OF SUM']
 
 
 
@@ -39,11 +53,42 @@ def encode_key_name_ys(user_click:str)->str:
     return encoder[user_click]
 
 
+@lru_cache(maxsize=LABEL_REGISTRY_SIZE)
+def format_label(label:str, data_item:bool=False)->str:
+    '''
+    Called by form_x_tick_labels(label_list, line_graph, data_item), formats a label (a string) for a bar plot
+    Memoized (the label registry), so each label is only formatted the first time it is used
+    If data_item is True, the label is a data item, so its units are removed (data items compared together already have the same units on the y axis)
+
+    Splits the label into lines of 3 words each (with <br> after every line) to prevent overlap of text, keeping a trailing $ on the line before it
+
+    Returns the formatted label as a string
+    '''
+    if data_item: #if comparing multiple data items, they will already have the same units specified on the y axis, this gets rids of the unit info for each tick(bar plot) or line(line graph) label
+        label=label.split(' - ')[0]
+    initial=label.split(' ') #splits the label into its words
+    if initial[-1]=="$": #prevents awkward labels in which 2nd line is just $
+        initial=initial[:-2]+[initial[-2]+" $"]
+    fin_l='' #represents the final formatted individual label of either a tick (bar plot) or line (line graph)
+    label_line_n=len(initial)//3 #record how many lines that have 3 words in them 
+    rem_w=len(initial)%3 #record how many remaining words there are after the grouping
+    j=0
+    for k in range(label_line_n): #gets every 3 words in an individual label and adds <br> to the end of it
+        ret=initial[j:j+3]
+        to_add=' '.join(ret)+'<br>'
+        j+=3
+        fin_l+=to_add #adds each newly formatted line to the final version of the individual label
+    if rem_w !=0: ##if there were remaining words after grouping every 3 words of an individual label, adds a line break after them. Mainly done for readablility purposes in bar plots
+        fin_l+=' '.join(initial[-rem_w:])+'<br>'
+    return fin_l
+
 def form_x_tick_labels(label_list:list[str], line_graph:bool=False, data_item:bool=False)->list[str]:
     '''
-    Called by both 
+    Called by both make_bar_plot and make_line_graph
     
     Prevents overlap of text in barplots and minimized visualizations in line graphs (once accomodating long horiztontal labels)
+    Each label is only formatted (by format_label(label, data_item)) the first time it is used, after that it is looked up
+
     Returns a list of strings to be used as the tick labels in a bar plot or line labels to be used in the legends of line graphs
     '''
     
@@ -51,23 +96,7 @@ def form_x_tick_labels(label_list:list[str], line_graph:bool=False, data_item:bo
     x_tick_labels=[] #represents final list of formatted tick labels for bar plots, or line labels in the legends of line graphs
 
     for i in label_list: 
-
-        if data_item: #if comparing multiple data items, they will already have the same units specified on the y axis, this gets rids of the unit info for each tick(bar plot) or line(line graph) label
-            i=i.split(' - ')[0]
-        initial=i.split(' ') #splits each label in label list 
-        if initial[-1]=="$": #prevents awkward labels in which 2nd line is just $
-            initial=initial[:-2]+[initial[-2]+" $"]
-        fin_l='' #represents the final formatted individual label of either a tick (bar plot) or line (line graph)
-        label_line_n=len(initial)//3 #record how many lines that have 3 words in them 
-        rem_w=len(initial)%3 #record how many remaining words there are after the grouping
-        j=0
-        for k in range(label_line_n): #gets every 3 words in an individual label and adds <br> to the end of it
-            ret=initial[j:j+3]
-            to_add=' '.join(ret)+'<br>'
-            j+=3
-            fin_l+=to_add #adds each newly formatted line to the final version of the individual label
-        if rem_w !=0: ##if there were remaining words after grouping every 3 words of an individual label, adds a line break after them. Mainly done for readablility purposes in bar plots
-            fin_l+=' '.join(initial[-rem_w:])+'<br>'
+        fin_l=format_label(i, data_item)
         if line_graph:
             #Items are spaced apart appropriately in make_line graph, so don't need the extra '<br>' in the last line of each label unlike in bar plots
             fin_l=fin_l[:-4] #removes '<br>'
@@ -75,6 +104,21 @@ def form_x_tick_labels(label_list:list[str], line_graph:bool=False, data_item:bo
 
     return x_tick_labels
 
+def value_units(params:dict[str,list[str]], operation:str)->str:
+    '''
+    Gets the units of the values of a visualization or data table, from the initial data item in params (a dictionary where each key is a string and each value is a list of strings)
+    and the operation they were computed with (a string, see which_statistic in Irr_DB.py): percent for the percent change and annual growth rate,
+    the units of the data item per the units of the data item it is divided by for a ratio (params['ratio_item']), the units of the data item otherwise
+
+    Returns the units as a string, put on the y axis (or the color bar of a map)
+    '''
+    units=params['data_item'][0].split(' - ')[-1]
+    if operation in PERCENT_OPERATIONS:
+        return 'PERCENT'
+    if 'ratio_item' in params.keys():
+        return units+' PER '+params['ratio_item'][0].split(' - ')[-1]
+    return units
+
 def set_dt_title(dt_list:list[str])->str:
     '''
     Called by get_full_title(operation, params, y_ax_title) and result is implemented in the case that there is only one data item specified by the user. 
@@ -83,16 +127,40 @@ def set_dt_title(dt_list:list[str])->str:
     
     The data item will be presented in the final title of the visualization and data table the user is able to obtain.
     Some data item names are quite long, so adds a line break after the 2nd comma if there are 3 or more commas
+    The data item is formatted by format_title_item(d_title), so it is only formatted the first time it is used
     
     Returns a string representing the properly formatted data item to be presented in the title of the final visualizations or data tables the user obtains
     '''
     d_title="".join(dt_list) #converts the list of one data item (a string) into an individual string
+    return format_title_item(d_title)
+
+@lru_cache(maxsize=LABEL_REGISTRY_SIZE)
+def format_title_item(d_title:str)->str:
+    '''
+    Called by set_dt_title(dt_list), adds a line break after the 2nd comma of d_title (a string) if there are 3 or more commas
+    Memoized (the label registry), so each data item is only formatted the first time it is used
+
+    Returns the formatted data item as a string
+    '''
     check_sep=d_title.split(", ") #splits the string based on how many commas there are 
     if len(check_sep)>=3: #if there are more than 3 commas, adds a line break after the 2nd 
         new_title=", ".join(check_sep[:2])+"<br>"+", ".join(check_sep[2:])
         return new_title
     return d_title
 
+def title_items(items:list[str], plural:str)->str:
+    '''
+    Called by get_full_title(operation, params, y_ax_title) to list the states or years chosen by the user (items, a list of strings) in the title
+    If there are more than MAX_TITLE_ITEMS of them, gives how many there are with plural (a string, ex. STATES) instead, and the range of years for years
+
+    Returns a string to be placed in the title
+    '''
+    if len(items) <= MAX_TITLE_ITEMS:
+        return ", ".join(items)
+    if plural == 'YEARS':
+        return str(len(items))+" "+plural+" ("+min(items)+"-"+max(items)+")"
+    return str(len(items))+" "+plural
+
 def get_full_title(operation:str, params:dict[str,list[str]], y_ax_title:str)->str:
     '''
     Called by make_bar_plot and make_line_graph in visualization.py to set titles for the visualizations, and display_table in main_dash.py in order to set a heading over the final data table
@@ -100,27 +168,31 @@ def get_full_title(operation:str, params:dict[str,list[str]], y_ax_title:str)->s
     Constructs title based on amount of domain categories or data items specified by the user in params (a dictionary where each key is a string and each value is a list of strings)
     Utilizes other values in params if necessary to construct a sufficientiy specific title 
     To give accurate title for visualization/data table, takes in operation (in the sql aggregate function form of either Minimum, Maximum, Average, or Sum)
-    Items that are present in all titles are the states and years selected by the user, held in params
+    Items that are present in all titles are the states and years selected by the user, held in params (formatted by title_items(items, plural) so large selections fit)
     
     In the case multiple data items were chosen by the user, uses the y axis title passed in as y_ax_title(a string) in the overall title 
 
 
+    If the values are a ratio (params holds 'ratio_item'), the data item it divides by follows the data item, ex. RATIO OF SUM OF TOTAL EXPENSE, MEASURED IN $ TO SUM OF ACRES IRRIGATED - ACRES
+
     Returns a sufficiently specific title for the visualization/data table the user wants to obtain as a string
     '''
     dt_title=set_dt_title(params['data_item'])
+    if 'ratio_item' in params.keys():
+        dt_title=dt_title+" TO SUM OF "+set_dt_title(params['ratio_item'])
     if 'domain_category' in params.keys(): ##formats the data item to be presented in the title of the visualizations or data table appropriately 
         if len(params['domain_category'])==1: #domain, data item (only 1 was selected by user), domain category, state(s), year(s) included in title
-            full_title= operation+ " OF "+dt_title+",<br>"+"".join(params['domain'])+": "+"".join(params['domain_category'])+",<br> IN "+", ".join(params['state_id'])+",<br>"+", ".join(params['year'])
+            full_title= operation+ " OF "+dt_title+",<br>"+"".join(params['domain'])+": "+"".join(params['domain_category'])+",<br> IN "+title_items(params['state_id'], 'STATES')+",<br>"+title_items(params['year'], 'YEARS')
 
         else: #domain, data item (only 1 was selected by user), state(s), year(s) included in title
-            full_title=operation+ " OF "+dt_title+",<br>"+"".join(params['domain'])+" ITEMS"+"<br> IN "+", ".join(params['state_id'])+",<br>"+", ".join(params['year'])
+            full_title=operation+ " OF "+dt_title+",<br>"+"".join(params['domain'])+" ITEMS"+"<br> IN "+title_items(params['state_id'], 'STATES')+",<br>"+title_items(params['year'], 'YEARS')
      
     else: #domain=TOTAL since no domain category specified by the user in params
         if len(params['data_item'])>1: #multiple data items so uses y axis title in overall title 
             #y axis title, commodity, state(s), year(s) included in title
-            full_title=operation+" OF TOTAL "+ y_ax_title+" FOR VARIOUS "+"".join(params['commodity'])+" DATA ITEMS"+",<br> IN "+", ".join(params['state_id'])+",<br>"+", ".join(params['year'])
+            full_title=operation+" OF TOTAL "+ y_ax_title+" FOR VARIOUS "+"".join(params['commodity'])+" DATA ITEMS"+",<br> IN "+title_items(params['state_id'], 'STATES')+",<br>"+title_items(params['year'], 'YEARS')
         else: #only one data item specified so uses the properly formatted data item in dt_title, in addition to state(s) and year(s), in the title
-            full_title=operation+" OF TOTAL "+dt_title+",<br>IN "+", ".join(params['state_id'])+",<br>"+", ".join(params['year'])
+            full_title=operation+" OF TOTAL "+dt_title+",<br>IN "+title_items(params['state_id'], 'STATES')+",<br>"+title_items(params['year'], 'YEARS')
     return full_title
 
 def set_title_pos(title:str)->float:
@@ -140,7 +212,7 @@ def set_title_pos(title:str)->float:
         t_ypos=0.96
     return t_ypos
 
-def make_bar_plot(params:dict, yr_or_states: Union[str, None], y_data:list[float], operation:str)-> plotly.graph_objs._figure.Figure: 
+def make_bar_plot(params:dict, yr_or_states: Union[str, None], y_data:list[float], operation:str, large:bool=False)-> go.Figure: 
     '''
     Takes in all of the specifications set by the user in the dictionary params (each key is a string, each value is a list of strings, the keys 
     consist of state_id, commodity, domain, data_item, possibly domain_category, and year), for bar plots takes in yr_or_states (a str representing the column of the user's choice 'year' or 'state_id') describing if states or years is on the x axis (otherwise is None),
@@ -155,6 +227,8 @@ def make_bar_plot(params:dict, yr_or_states: Union[str, None], y_data:list[float
     Gets the appropriate title for the bar plot by calling get_full_title(operation, params, y_ax_title), and its position by calling set_title_pos(title)
     Formats the hovertext for all bars, text dependent on what is on the x axis
     Creates bar plot
+    If large is True (the user turned on large selection mode), all bars are drawn by one trace rather than one trace per bar, so the figure sent to the browser stays small,
+    and the x tick labels are made smaller and angled so that many of them fit
     
     
     Returns the bar plot to be placed in the final Dash app as a plotly.graph_objs._figure.Figure
@@ -208,13 +282,21 @@ def make_bar_plot(params:dict, yr_or_states: Union[str, None], y_data:list[float
         x_tick_labels=[i+"<br>" for i in sorted(params[yr_or_states])] ##yr or states will be either 'state_id' or 'year'
         hover_x=name_encode_ys(yr_or_states).capitalize()
     ##making y axis:
-    y_ax_title=params['data_item'][0].split(' - ')[-1] #obtaining units to put on the y axis
+    y_ax_title=value_units(params, operation) #obtaining units to put on the y axis
 
 
     # Creating bar plot
-    x_key=x_ax_title
-    data={x_key: x_tick_labels, 'value': y_data}
-    fig = px.bar(data, x=x_key, y='value', width=850, height=600, color=x_tick_labels)
+    x_tick_angle=0
+    if large: ##one trace for every bar, colored the same way plotly express colors each bar
+        colors=[qualitative.Plotly[i%len(qualitative.Plotly)] for i in range(len(x_tick_labels))]
+        fig = go.Figure(go.Bar(x=x_tick_labels, y=y_data, marker_color=colors))
+        x_ax_tick_font=min(x_ax_tick_font, 9)
+        x_tick_angle=-45
+    else:
+        x_key=x_ax_title
+        data={x_key: x_tick_labels, 'value': y_data}
+        import plotly.express as px #imported only once a bar plot is made, since importing plotly express is slow and it isn't needed to start the app
+        fig = px.bar(data, x=x_key, y='value', width=850, height=600, color=x_tick_labels)
     fig.update_traces(hovertemplate=hover_x+': %{x}<br>Value: %{y}<extra></extra>') #configuring hovertext 
     full_title=get_full_title(operation, params, y_ax_title) #obtaining appropriate title for visualization 
     t_ypos=set_title_pos(full_title) #obtaining vertical position for overall title of visualization
@@ -232,7 +314,7 @@ def make_bar_plot(params:dict, yr_or_states: Union[str, None], y_data:list[float
         height=705,
         xaxis = dict( #adjusting tick labels
         tickfont = dict(size=x_ax_tick_font), 
-        tickangle=0),
+        tickangle=x_tick_angle),
         hoverlabel=dict(bgcolor='white',font=dict(color='black')), #styling hovertext
         margin=dict(l=50, r=50, t=100, b=50) #setting margins of visualization
     )
@@ -241,7 +323,45 @@ def make_bar_plot(params:dict, yr_or_states: Union[str, None], y_data:list[float
 
 
 
-def make_line_graph(params:dict[str, list[str]], y_data:list[list[float]],operation:str, s_multiple_or_one:Union[str, None])->plotly.graph_objs._figure.Figure:
+def legend_group(i:int, large:bool)->dict:
+    '''
+    Takes in the position of a line in a line graph (i, an int) and whether large selection mode is on (large, a bool)
+
+    Every line is its own legend group, so the legend can set the space between the labels of the lines (tracegroupgap).
+    In large selection mode, lines are grouped LINES_PER_FACET at a time instead, the same lines that facet_lines(fig, traces, y_ax_title) draws in one facet
+
+    Returns a dictionary of the legend group properties of the line's trace
+    '''
+    if large:
+        return {'legendgroup': 'Facet'+str(i//LINES_PER_FACET)}
+    return {'legendgroup': "Group"+str(i), 'legendgrouptitle_text': ''}
+
+def facet_lines(traces:list, y_ax_title:str)->go.Figure:
+    '''
+    Called by make_line_graph when a large selection has more than LINES_PER_FACET lines,
+    takes in the lines of the graph (traces, a list of plotly traces, legend groups set by legend_group(i, large)) and the title of the y axis (y_ax_title, a string)
+
+    Draws every LINES_PER_FACET lines in a facet of their own, facets are stacked over the same years (shared x axis) so no one plot holds every line.
+    Each facet is titled with the names of its first and last line, which also titles its group in the legend (clicking the title hides or shows the facet's lines)
+
+    Returns the figure as a plotly.graph_objs._figure.Figure
+    '''
+    from plotly.subplots import make_subplots #imported only once a large line graph is faceted, like plotly express in make_bar_plot
+    facets=[traces[i:i+LINES_PER_FACET] for i in range(0, len(traces), LINES_PER_FACET)]
+    titles=[]
+    for facet in facets: #names of the lines lose the line breaks of their legend labels in titles
+        names=[facet[0].name.replace('<br>', ' ').strip(), facet[-1].name.replace('<br>', ' ').strip()]
+        titles+=[names[0] if len(facet)==1 else names[0]+' TO '+names[1]]
+    fig=make_subplots(rows=len(facets), cols=1, shared_xaxes=True, vertical_spacing=0.3/len(facets), subplot_titles=titles)
+    for row, facet in enumerate(facets):
+        facet[0].update(legendgrouptitle_text=titles[row])
+        fig.add_traces(facet, rows=row+1, cols=1)
+    fig.update_yaxes(title_text=y_ax_title)
+    fig.update_xaxes(title_text='YEARS', row=len(facets), col=1) #only under the bottom facet
+    fig.update_annotations(font_size=11) #facet titles
+    return fig
+
+def make_line_graph(params:dict[str, list[str]], y_data:list[list[float]],operation:str, s_multiple_or_one:Union[str, None], large:bool=False)->go.Figure:
 
     '''
     Takes in all of the specifications set by the user in the dictionary params (each key is a string, each value is a list of strings, the keys 
@@ -252,7 +372,10 @@ def make_line_graph(params:dict[str, list[str]], y_data:list[list[float]],operat
     Formats how the names of each of the lines to be displayed in the legend by calling form_x_tick_lables(params, line_graph, data_item) if each line is a data item or domain category, ensuring a minimal amount of horizontal space is used by using line breaks
     When doing so also sort them in alphabetical order to match the ordering of results from the query to the database held in y_data, if states are representing each line also sorts them in alphabetical order
     
-    If multiple lines are to be displayed on the graph, uses a for loop to add traces to the graph, each wiht its own legend group to then be able to set spacing betwene each of the labels for the lines
+    If multiple lines are to be displayed on the graph, uses a for loop to make the traces, each wiht its own legend group to then be able to set spacing betwene each of the labels for the lines,
+    and adds them to the graph all at once (adding traces one by one makes building the graph slower the more lines there are)
+    If large is True (the user turned on large selection mode), lines are drawn with WebGL (Scattergl) so many lines stay responsive in the browser, and the legend is made compact:
+    lines are grouped in the legend LINES_PER_FACET at a time (see legend_group(i, large)), and past LINES_PER_FACET lines each group is drawn in a facet of its own by facet_lines(traces, y_ax_title)
     Formats hovertext for each line added to the graph
 
     Determines y axis title, finds title for overall visualization by calling get_full_title(operation, params, y_ax_title), and find vertical position for title by calling set_title_pos(title)
@@ -287,45 +410,48 @@ def make_line_graph(params:dict[str, list[str]], y_data:list[list[float]],operat
             data_list=y_data ##just the values
  
     ##Creating line graph
+    scatter=go.Scattergl if large else go.Scatter #WebGL traces for large selections
+    traces=[]
 
     if (len(params['state_id'])==1) and (s_multiple_or_one ==None) and (len(params['data_item'])==1) : ##only one state and data item specified by the user
 
         if 'domain_category' in params.keys():
             if len(params['domain_category'])==1:
         
-                fig.add_trace(go.Scatter(x=params['year'], y=y_data[0], #just one line
+                traces+=[scatter(x=params['year'], y=y_data[0], #just one line
                                         mode='lines+markers',
-                                        name="".join(params['state_id']),hovertemplate='Year: %{x}, Value: %{y}<extra></extra>'))
+                                        name="".join(params['state_id']),hovertemplate='Year: %{x}, Value: %{y}<extra></extra>')]
             else: ##more than one domain_category
                 for i in range(len(data_list)): ##adding a line for every domain category chosen by the user
-                    fig.add_trace(go.Scatter(x=params['year'], y=y_data[i],
+                    traces+=[scatter(x=params['year'], y=y_data[i],
                                         mode='lines+markers',
                                         name=data_list[i],hovertemplate='Year: %{x}, Value: %{y}<extra></extra>',
-                                        legendgroup="Group"+str(i),legendgrouptitle_text=''))
+                                        **legend_group(i, large))]
         else:
-            fig.add_trace(go.Scatter(x=params['year'], y=y_data[0], #just one line
+            traces+=[scatter(x=params['year'], y=y_data[0], #just one line
                                         mode='lines+markers',
-                                        name="".join(params['state_id']),hovertemplate='Year: %{x}, Value: %{y}<extra></extra>'))
+                                        name="".join(params['state_id']),hovertemplate='Year: %{x}, Value: %{y}<extra></extra>')]
 
     elif s_multiple_or_one != 'one': ##if s_multiple_or_one = multiple or None, and already covered case where there could only be just one line
         for i in range(len(data_list)): ##adding a line for every data item or state chosen by the user
-            fig.add_trace(go.Scatter(x=params['year'], y=y_data[i],
+            traces+=[scatter(x=params['year'], y=y_data[i],
                                 mode='lines+markers',
                                 name=data_list[i],hovertemplate='Year: %{x}, Value: %{y}<extra></extra>',
-                                legendgroup="Group"+str(i),legendgrouptitle_text=''))
+                                **legend_group(i, large))]
     
     
     
     else: ##last case left is if s_mulitple_or_one = One, meaning multiple states were also chosen by the user, so results to display are the only list held in the list y_data
-        fig.add_trace(go.Scatter(x=params['year'], y=y_data[0],
-                                mode='lines+markers',hovertemplate='Year: %{x}, Value: %{y}<extra></extra>'))#,
+        traces+=[scatter(x=params['year'], y=y_data[0],
+                                mode='lines+markers',hovertemplate='Year: %{x}, Value: %{y}<extra></extra>')]#,
                                 #name='filler')
 
-
-
-
-
-    y_ax_title=params['data_item'][0].split(' - ')[-1] #obtaining units to put on the y axis
+    y_ax_title=value_units(params, operation) #obtaining units to put on the y axis
+    n_facets=-(-len(traces)//LINES_PER_FACET) if large else 1 #facets needed to hold every line (rounded up)
+    if n_facets>1: #too many lines for one plot, each LINES_PER_FACET lines are drawn in their own facet
+        fig=facet_lines(traces, y_ax_title)
+    else:
+        fig.add_traces(traces) #adds every line to the graph at once
     full_title=get_full_title(operation, params, y_ax_title) ##retrieving appropriate title for visualization
     t_ypos=set_title_pos(full_title) ##retrieving appropriate vertical position of the overall title for the visualization
 
@@ -335,13 +461,13 @@ def make_line_graph(params:dict[str, list[str]], y_data:list[list[float]],operat
                'y':t_ypos,
                'font': dict(size=14),
                'xanchor':'center'},
-        xaxis_title='YEARS', #constant YEARS as x axis title since this is a line graph
+        xaxis_title=None if n_facets>1 else 'YEARS', #constant YEARS as x axis title since this is a line graph (set under the bottom facet by facet_lines when faceted)
         yaxis_title=y_ax_title,
         width=940,
-        height=705,
+        height=max(705, 100+250*n_facets), #facets each get enough height to tell their lines apart
         hoverlabel=dict(bgcolor='white',font=dict(color='black')), #formatting hovertext style
         margin=dict(l=50, r=50, t=100, b=50), #sets margins of actual visualization
-        legend=dict(tracegroupgap=10) ##setting space in between each label corresponding to a line (legend group) on the line graph
+        legend=dict(tracegroupgap=10, font=dict(size=10 if large else 12)) ##setting space in between each legend group on the line graph (a line, or the lines of a facet for large selections, see legend_group(i, large))
         
         )
 
@@ -349,3 +475,124 @@ def make_line_graph(params:dict[str, list[str]], y_data:list[list[float]],operat
     return fig
 
 
+
+
+
+def map_trace_data(results, year:str)->dict[str, list]:
+    '''
+    Takes in the results of the query of a map (results, a pandas DataFrame with the columns state_id, state, year, and value, from execute_matrix_query in Irr_DB.py)
+    and the year to show (year, a string)
+
+    Returns a dictionary of the locations (state_id's), values (z), and state names (text) of every state with data for year, to set the choropleth trace of the map
+    '''
+    year_results=results[results['year']==year]
+    return {'locations': year_results['state_id'].tolist(), 'z': year_results['value'].tolist(), 'text': year_results['state'].tolist()}
+
+def make_map(params:dict[str, list[str]], results, operation:str, year:str)->go.Figure:
+    '''
+    Takes in all of the specifications set by the user in the dictionary params (each key is a string, each value is a list of strings, held by the resolved selection of a map),
+    the results of the map's query to the database (results, a pandas DataFrame with the columns state_id, state, year, and value, from execute_matrix_query in Irr_DB.py),
+    the sql aggregate function used in the query in the form of a string passed in as operation (MIN, MAX, AVG, SUM), and the year to show (year, a string)
+
+    Colors every state with data for year by its value on a map of the US (states are located by their state_id), hovering over a state shows its name and value
+    The color scale spans the values of every year, so a state keeps the same color for the same value as the user moves the year slider
+    Gets the appropriate title for the map by calling get_full_title(operation, params, y_ax_title) for the one year shown, and its position by calling set_title_pos(title)
+
+    Returns the map to be placed in the final Dash app as a plotly.graph_objs._figure.Figure
+    '''
+    y_ax_title=value_units(params, operation) #obtaining units to put on the color bar
+    fig=go.Figure(go.Choropleth(locationmode='USA-states', zmin=results['value'].min(), zmax=results['value'].max(),
+                                colorscale='Blues', colorbar=dict(title=y_ax_title),
+                                hovertemplate='State: %{text}<br>Value: %{z}<extra></extra>', **map_trace_data(results, year)))
+    full_title=get_full_title(operation, dict(params, year=[year]), y_ax_title) #title of the year shown rather than of every year on the slider
+    t_ypos=set_title_pos(full_title)
+
+    fig.update_layout(
+    title={'text': full_title,
+           'x':0.5,
+           'y':t_ypos,
+           'font': dict(size=14),
+           'xanchor':'center'},
+        geo=dict(scope='usa'),
+        width=940,
+        height=705,
+        hoverlabel=dict(bgcolor='white',font=dict(color='black')), #styling hovertext
+        margin=dict(l=50, r=50, t=100, b=50) #setting margins of visualization
+    )
+    return fig
+
+def add_year_frames(fig:go.Figure, params:dict[str, list[str]], operation:str, frame_data:dict[str, dict])->go.Figure:
+    '''
+    Called by make_map_animation and make_bar_animation, turns fig (the figure of the first year, a plotly.graph_objs._figure.Figure) into an animation over every year in params['year']
+    frame_data (a dictionary) holds the values of the figure's only trace for each year (a dictionary keyed by the year, each value a dictionary of the trace's properties that change)
+
+    Each year is a plotly frame holding only what changes from year to year (the trace's values and the title), so the animation stays about as small as the results of its one query
+    A play button and a slider over the years are added under the figure, plotly plays the frames in the browser so playing the animation never sends a request to the server
+
+    Returns fig
+    '''
+    y_ax_title=value_units(params, operation)
+    frames=[]
+    for year in params['year']:
+        full_title=get_full_title(operation, dict(params, year=[year]), y_ax_title)
+        frames+=[go.Frame(name=year, data=[dict(frame_data[year], type=fig.data[0].type)], traces=[0], layout={'title': {'text': full_title, 'y': set_title_pos(full_title)}})]
+    fig.frames=frames
+
+    step_args={'mode': 'immediate', 'frame': {'duration': 0, 'redraw': True}, 'transition': {'duration': 0}}
+    play_args={'frame': {'duration': 800, 'redraw': True}, 'transition': {'duration': 0}, 'fromcurrent': True}
+    fig.update_layout(
+        updatemenus=[{'type': 'buttons', 'direction': 'left', 'x': 0, 'y': -0.05, 'xanchor': 'left', 'yanchor': 'top', 'showactive': False,
+                      'buttons': [{'label': 'Play', 'method': 'animate', 'args': [None, play_args]},
+                                  {'label': 'Pause', 'method': 'animate', 'args': [[None], step_args]}]}],
+        sliders=[{'active': 0, 'x': 0.15, 'len': 0.85, 'y': -0.05, 'yanchor': 'top', 'currentvalue': {'prefix': 'Year: '},
+                  'steps': [{'label': year, 'method': 'animate', 'args': [[year], step_args]} for year in params['year']]}],
+        margin=dict(l=50, r=50, t=100, b=150) #room under the figure for the play button and slider
+    )
+    return fig
+
+def make_map_animation(params:dict[str, list[str]], results, operation:str)->go.Figure:
+    '''
+    Takes in the same arguments as make_map (without the year), and makes the map of the first year in params['year'] animated over every year with add_year_frames
+
+    Returns the animated map to be placed in the final Dash app as a plotly.graph_objs._figure.Figure
+    '''
+    fig=make_map(params, results, operation, params['year'][0])
+    return add_year_frames(fig, params, operation, {year: map_trace_data(results, year) for year in params['year']})
+
+def make_bar_animation(params:dict[str, list[str]], results, operation:str)->go.Figure:
+    '''
+    Takes in all of the specifications set by the user in the dictionary params (each key is a string, each value is a list of strings, held by the resolved selection of an animated bar plot),
+    the results of its query to the database (results, a pandas DataFrame with the columns state_id, state, year, and value, from execute_matrix_query in Irr_DB.py),
+    and the sql aggregate function used in the query in the form of a string passed in as operation (MIN, MAX, AVG, SUM)
+
+    Makes a bar plot with a bar for each state in params['state_id'] (colored the same way as make_bar_plot colors each bar), animated over every year in params['year'] with add_year_frames
+    The y axis spans the values of every year, so bars can be compared from year to year, a state without data for a year has no bar in it
+
+    Returns the animated bar plot to be placed in the final Dash app as a plotly.graph_objs._figure.Figure
+    '''
+    states=sorted(params['state_id'])
+    x_tick_labels=[i+"<br>" for i in states] #adding <br> to the end of every state to match the format of make_bar_plot
+    matrix=results.pivot(index='state_id', columns='year', values='value').reindex(index=states, columns=params['year'])
+    matrix=matrix.astype(object).where(matrix.notna(), None) #states without data for a year are None, so they have no bar
+    y_ax_title=value_units(params, operation)
+    colors=[qualitative.Plotly[i%len(qualitative.Plotly)] for i in range(len(states))]
+
+    fig=go.Figure(go.Bar(x=x_tick_labels, y=matrix[params['year'][0]].tolist(), marker_color=colors,
+                         hovertemplate='State: %{x}<br>Value: %{y}<extra></extra>'))
+    full_title=get_full_title(operation, dict(params, year=params['year'][:1]), y_ax_title)
+    fig.update_layout(
+    title={'text': full_title,
+           'x':0.5,
+           'y':set_title_pos(full_title),
+           'font': dict(size=14),
+           'xanchor':'center'},
+        showlegend=False,
+        xaxis_title='STATE',
+        yaxis_title=y_ax_title,
+        yaxis=dict(range=[min(0, results['value'].min()), results['value'].max()*1.1]), #same range for every year
+        width=940,
+        height=705,
+        xaxis=dict(tickfont=dict(size=12 if len(states)<=10 else 9)),
+        hoverlabel=dict(bgcolor='white',font=dict(color='black')),
+    )
+    return add_year_frames(fig, params, operation, {year: {'y': matrix[year].tolist()} for year in params['year']})
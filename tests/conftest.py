@@ -0,0 +1,121 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+from src.Irr_DB import Irr_DB
+
+##the root of the repository, found from this file so the tests can be run from any folder
+PATH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+##the states of the test database, with their names and ANSI codes as the USDA data has them, and the years every data item is reported for
+STATES = {'CA': ('CALIFORNIA', '06'), 'CO': ('COLORADO', '08'), 'NE': ('NEBRASKA', '31'), 'TX': ('TEXAS', '48')}
+YEARS = ['2003', '2008', '2013', '2018', '2023']
+
+##every series of values in the test database: commodity, data item, domain and domain category (as they are once cleaned by prep_data),
+#the states reporting it, and its first value (each later year adds 10, and each state is a multiple of the first state's values)
+SERIES = [('WATER', 'ACRES IRRIGATED - ACRES', 'TOTAL', 'NOT SPECIFIED', ['CA', 'CO', 'NE', 'TX'], 1000),
+          ('WATER', 'ACRES DRIP - ACRES', 'TOTAL', 'NOT SPECIFIED', ['CA', 'NE'], 200),
+          ('WATER', 'ACRE FEET APPLIED - ACRE FEET', 'TOTAL', 'NOT SPECIFIED', ['CA', 'CO', 'NE', 'TX'], 3000),
+          ('WATER', 'ACRE FEET APPLIED, BY SOURCE - ACRE FEET', 'WATER SOURCE', 'GROUND', ['CA', 'CO', 'NE', 'TX'], 1800),
+          ('WATER', 'ACRE FEET APPLIED, BY SOURCE - ACRE FEET', 'WATER SOURCE', 'SURFACE', ['CA', 'NE', 'TX'], 1200),
+          ('ENERGY', 'EXPENSE, MEASURED IN $', 'TOTAL', 'NOT SPECIFIED', ['CA', 'CO', 'NE', 'TX'], 50000),
+          ('ENERGY', 'EXPENSE, MEASURED IN $', 'ENERGY SOURCE', 'ELECTRICITY', ['CA', 'CO', 'NE', 'TX'], 30000),
+          ('ENERGY', 'EXPENSE, MEASURED IN $', 'ENERGY SOURCE', 'DIESEL', ['CA', 'CO', 'NE', 'TX'], 20000),
+          ('WELLS', 'NUMBER OF WELLS - NUMBER', 'TOTAL', 'NOT SPECIFIED', ['CA', 'CO', 'NE'], 40)]
+
+##the one value missing from a series, so a state without data for a year can be tested
+MISSING = ('TX', '2008', 'ACRE FEET APPLIED - ACRE FEET')
+
+##what the USDA data has before each commodity's data items, which prep_data removes
+RAW_PREFIX = {'WATER': 'WATER, IRRIGATION, ', 'ENERGY': 'ENERGY, IRRIGATION, ON FARM PUMPING - ', 'WELLS': 'WELLS, USED FOR IRRIGATION - '}
+
+
+def make_rows() -> pd.DataFrame:
+    '''
+    Builds every row of tMain in the test database from SERIES, leaving out MISSING
+
+    Returns a pandas DataFrame with the columns of tMain
+    '''
+    rows = []
+    for commodity, data_item, domain, domain_category, states, first in SERIES:
+        for s, state_id in enumerate(STATES):
+            for y, year in enumerate(YEARS):
+                if state_id in states and (state_id, year, data_item) != MISSING:
+                    rows.append({'state_id': state_id, 'year': year, 'commodity': commodity, 'data_item': data_item, 'domain': domain,
+                                 'domain_category': domain_category, 'value': float((first + 10 * y) * (s + 1))})
+    return pd.DataFrame(rows)
+
+
+##every row of tMain in the test database, tests compare what is queried against these
+ROWS = make_rows()
+
+
+def usda_data() -> pd.DataFrame:
+    '''
+    Writes ROWS the way the USDA data has them (the columns prep_data reads and drops, commodities repeated in data items, domains in domain categories,
+    values as text with commas), along with a row of weekly data and a withheld value, both of which prep_data drops
+
+    Returns a pandas DataFrame of the USDA data
+    '''
+    raw = pd.DataFrame({'Program': 'CENSUS',
+                        'Year': ROWS['year'],
+                        'Period': 'YEAR',
+                        'State': [STATES[s][0] for s in ROWS['state_id']],
+                        'State ANSI': [STATES[s][1] for s in ROWS['state_id']],
+                        'Commodity': ROWS['commodity'],
+                        'Data Item': [RAW_PREFIX[c] + d for c, d in zip(ROWS['commodity'], ROWS['data_item'])],
+                        'Domain': ROWS['domain'],
+                        'Domain Category': [c if d == 'TOTAL' else d + ': (' + c + ')' for d, c in zip(ROWS['domain'], ROWS['domain_category'])],
+                        'Value': [f'{v:,.0f}' for v in ROWS['value']]})
+    dropped = raw.iloc[[0, 0]].copy()
+    dropped['Period'] = ['MAR', 'YEAR']
+    dropped['Value'] = ['1', ' (D)']
+    dropped['Year'] = '1998'
+    raw = pd.concat([raw, dropped], ignore_index=True)
+    for column in ['Week Ending', 'Geo Level', 'Ag District', 'Ag District Code', 'County', 'County ANSI', 'Zip Code', 'Region', 'watershed_code', 'Watershed', 'CV (%)']:
+        raw[column] = ''
+    return raw
+
+
+@pytest.fixture(scope='session')
+def path_db(tmp_path_factory) -> str:
+    '''
+    Builds the test database with Irr_DB from the USDA data in usda_data, the same way the irrigation database is built from the data folder
+
+    Returns the path of the database (a string), in a folder laid out like the repository (the .csv files in its data folder)
+    '''
+    root = tmp_path_factory.mktemp('repository')
+    os.mkdir(root / 'data')
+    shutil.copy(os.path.join(PATH_ROOT, 'data', 'data-map-state-abbreviations.csv'), root / 'data')
+    usda_data().to_csv(root / 'data' / 'Irrigation_Data.csv', index=False)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(root) #prep_data reads the data folder of the working directory
+        Irr_DB(str(root / 'data' / 'irrigation.db'))
+    return str(root / 'data' / 'irrigation.db')
+
+
+@pytest.fixture(scope='session')
+def db(path_db) -> Irr_DB:
+    '''
+    The test database, queried without a connection pool or query cache (each query opens its own connection, as Irr_DB does on its own)
+
+    Returns an Irr_DB
+    '''
+    return Irr_DB(path_db)
+
+
+@pytest.fixture(scope='session')
+def app(path_db, tmp_path_factory):
+    '''
+    The app made by create_app in main_dash.py over a copy of the test database (starting it builds indexes), with every folder it writes to in a temporary folder
+    Made once for the session and set up with a first request: the callbacks registered when main_dash is imported are taken by the first app to serve a request
+
+    Returns the Dash app
+    '''
+    import main_dash
+    directory = tmp_path_factory.mktemp('app')
+    shutil.copy(path_db, directory / 'irrigation.db')
+    app = main_dash.create_app({'path_db': str(directory / 'irrigation.db'), 'figure_cache_dir': str(directory / 'figures'), 'jobs_dir': str(directory / 'jobs'),
+                                'snapshot_path': str(directory / 'startup.json'), 'export_dir': str(directory / 'exports'), 'table_dir': str(directory / 'tables'), 'prefetch': False})
+    app.server.test_client().get('/_dash-dependencies')
+    return app
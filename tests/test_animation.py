@@ -0,0 +1,80 @@
+import os
+import time
+import diskcache
+from src.job_manager import FunctionRef, JobManager
+from src.visualization import make_bar_animation, make_map_animation
+from tests.conftest import YEARS
+
+##an animated bar plot of three states over every year they have data for, TX has no value for 2008 (MISSING in conftest.py)
+ANIMATION = {'viz_type': 'Bar Plot', 'animate': True, 'state_id': ['CA', 'NE', 'TX'], 'commodity': 'WATER', 'domain': 'TOTAL',
+             'data_item': 'ACRE FEET APPLIED - ACRE FEET', 'stat_type': 'Sum'}
+
+
+def matrix(db, selection: dict) -> tuple[dict, object]:
+    '''
+    Resolves selection and runs its matrix query
+
+    Returns the params of the resolved selection (a dictionary) and the results of the query (a pandas DataFrame)
+    '''
+    params = db.resolve_selection(selection)['params']
+    return params, db.execute_matrix_query(db.matrix_query(selection['stat_type'], params), params)
+
+
+def test_bar_animation_has_a_frame_for_every_year(db):
+    '''Every year is a frame holding the value of each state for that year (None where a state has no data) and its own title'''
+    params, results = matrix(db, ANIMATION)
+    fig = make_bar_animation(params, results, 'SUM')
+    assert [frame.name for frame in fig.frames] == params['year'] == YEARS
+    assert list(fig.frames[1].data[0].y)[2] == None #TX in 2008
+    assert len(fig.layout.sliders[0].steps) == len(params['year'])
+    for frame in fig.frames:
+        year_results = results[results['year'] == frame.name].set_index('state_id')['value']
+        assert list(frame.data[0].y) == [year_results.get(s) for s in sorted(params['state_id'])]
+        assert frame.name in frame.layout.title.text
+    assert list(fig.data[0].y) == list(fig.frames[0].data[0].y)
+
+
+def test_map_animation_has_a_frame_for_every_year(db):
+    '''An animated map has a frame for every year, each only coloring the states with data for it'''
+    params, results = matrix(db, dict(ANIMATION, viz_type='Map'))
+    fig = make_map_animation(params, results, 'SUM')
+    assert [frame.name for frame in fig.frames] == params['year']
+    assert all(frame.data[0].type == 'choropleth' for frame in fig.frames)
+    assert sorted(fig.frames[-1].data[0].locations) == sorted(results.loc[results['year'] == params['year'][-1], 'state_id'])
+
+
+def setup(path: str) -> None:
+    '''Sets up a job by writing the id of its process to path'''
+    with open(path + '.setup', 'w') as f:
+        f.write(str(os.getpid()))
+
+
+def job(key: str, progress_key: str, args: object, context: dict) -> None:
+    '''A job writing the key of its result, its arguments and the id of its process'''
+    with open(args['path'], 'w') as f:
+        f.write(key + ' ' + str(args['value']) + ' ' + str(os.getpid()))
+
+
+def test_function_ref_calls_the_function_of_its_module():
+    '''A function is called by the name of its module and its own name'''
+    ref = FunctionRef(os.path.join)
+    assert (ref.module, ref.name) == (os.path.join.__module__, 'join')
+    assert ref('a', 'b') == os.path.join('a', 'b')
+
+
+def test_jobs_are_set_up_and_run_in_their_own_process(tmp_path):
+    '''A job is started in a process of its own, which calls setup with setup_args before the job'''
+    path = str(tmp_path / 'job')
+    manager = JobManager(diskcache.Cache(str(tmp_path / 'cache')), setup=setup, setup_args=(path,), preload=['tests.test_animation'])
+    pid = manager.call_job_fn('key', FunctionRef(job), {'path': path, 'value': 1}, {})
+    deadline = time.time() + 30
+    while manager.job_running(pid) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not manager.job_running(pid)
+    manager.terminate_job(pid) #already gone, nothing to stop
+    with open(path) as f:
+        key, value, job_pid = f.read().split()
+    with open(path + '.setup') as f:
+        assert f.read() == job_pid
+    assert (key, value) == ('key', '1')
+    assert int(job_pid) != os.getpid()
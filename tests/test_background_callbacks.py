@@ -0,0 +1,55 @@
+import os
+import time
+import main_dash
+from src.job_manager import FunctionRef
+
+##the outputs of the callbacks run as background jobs, and of those showing their progress while they run
+BACKGROUND = ['graph.figure', 'fig-download.data', 'table-container.children', 'table-download.data']
+PROGRESS = ['graph.figure', 'fig-download.data', 'table-container.children', 'table-download.data']
+
+
+def background_callback(app, output: str) -> dict:
+    '''
+    Finds the callback of the app with output (a string such as 'graph.figure') among its outputs
+
+    Returns the callback as Dash holds it in app.callback_map (a dictionary)
+    '''
+    [callback] = [c for key, c in app.callback_map.items() if key == output or '..' + output + '...' in key]
+    return callback
+
+
+def wait(key: str, progress_key: str, args: object, context: dict) -> None:
+    '''A job that runs until it is stopped'''
+    time.sleep(60)
+
+
+def test_slow_callbacks_are_background_jobs_cancelled_by_a_new_selection(app):
+    '''The graph and the data table are made (and saved) by background jobs showing their progress, which a change of 'selection-store' cancels'''
+    for output in BACKGROUND:
+        assert background_callback(app, output)['long']['cancel'] == [{'id': 'selection-store', 'property': 'data'}]
+    for output in PROGRESS:
+        assert background_callback(app, output)['long']['progress']
+
+
+def test_new_selection_stops_the_running_job(app):
+    '''Changing 'selection-store' calls the callback Dash adds to cancel jobs, which stops the job the browser sends with the request'''
+    job = app._background_manager.call_job_fn('key', FunctionRef(wait), {}, {})
+    assert app._background_manager.job_running(job)
+    body = {'output': 'selection-store.id', 'outputs': {'id': 'selection-store', 'property': 'id'}, 'changedPropIds': ['selection-store.data'],
+            'inputs': [{'id': 'selection-store', 'property': 'data', 'value': {}}], 'state': []}
+    response = app.server.test_client().post('/_dash-update-component?cancelJob=' + str(job), json=body)
+    assert response.status_code in [200, 204]
+    deadline = time.time() + 30
+    while app._background_manager.job_running(job) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not app._background_manager.job_running(job)
+
+
+def test_job_results_are_kept_for_every_user_of_the_job(app):
+    '''A job's result is kept for 5 minutes after it is first fetched (keyed by when the database last changed), so every user who started the same job gets it'''
+    manager = app._background_manager
+    assert manager.expire == 300
+    assert manager.cache_by[0]() == os.path.getmtime(main_dash.data_service.path_db)
+    manager.handle.set('key', 'result')
+    assert manager.get_result('key', None) == 'result'
+    assert manager.get_result('key', None) == 'result' #a second user polling the same job
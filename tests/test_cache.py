@@ -0,0 +1,80 @@
+import threading
+from src.cache import LRUCache
+from src.Irr_DB import Irr_DB
+
+
+def test_least_recently_used_item_is_dropped():
+    '''Once the cache is full, adding an item drops the one used least recently (reading an item counts as using it)'''
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert len(cache) == 2
+
+
+def test_setting_a_key_again_replaces_it():
+    '''Storing under a key already held replaces its value and marks it most recently used, without growing the cache'''
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 10)
+    cache.set('c', 3)
+    assert cache.get('a') == 10
+    assert 'b' not in cache
+    assert len(cache) == 2
+
+
+def test_hits_and_misses_are_counted():
+    '''get counts a hit when the key is held and a miss (returning default) when it isn't'''
+    cache = LRUCache(4)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('b', 'missing') == 'missing'
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_forked_process_gets_a_new_lock():
+    '''A cache copied into another process (its pid differs) uses a new lock rather than one another thread may have been holding'''
+    cache = LRUCache(4)
+    held = cache.lock
+    held.acquire()
+    try:
+        cache.pid = -1 #as if the cache was copied by a fork while the lock was held
+        assert cache.lock is not held
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+    finally:
+        held.release()
+
+
+def test_concurrent_access_keeps_the_bound():
+    '''Several threads setting and getting at once never leave more than maxsize items'''
+    cache = LRUCache(8)
+
+    def use(offset: int) -> None:
+        for i in range(500):
+            cache.set(offset + i, i)
+            cache.get(offset + i // 2)
+
+    threads = [threading.Thread(target=use, args=(1000 * n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 8
+
+
+def test_query_results_are_cached_as_copies(path_db):
+    '''With a query cache set, the same query is answered from the cache, and changing the returned results doesn't change what is cached'''
+    db = Irr_DB(path_db)
+    db.query_cache = LRUCache(4)
+    states = db.run_query("SELECT DISTINCT state_id FROM tMain ORDER BY state_id;", None)
+    states.loc[0, 'state_id'] = 'XX'
+    again = db.run_query("SELECT DISTINCT state_id FROM tMain ORDER BY state_id;", None)
+    assert again.loc[0, 'state_id'] != 'XX'
+    assert (db.query_cache.hits, db.query_cache.misses) == (1, 1)
@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from tests.conftest import PATH_ROOT, YEARS
+
+##loads every script in the assets folder (as the browser does) into window, then calls one of the functions in window.dash_clientside and prints what it returns as json
+RUNNER = '''
+global.window = {};
+const fs = require('fs');
+const [assets, namespace, name, args] = process.argv.slice(1);
+for (const file of fs.readdirSync(assets).sort().filter(f => f.endsWith('.js'))) {
+    eval(fs.readFileSync(assets + '/' + file, 'utf8'));
+}
+process.stdout.write(JSON.stringify(window.dash_clientside[namespace][name](...JSON.parse(args))));
+'''
+
+##six states, one more than can be chosen outside large selection mode
+STATE_OPTIONS = [{'label': s, 'value': s} for s in ['AR', 'CA', 'CO', 'NE', 'TX', 'WY']]
+
+
+def clientside(name: str, *args, namespace: str = 'selection') -> object:
+    '''
+    Runs the clientside callback name (a string) of namespace in node with args, as the browser would
+
+    Returns what it returned
+    '''
+    node = shutil.which('node')
+    if node == None:
+        pytest.skip('node is needed to run the clientside callbacks')
+    result = subprocess.run([node, '-e', RUNNER, os.path.join(PATH_ROOT, 'assets'), namespace, name, json.dumps(args)], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def test_sections_are_displayed_with_their_options(db):
+    '''A section is displayed with the options of the resolved selection once it has any, dropdowns starting with an empty option, and hidden until then'''
+    resolved = db.resolve_selection({'state_id': ['CO'], 'commodity': 'WATER'})
+    options, style, label_style = clientside('update_doms', resolved)
+    assert options == [''] + resolved['options']['domain'] and sorted(options) == ['', 'TOTAL', 'WATER SOURCE']
+    assert style == label_style == {'display': 'block'}
+    assert clientside('update_dts', resolved) == [[''], {'display': 'none'}, {'display': 'none'}]
+    assert clientside('ask_stat', resolved) == [[], {'display': 'none'}, {'display': 'none'}]
+
+
+def test_checklists_disable_items_past_the_limit(db):
+    '''Once as many items as allowed are chosen, the others are disabled, the chosen ones stay enabled so they can be unchecked'''
+    options, style, _ = clientside('update_multi_options', ['AR', 'CA', 'CO', 'NE'], 'Line Graph', False, STATE_OPTIONS)
+    assert style == {'display': 'inherit'}
+    assert all('disabled' not in option for option in options)
+    options, _, _ = clientside('update_multi_options', ['AR', 'CA', 'CO', 'NE', 'TX'], 'Line Graph', False, STATE_OPTIONS)
+    assert [option['value'] for option in options if option['disabled']] == ['WY']
+    resolved = db.resolve_selection({'state_id': ['CA'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES', 'mult_dt_q': 'One Data Item', 'year': YEARS[:1]})
+    options, _, _ = clientside('update_years', resolved)
+    assert [option['value'] for option in options] == YEARS
+    assert all('disabled' not in option for option in options)
+
+
+def test_state_section_waits_for_a_visualization_type():
+    '''The state section is hidden until a visualization type is chosen'''
+    assert clientside('update_multi_options', [], None, False, STATE_OPTIONS)[1] == {'display': 'none'}
+
+
+def test_buttons_are_displayed_once_the_selection_is_complete(db):
+    '''The buttons generating and saving the graph and data table are only displayed for a complete selection'''
+    selection = {'viz_type': 'Bar Plot', 'state_id': ['CA', 'NE'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES',
+                 'mult_dt_q': 'One Data Item', 'year': ['2013']}
+    assert clientside('display_g_or_dt_buttons', db.resolve_selection(selection)) == {'display': 'none'}
+    assert clientside('display_g_or_dt_buttons', db.resolve_selection(dict(selection, stat_type='Sum'))) == {'display': 'inherit'}
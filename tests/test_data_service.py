@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import pytest
+from src import data_service
+from src.data_service import DataService
+from tests.conftest import STATES
+
+
+@pytest.fixture
+def service(path_db, tmp_path):
+    '''
+    A started data service over a copy of the test database (starting it builds indexes, which the database the other tests share shouldn't get)
+
+    Returns the DataService, stopped once the test ends
+    '''
+    copy = str(tmp_path / 'irrigation.db')
+    shutil.copy(path_db, copy)
+    service = DataService(path_db=copy)
+    service.start()
+    yield service
+    service.stop()
+
+
+def test_snapshot_holds_the_initial_layout(service, tmp_path):
+    '''The snapshot holds the states and the selection resolved before any choice, the same as querying the database'''
+    snapshot = service.startup_snapshot(str(tmp_path / 'snapshot.json'))
+    assert snapshot['states'] == service.db.get_states()
+    assert sorted(snapshot['states']) == sorted(STATES)
+    assert snapshot['initial_selection'] == json.loads(json.dumps(service.db.resolve_selection({})))
+
+
+def test_snapshot_is_read_while_the_database_is_unchanged(service, tmp_path, monkeypatch):
+    '''A later start reads the saved snapshot rather than querying the database again'''
+    path = str(tmp_path / 'snapshot.json')
+    service.startup_snapshot(path)
+    monkeypatch.setattr(service.db, 'get_states', lambda: pytest.fail('queried again'))
+    assert sorted(service.startup_snapshot(path)['states']) == sorted(STATES)
+
+
+def test_snapshot_is_made_again_when_the_database_or_version_changes(service, tmp_path, monkeypatch):
+    '''A snapshot of an older database, or of an older version of the snapshot, isn't used'''
+    path = str(tmp_path / 'snapshot.json')
+    service.startup_snapshot(path)
+    stat = os.stat(service.path_db)
+    os.utime(service.path_db, (stat.st_atime, stat.st_mtime + 10))
+    assert service.startup_snapshot(path)['key']['db_mtime'] == stat.st_mtime + 10
+    monkeypatch.setattr(data_service, 'SNAPSHOT_VERSION', data_service.SNAPSHOT_VERSION + 1)
+    assert service.startup_snapshot(path)['key']['version'] == data_service.SNAPSHOT_VERSION
+
+
+def test_unreadable_snapshot_is_replaced(service, tmp_path):
+    '''A snapshot that can't be read (such as one cut short) is made again'''
+    path = tmp_path / 'snapshot.json'
+    path.write_text('{"key": ')
+    assert service.startup_snapshot(str(path))['states'] == service.db.get_states()
+    assert json.loads(path.read_text())['states'] == service.db.get_states()
@@ -0,0 +1,52 @@
+import pandas as pd
+from src.data_table import get_statistics
+from tests.conftest import ROWS
+
+##the keyed results of a line graph with a line for each state
+PARAMS = {'state_id': ['CA', 'NE'], 'commodity': ['WATER'], 'domain': ['TOTAL'], 'data_item': ['ACRES IRRIGATED - ACRES'], 'year': ['2013', '2018']}
+RESULTS = pd.DataFrame({'state_id': ['CA', 'CA', 'NE', 'NE'], 'year': ['2013', '2018', '2013', '2018'], 'value': [1., 2., 3., 4.]})
+
+
+def test_table_is_built_in_memory(tmp_path):
+    '''The data table is returned without writing anything, a .csv file is only written when a path is given'''
+    df = get_statistics(results=RESULTS, params=PARAMS, yr_or_states=None, s_multiple_or_one='multiple', line_graph=True)
+    assert list(df.columns) == ['STATE', '2013', '2018']
+    assert list(tmp_path.iterdir()) == []
+    path = tmp_path / 'table.csv'
+    get_statistics(results=RESULTS, params=PARAMS, yr_or_states=None, s_multiple_or_one='multiple', line_graph=True, path=str(path))
+    assert path.read_text() == df.to_csv(index=False)
+
+
+def test_missing_values_stay_in_their_year():
+    '''A line without a value for a year has NaN in that year rather than its later values shifting over, and lines are in alphabetical order'''
+    results = RESULTS[RESULTS['year'] != '2013'].iloc[::-1] #no values for 2013, in reverse order
+    df = get_statistics(results=results, params=PARAMS, yr_or_states=None, s_multiple_or_one='multiple', line_graph=True)
+    assert df['STATE'].tolist() == ['CA', 'NE']
+    assert df['2013'].isna().all()
+    assert df['2018'].tolist() == [2., 4.]
+
+
+def test_one_line_is_named_after_its_data_item():
+    '''A line graph of one line (results only grouped by year) has one row named after the data item'''
+    results = pd.DataFrame({'year': ['2013', '2018'], 'value': [5., 6.]})
+    df = get_statistics(results=results, params=dict(PARAMS, state_id=['CA']), yr_or_states=None, s_multiple_or_one='one', line_graph=True)
+    assert df.values.tolist() == [['ACRES IRRIGATED - ACRES', 5., 6.]]
+
+
+def test_bars_without_data_are_empty():
+    '''Each bar is a row in alphabetical order, a bar without data has NaN as its value'''
+    results = pd.DataFrame({'state_id': ['NE'], 'value': [3.]})
+    df = get_statistics(results=results, params=dict(PARAMS, year=['2013']), yr_or_states='state_id', s_multiple_or_one=None)
+    assert df.columns.tolist() == ['STATE', 'VALUE']
+    assert df['STATE'].tolist() == ['CA', 'NE']
+    assert df['VALUE'].isna().tolist() == [True, False]
+
+
+def test_table_matches_the_graph(db):
+    '''The table pivoted from the keyed results holds the same values as the lines of the graph, in the same order, which are the values in the test database'''
+    params = dict(PARAMS, state_id=['CA', 'CO', 'NE'], year=['2013', '2018', '2023'])
+    query = db.final_query(operation='Sum', params=params, s_multiple_or_one='Multiple Lines', yr_or_states=None, line_graph=True)
+    df = get_statistics(results=db.execute_keyed_query(query, params), params=params, yr_or_states=None, s_multiple_or_one='multiple', line_graph=True)
+    assert df[params['year']].values.tolist() == db.execute_final_query(query, params, line_graph=True)
+    rows = ROWS[ROWS['data_item'].isin(params['data_item']) & ROWS['state_id'].isin(params['state_id']) & ROWS['year'].isin(params['year'])]
+    assert df[params['year']].values.tolist() == rows.pivot(index='state_id', columns='year', values='value').values.tolist()
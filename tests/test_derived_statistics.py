@@ -0,0 +1,93 @@
+import math
+import pandas as pd
+import pytest
+from src.visualization import get_full_title, value_units
+from tests.conftest import ROWS
+
+##a line graph of one data item in three states, one line per state
+SELECTION = {'viz_type': 'Line Graph', 'state_id': ['CA', 'CO', 'NE'], 'commodity': 'ENERGY', 'domain': 'TOTAL', 'data_item': 'EXPENSE, MEASURED IN $',
+             'mult_dt_q': 'One Data Item', 'year': ['2013', '2018', '2023'], 'line_n': 'Multiple Lines'}
+
+
+def lines(db, stat_type: str, **choices) -> tuple[dict, list[list[float]]]:
+    '''
+    Resolves SELECTION with the statistic stat_type (a string) and any other choices, and runs its final query
+
+    Returns the params of the resolved selection (a dictionary) and the value of each state in each year (a list of lists of floats, NaN or None where there is no value)
+    '''
+    resolved = db.resolve_selection(dict(SELECTION, stat_type=stat_type, **choices))
+    assert resolved['complete']
+    params = resolved['params']
+    query = db.final_query(stat_type, params, resolved['s_multiple_or_one'], resolved['yr_or_states'], line_graph=True)
+    return params, db.execute_final_query(query, params, line_graph=True)
+
+
+def totals(data_item: str) -> list[list[float]]:
+    '''
+    Finds the values of data_item (a string) with domain TOTAL in the test database, for the states and years of SELECTION
+
+    Returns the value of each state in each year (a list of lists of floats)
+    '''
+    rows = ROWS[(ROWS['data_item'] == data_item) & (ROWS['domain'] == 'TOTAL') & ROWS['state_id'].isin(SELECTION['state_id']) & ROWS['year'].isin(SELECTION['year'])]
+    return rows.pivot(index='state_id', columns='year', values='value').values.tolist()
+
+
+def test_percent_change_is_from_the_previous_year(db):
+    '''Percent Change is the percent change of each state's sum from its previous year, with no value for the first year'''
+    _, sums = lines(db, 'Sum')
+    _, changes = lines(db, 'Percent Change')
+    assert sums == totals(SELECTION['data_item'])
+    for total, change in zip(sums, changes):
+        assert pd.isna(change[0])
+        assert change[1:] == [pytest.approx(100 * (b - a) / a) for a, b in zip(total, total[1:])]
+
+
+def test_annual_growth_rate_is_since_the_first_year(db):
+    '''Annual Growth Rate is the compound annual growth rate of each state's sum since the first year'''
+    params, sums = lines(db, 'Sum')
+    _, rates = lines(db, 'Annual Growth Rate')
+    first = int(params['year'][0])
+    for total, rate in zip(sums, rates):
+        assert pd.isna(rate[0])
+        assert rate[1:] == [pytest.approx(100 * (math.pow(v / total[0], 1 / (int(y) - first)) - 1)) for v, y in zip(total[1:], params['year'][1:])]
+
+
+def test_ratio_divides_by_the_ratio_item_of_its_commodity(db):
+    '''Ratio divides each state's sum by the sum of the chosen data item of the chosen commodity in the same state and year'''
+    params, ratios = lines(db, 'Ratio', ratio_item='WATER: ACRES IRRIGATED - ACRES')
+    assert (params['ratio_commodity'], params['ratio_item']) == (['WATER'], ['ACRES IRRIGATED - ACRES'])
+    sums, acres = totals(SELECTION['data_item']), totals('ACRES IRRIGATED - ACRES')
+    assert ratios == [[pytest.approx(s / a) for s, a in zip(total, divisor)] for total, divisor in zip(sums, acres)]
+
+
+def test_ratio_of_another_commodity_has_no_value(db):
+    '''The data item a ratio divides by is only summed over its own commodity'''
+    params = db.resolve_selection(dict(SELECTION, stat_type='Ratio', ratio_item='WATER: ACRES IRRIGATED - ACRES'))['params']
+    params['ratio_commodity'] = ['WELLS']
+    query = db.final_query('Ratio', params, 'Multiple Lines', None, line_graph=True)
+    assert all(pd.isna(v) for line in db.execute_final_query(query, params, line_graph=True) for v in line)
+
+
+def test_ratio_items_are_named_with_their_commodity(db):
+    '''The data items a ratio can divide by are every data item with domain TOTAL named with its commodity, but the data item itself'''
+    options = db.resolve_selection(dict(SELECTION, stat_type='Ratio'))['options']
+    assert 'WATER: ACRES IRRIGATED - ACRES' in options['ratio_item']
+    assert 'ENERGY: EXPENSE, MEASURED IN $' not in options['ratio_item']
+    assert not db.resolve_selection(dict(SELECTION, stat_type='Ratio', ratio_item='ACRES IRRIGATED - ACRES'))['complete']
+
+
+def test_year_statistics_need_more_than_one_year(db):
+    '''Percent Change and Annual Growth Rate are only offered when the results are grouped over more than one year'''
+    assert 'Percent Change' in db.resolve_selection(SELECTION)['options']['stat_type']
+    one_year = db.resolve_selection(dict(SELECTION, year=['2018'], stat_type='Percent Change'))
+    assert 'Percent Change' not in one_year['options']['stat_type']
+    assert not one_year['complete']
+
+
+def test_derived_statistics_are_titled_by_what_was_computed(db):
+    '''Titles and units name the statistic, and a ratio names the data item it divides by'''
+    params = db.resolve_selection(dict(SELECTION, stat_type='Ratio', ratio_item='WATER: ACRES IRRIGATED - ACRES'))['params']
+    operation = db.which_statistic('Ratio')
+    assert get_full_title(operation, params, value_units(params, operation)).startswith('RATIO OF SUM OF TOTAL EXPENSE, MEASURED IN $ TO SUM OF ACRES IRRIGATED - ACRES')
+    assert value_units(params, operation) == 'EXPENSE, MEASURED IN $ PER ACRES'
+    assert value_units(params, db.which_statistic('Percent Change')) == 'PERCENT'
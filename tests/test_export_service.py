@@ -0,0 +1,101 @@
+import gzip
+import os
+import time
+import pandas as pd
+import pytest
+from flask import Flask
+from src.export_service import ExportService, compress
+
+##a small figure, as a figure dictionary
+FIGURE = {'data': [{'type': 'bar', 'x': ['CA', 'NE'], 'y': [1, 2]}], 'layout': {'title': {'text': 'SUM OF TOTAL ACRES IRRIGATED - ACRES'}}}
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    '''
+    An export service with one rendering process, exporting to a temporary folder
+
+    Returns the ExportService, stopped once the tests of the module end
+    '''
+    pytest.importorskip('kaleido')
+    directory = tmp_path_factory.mktemp('export')
+    service = ExportService(export_dir=str(directory / 'figures'), processes=1, table_dir=str(directory / 'tables'))
+    yield service
+    service.stop()
+
+
+def test_unknown_format_is_rejected():
+    '''Formats other than EXPORT_FORMATS raise a ValueError before anything is rendered'''
+    with pytest.raises(ValueError):
+        ExportService(processes=1).export({'data': []}, 'gif')
+
+
+def test_file_is_named_by_its_content():
+    '''The same figure (whatever the order of its keys) gets the same file name, a different figure or format a different one'''
+    service = ExportService(processes=1)
+    reordered = {'layout': FIGURE['layout'], 'data': FIGURE['data']}
+    assert service.file_name(service.serialize(FIGURE), 'png') == service.file_name(service.serialize(reordered), 'png')
+    assert service.file_name(service.serialize(FIGURE), 'png') != service.file_name(service.serialize(FIGURE), 'svg')
+    assert service.file_name(service.serialize(FIGURE), 'png') != service.file_name(service.serialize(dict(FIGURE, layout={})), 'png')
+
+
+def test_figures_are_rendered_once(service, monkeypatch):
+    '''An exported figure is rendered in the pool, exporting it again finds the file rather than rendering it'''
+    path = service.export(FIGURE, 'svg')
+    with open(path, 'rb') as f:
+        assert b'<svg' in f.read()
+    monkeypatch.setattr(service.pool, 'submit', lambda *args: pytest.fail('rendered again'))
+    assert service.export_many([FIGURE, FIGURE], 'svg') == [path, path]
+
+
+def test_download_is_made_in_memory(service):
+    '''A downloaded figure is sent as bytes without writing to the export folder, unless archive mode is on'''
+    file_name, data = service.download(dict(FIGURE, layout={'title': {'text': 'DOWNLOAD'}}), 'svg')
+    assert file_name.startswith('figure_') and file_name.endswith('.svg')
+    assert b'<svg' in data
+    assert not os.path.exists(os.path.join(service.export_dir, file_name))
+
+
+def test_archived_table_download_is_also_saved(tmp_path):
+    '''In archive mode, a downloaded data table is also saved to the table folder under the name it was sent with'''
+    service = ExportService(processes=1, archive=True, table_dir=str(tmp_path))
+    file_name, data = service.download_table(pd.DataFrame({'STATE': ['CA'], 'VALUE': [1.5]}), 'csv')
+    assert (tmp_path / file_name).read_bytes() == data
+
+
+def test_compressed_download_is_gzip():
+    '''Compressed downloads add .gz to the name and decompress to the same file'''
+    file_name, data = compress('figure.svg', b'<svg></svg>')
+    assert file_name == 'figure.svg.gz'
+    assert gzip.decompress(data) == b'<svg></svg>'
+
+
+def test_background_job_renders_in_the_serving_pool(tmp_path, monkeypatch):
+    '''A figure saved by a background job is queued through jobs_dir and rendered in the pool of the process serving the app, the job starts no renderer of its own'''
+    pytest.importorskip('kaleido')
+    serving = ExportService(processes=1, jobs_dir=str(tmp_path))
+    server = Flask(__name__)
+    serving.serve(server)
+    server.test_client().get('/') #the first request starts taking renders off the queue
+    try:
+        job = ExportService(processes=1, jobs_dir=str(tmp_path))
+        monkeypatch.setattr(job, 'start', lambda: pytest.fail('the job started its own renderer'))
+        deadline = time.time() + 10
+        while job.jobs.get('serving') == None and time.time() < deadline:
+            time.sleep(0.05)
+        file_name, data = job.download(FIGURE, 'svg')
+        assert b'<svg' in data
+        assert file_name == serving.download(FIGURE, 'svg')[0]
+    finally:
+        serving.stop()
+
+
+def test_background_job_renders_itself_without_a_serving_process(tmp_path):
+    '''Without a process serving the app to take it, a background job renders the figure in a pool of its own'''
+    pytest.importorskip('kaleido')
+    job = ExportService(processes=1, jobs_dir=str(tmp_path))
+    try:
+        assert b'<svg' in job.download(FIGURE, 'svg')[1]
+        assert job.pool != None
+    finally:
+        job.stop()
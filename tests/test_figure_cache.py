@@ -0,0 +1,74 @@
+import pytest
+from src.figure_cache import BaseFigureCache, FigureCache, DiskFigureCache, selection_key
+
+##a complete line graph selection, its states and years chosen in an order the normalized params don't keep
+SELECTION = {'viz_type': 'Line Graph', 'state_id': ['NE', 'CA'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES',
+             'mult_dt_q': 'One Data Item', 'year': ['2018', '2013'], 'stat_type': 'Sum', 'line_n': 'Multiple Lines'}
+
+
+def resolve(db, selection: dict) -> dict:
+    '''
+    Resolves selection the way the selection-store callback in main_dash.py does, keeping the selection it was resolved from
+
+    Returns the resolved selection as a dictionary
+    '''
+    resolved = db.resolve_selection(selection)
+    resolved['selection'] = selection
+    return resolved
+
+
+def test_same_selection_in_any_order_has_one_key(db):
+    '''States and years chosen in a different order give the same key'''
+    reordered = dict(SELECTION, state_id=['CA', 'NE'], year=['2013', '2018'])
+    assert resolve(db, SELECTION)['complete']
+    assert selection_key(resolve(db, SELECTION)) == selection_key(resolve(db, reordered))
+
+
+@pytest.mark.parametrize('change', [{'stat_type': 'Average'}, {'line_n': 'One Line'}, {'year': ['2013', '2018', '2023']}])
+def test_what_the_figure_depends_on_changes_the_key(db, change):
+    '''The statistic, the line graph question and the years are each part of the key'''
+    assert selection_key(resolve(db, SELECTION)) != selection_key(resolve(db, dict(SELECTION, **change)))
+
+
+def test_large_mode_changes_the_key(db):
+    '''Large selection mode is part of the key, so figures drawn for it aren't mixed up with the others'''
+    resolved = resolve(db, SELECTION)
+    assert selection_key(resolved) != selection_key(dict(resolved, large=True))
+
+
+def test_map_year_changes_the_key(db):
+    '''The year a map shows is part of the key, so the map of each year is cached on its own'''
+    resolved = resolve(db, SELECTION)
+    assert selection_key(dict(resolved, map_year='2013')) != selection_key(dict(resolved, map_year='2018'))
+
+
+@pytest.mark.parametrize('disk', [False, True])
+def test_figure_is_built_once(disk, tmp_path):
+    '''get_or_build (shared by both caches through BaseFigureCache) only calls build when nothing is stored under the key'''
+    cache = DiskFigureCache(str(tmp_path)) if disk else FigureCache(2)
+    calls = []
+
+    def build() -> str:
+        calls.append(1)
+        return '{"data": []}'
+
+    try:
+        assert cache.get_or_build('key', build) == '{"data": []}'
+        assert cache.get_or_build('key', build) == '{"data": []}'
+        assert len(calls) == 1
+        assert isinstance(cache, BaseFigureCache)
+    finally:
+        cache.close()
+
+
+def test_disk_cache_is_shared_between_processes(tmp_path):
+    '''A figure stored by one process (its own DiskFigureCache on the same folder) is read by another without being built again'''
+    first = DiskFigureCache(str(tmp_path))
+    second = DiskFigureCache(str(tmp_path))
+    try:
+        first.get_or_build('key', lambda: '{"data": []}')
+        assert second.get_or_build('key', lambda: pytest.fail('built again')) == '{"data": []}'
+        assert second.hits == 1
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,51 @@
+import base64
+import json
+import numpy as np
+import plotly.graph_objects as go
+from src.figure_encoding import TYPED_ARRAY_MIN_LENGTH, figure_json, numeric_array, typed_array
+
+
+def decode(array: dict) -> np.ndarray:
+    '''
+    Reads a typed array (a dictionary of its dtype and its bytes in base64) the way plotly.js does
+
+    Returns the values as a numpy array
+    '''
+    return np.frombuffer(base64.b64decode(array['bdata']), dtype='<' + array['dtype'])
+
+
+def test_database_values_are_sent_as_float32():
+    '''Values with at most 7 significant digits (the database's, with the rounding error of summing them) are sent as float32 and read back as the same numbers'''
+    values = [217638.80000000002, 1.5, 3, None, 0.1, 42.25, 1e6, 7.0]
+    array = typed_array(values)
+    assert array['dtype'] == 'f4'
+    decoded = decode(array)
+    assert [float(str(v)) for v in decoded[[0, 1, 2, 4, 5, 6, 7]]] == [217638.8, 1.5, 3.0, 0.1, 42.25, 1e6, 7.0]
+    assert np.isnan(decoded[3])
+
+
+def test_precise_values_stay_float64():
+    '''Values a float32 can't write the same way (such as ratios and growth rates) are sent as float64'''
+    values = [1 / 3, 2 / 3, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    array = typed_array(values)
+    assert array['dtype'] == 'f8'
+    assert decode(array).tolist() == values
+
+
+def test_labels_and_short_arrays_are_left_as_they_are():
+    '''Labels, booleans and arrays shorter than TYPED_ARRAY_MIN_LENGTH aren't encoded'''
+    labels = ['2013', '2018'] * TYPED_ARRAY_MIN_LENGTH
+    assert typed_array(labels) is labels
+    assert numeric_array([True, False] * TYPED_ARRAY_MIN_LENGTH) is None
+    assert typed_array([1.0, 2.0]) == [1.0, 2.0]
+
+
+def test_figure_traces_and_frames_are_encoded():
+    '''Only with typed_arrays on are the values of every trace and of every frame of an animation sent as typed arrays, the labels stay lists'''
+    x = [str(year) for year in range(2000, 2010)]
+    fig = go.Figure(go.Scatter(x=x, y=list(range(10))), frames=[go.Frame(name='2013', data=[go.Scatter(y=list(range(10, 20)))])])
+    encoded = json.loads(figure_json(fig, typed_arrays=True))
+    assert encoded['data'][0]['x'] == x
+    assert decode(encoded['data'][0]['y']).tolist() == list(range(10))
+    assert decode(encoded['frames'][0]['data'][0]['y']).tolist() == list(range(10, 20))
+    assert json.loads(figure_json(fig))['data'][0]['y'] == list(range(10))
@@ -0,0 +1,66 @@
+from dash import Patch
+from src.figure_patch import MAX_PATCH_RATIO, diff_dict, figure_patch
+
+
+def operations(patch: Patch) -> list[tuple]:
+    '''
+    Lists what patch (a dash Patch) does to the figure, as Dash sends it to the browser
+
+    Returns a list of tuples of the operation, its location in the figure and its value
+    '''
+    return [(o['operation'], tuple(o['location']), o['params'].get('value')) for o in patch.to_plotly_json()['operations']]
+
+
+def figure(y: list, title: str = 'SUM OF TOTAL ACRES', traces: int = 1, kind: str = 'scatter') -> dict:
+    '''
+    Makes a figure dictionary of traces (an int) traces of the kind kind (a string), each with the values y (a list), under the title title (a string)
+
+    Returns the figure as a dictionary
+    '''
+    return {'data': [{'type': kind, 'x': ['2013', '2018'], 'y': y, 'name': str(i)} for i in range(traces)],
+            'layout': {'title': {'text': title, 'y': 0.9}, 'template': {'data': {'scatter': [{'line': {'width': 2}}]}, 'layout': {'font': {'size': 12}}}}}
+
+
+def test_only_changed_keys_are_sent():
+    '''diff_dict sets the keys whose values changed, removes the keys new doesn't have, and leaves the rest out of the patch'''
+    patch = Patch()
+    size = diff_dict(patch, {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': 4}, {'a': 1, 'b': {'c': 5, 'd': 3}}, 2)
+    assert sorted(operations(patch)) == [('Assign', ('b', 'c'), 5), ('Delete', ('e',), None)]
+    assert size == 1
+
+
+def test_depth_limits_how_deep_dictionaries_are_compared():
+    '''Past depth levels, a changed dictionary is sent whole'''
+    patch = Patch()
+    diff_dict(patch, {'b': {'c': 2, 'd': 3}}, {'b': {'c': 5, 'd': 3}}, 1)
+    assert operations(patch) == [('Assign', ('b',), {'c': 5, 'd': 3})]
+
+
+def test_new_values_and_title_are_patched():
+    '''Changing the statistic only sends the new values and title text, not the template of the layout'''
+    patch = figure_patch(figure([1, 2], traces=4), figure([3, 4], 'AVG OF TOTAL ACRES', traces=4), 10**6)
+    assert sorted(operations(patch)) == [('Assign', ('data', i, 'y'), [3, 4]) for i in range(4)] + [('Assign', ('layout', 'title', 'text'), 'AVG OF TOTAL ACRES')]
+
+
+def test_traces_are_added_and_removed():
+    '''Traces past the end of the old figure are added, and traces the new figure doesn't have are removed from the end'''
+    added = operations(figure_patch(figure([1, 2], traces=1), figure([1, 2], traces=3), 10**6))
+    assert added == [('Extend', ('data',), figure([1, 2], traces=3)['data'][1:])]
+    removed = operations(figure_patch(figure([1, 2], traces=3), figure([1, 2], traces=1), 10**6))
+    assert removed == [('Delete', ('data', 2), None), ('Delete', ('data', 1), None)]
+
+
+def test_full_figure_is_sent_when_a_patch_doesnt_help():
+    '''The full figure is sent when the old figure isn't known, a trace changed its type, or the patch is more than MAX_PATCH_RATIO of the figure'''
+    new = figure([3, 4])
+    assert figure_patch(None, new, 10**6) == None
+    assert figure_patch(figure([1, 2], kind='bar'), new, 10**6) == None
+    assert figure_patch(figure([1, 2]), new, 10) == None #the patch is bigger than MAX_PATCH_RATIO of a 10 character figure
+    assert figure_patch(figure([1, 2]), new, int(len('[3, 4]') / MAX_PATCH_RATIO)) != None
+
+
+def test_frames_are_replaced_whole():
+    '''The frames of an animation are replaced as a whole once any of them changed'''
+    old = dict(figure([1, 2]), frames=[{'name': '2013', 'data': [{'y': [1]}]}])
+    new = dict(figure([1, 2]), frames=[{'name': '2013', 'data': [{'y': [2]}]}])
+    assert operations(figure_patch(old, new, 10**6)) == [('Assign', ('frames',), new['frames'])]
@@ -0,0 +1,55 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from werkzeug.serving import make_server
+from tests.conftest import PATH_ROOT
+
+PATH_LOADTEST = os.path.join(PATH_ROOT, 'benchmarks', 'loadtest.py')
+
+
+def load_loadtest() -> object:
+    '''
+    Imports benchmarks/loadtest.py (a script, not part of a package)
+
+    Returns the module
+    '''
+    spec = importlib.util.spec_from_file_location('loadtest', PATH_LOADTEST)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def url(app) -> str:
+    '''
+    Serves the app on a free local port from a thread, rather than starting it with gunicorn (so it runs on the test database)
+
+    Returns the url of the app, served until the tests of the module end
+    '''
+    server = make_server('127.0.0.1', 0, app.server, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:' + str(server.port)
+    server.shutdown()
+
+
+def test_users_replay_sessions_without_errors(url):
+    '''Every simulated user replays its sessions through the selection store and, once complete, the graph and data table jobs, without errors'''
+    results = load_loadtest().run(url, users=2, sessions=2, poll=0.05, think=0, seed=0, job_timeout=60)
+    assert results['sessions'] == 4
+    assert results['complete sessions'] > 0
+    assert all(r['errors'] == 0 for r in results['callbacks'].values())
+    assert results['callbacks']['selection-store.data (viz-r)']['calls'] == 4
+    assert results['callbacks']['graph.figure,graph.style,graph-key.data,map-year-div.style (graph-button)']['calls'] == results['complete sessions']
+
+
+def test_slow_callbacks_fail_the_script(url):
+    '''Run as a script against a running tool, the results are printed and --max-p95 fails the run when a callback is slower'''
+    result = subprocess.run([sys.executable, PATH_LOADTEST, '--url', url, '--users', '1', '--sessions', '1', '--max-p95', '0'],
+                            capture_output=True, text=True, timeout=300)
+    assert '1 users, 1 sessions' in result.stdout
+    assert 'p95 latency more than 0.0 ms' in result.stdout
+    assert result.returncode == 1
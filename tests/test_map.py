@@ -0,0 +1,44 @@
+import pytest
+from src.visualization import make_map
+from tests.conftest import STATES, YEARS
+
+##a map of one data item with domain TOTAL, states aren't chosen for a map
+MAP = {'viz_type': 'Map', 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES', 'stat_type': 'Sum'}
+
+
+@pytest.fixture(scope='module')
+def resolved(db) -> dict:
+    '''
+    The resolved selection of MAP
+
+    Returns a dictionary
+    '''
+    return db.resolve_selection(MAP)
+
+
+def test_map_covers_every_state_and_year(db, resolved):
+    '''A map is complete without choosing states or years, its params hold every state and every year with data for the data item'''
+    assert resolved['complete']
+    assert sorted(resolved['params']['state_id']) == sorted(STATES)
+    assert resolved['params']['year'] == YEARS
+
+
+def test_matrix_query_matches_the_final_query(db, resolved):
+    '''The value of each state and year in the one query of the map is the same as a bar plot of that state and year'''
+    params = resolved['params']
+    results = db.execute_matrix_query(db.matrix_query('Sum', params), params)
+    row = results.iloc[0]
+    one = dict(params, state_id=[row['state_id']], year=[row['year']])
+    assert db.execute_final_query(db.final_query('Sum', one, None, None), one) == [pytest.approx(row['value'])]
+    assert set(results['state_id']) == set(params['state_id'])
+
+
+def test_map_shows_one_year_on_the_scale_of_every_year(db, resolved):
+    '''The map colors the states with data for the year shown, on a color scale spanning every year, titled with that year'''
+    params = resolved['params']
+    results = db.execute_matrix_query(db.matrix_query('Sum', params), params)
+    year = params['year'][-1]
+    fig = make_map(params, results, 'SUM', year)
+    assert sorted(fig.data[0].locations) == sorted(results.loc[results['year'] == year, 'state_id'])
+    assert (fig.data[0].zmin, fig.data[0].zmax) == (results['value'].min(), results['value'].max())
+    assert year in fig.layout.title.text
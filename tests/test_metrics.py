@@ -0,0 +1,74 @@
+import os
+import pytest
+from dash.exceptions import PreventUpdate
+from flask import Flask
+from src.metrics import CallbackMetrics, callback_name, outputs_name
+
+
+def display_graph(n_clicks: int) -> str:
+    '''A callback returning a serialized figure'''
+    return '{"data": []}'
+
+
+def skipped(n_clicks: int) -> None:
+    '''A callback that doesn't update its output'''
+    raise PreventUpdate
+
+
+def test_callbacks_are_named_by_their_outputs():
+    '''Callbacks are named after their outputs, without the hashes Dash adds to outputs that allow duplicates'''
+    assert callback_name('..graph.figure...graph.style@1a2b..') == 'graph.figure,graph.style'
+    assert outputs_name({'id': 'graph', 'property': 'figure@1a2b'}) == 'graph.figure'
+    assert outputs_name([{'id': 'graph', 'property': 'figure'}, [{'id': {'index': 1}, 'property': 'value'}]]) == "graph.figure,{'index': 1}.value"
+
+
+def test_calls_are_counted_and_timed():
+    '''Each call is counted in the histogram bucket of how long it took, with the bytes of its arguments and of what it returned'''
+    metrics = CallbackMetrics()
+    assert metrics.call(display_graph, 1) == '{"data": []}'
+    metrics.record('display_graph', 'graph-button', 30.0, 0, 0) #slower than every bucket
+    text = metrics.render()
+    assert 'dvat_callback_calls_total{callback="display_graph",trigger=""} 1' in text
+    assert 'dvat_callback_latency_seconds_bucket{callback="display_graph",trigger="",le="0.005"} 1' in text
+    assert 'dvat_callback_latency_seconds_bucket{callback="display_graph",trigger="graph-button",le="10"} 0' in text
+    assert 'dvat_callback_latency_seconds_bucket{callback="display_graph",trigger="graph-button",le="+Inf"} 1' in text
+    assert 'dvat_callback_request_bytes_total{callback="display_graph",trigger=""} 3' in text #[1]
+    assert 'dvat_callback_response_bytes_total{callback="display_graph",trigger=""} 12' in text
+
+
+def test_calls_that_raise_are_measured():
+    '''A call that raises (such as PreventUpdate) is still counted, with nothing returned'''
+    metrics = CallbackMetrics()
+    with pytest.raises(PreventUpdate):
+        metrics.call(skipped, 1)
+    assert metrics.calls[('skipped', '')] == 1
+    assert metrics.response_bytes[('skipped', '')] == 0
+
+
+def test_slow_calls_are_logged(caplog):
+    '''Calls slower than slow_threshold are logged as warnings'''
+    metrics = CallbackMetrics(slow_threshold=0)
+    metrics.call(display_graph, 1)
+    assert 'Slow callback display_graph' in caplog.text
+
+
+def test_job_calls_are_collected_by_the_serving_process(tmp_path):
+    '''Calls measured outside the processes serving the app (background jobs) go through the queue in jobs_dir and are recorded once the metrics are rendered'''
+    metrics = CallbackMetrics(jobs_dir=str(tmp_path))
+    metrics.call(display_graph, 1) #this process hasn't served a request, so it is treated as a job
+    assert metrics.calls == {}
+    assert 'dvat_callback_calls_total{callback="display_graph",trigger=""} 1' in CallbackMetrics(jobs_dir=str(tmp_path)).render()
+    metrics.serving.add(os.getpid())
+    metrics.call(display_graph, 1)
+    assert metrics.calls[('display_graph', '')] == 1
+
+
+def test_metrics_route_marks_the_process_serving(tmp_path):
+    '''Requests to the server mark its process as serving, and /metrics returns the metrics as Prometheus text'''
+    metrics = CallbackMetrics(jobs_dir=str(tmp_path))
+    server = Flask(__name__)
+    metrics.serve(server)
+    response = server.test_client().get('/metrics')
+    assert response.mimetype == 'text/plain'
+    assert '# TYPE dvat_callback_calls_total counter' in response.get_data(as_text=True)
+    assert os.getpid() in metrics.serving
@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+from src.Irr_DB import RATIO_STATISTIC
+from src.prefetch import Prefetcher
+
+##a line graph selection with its years chosen, only the statistic is left
+SELECTION = {'viz_type': 'Line Graph', 'state_id': ['CA'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES',
+             'mult_dt_q': 'One Data Item', 'year': ['2013', '2018'], 'stat_type': ''}
+
+
+def resolve(db, selection: dict) -> dict:
+    '''
+    Resolves selection the way the selection-store callback in main_dash.py does, keeping the selection it was resolved from
+
+    Returns the resolved selection as a dictionary
+    '''
+    resolved = db.resolve_selection(selection)
+    resolved['selection'] = selection
+    return resolved
+
+
+def prefetched(db, resolved: dict) -> tuple[list, list]:
+    '''
+    Prefetches resolved (a resolved selection) and waits for it to finish
+
+    Returns the stat_type of every selection the final query was run for, and every selection a figure was built for (lists)
+    '''
+    queried, built = [], []
+    prefetcher = Prefetcher(SimpleNamespace(db=db), lambda r: queried.append(r['selection']['stat_type']), lambda r: built.append(r['selection']))
+    prefetcher.schedule(resolved, 'session')
+    prefetcher.pool.shutdown(wait=True)
+    return queried, built
+
+
+def test_every_statistic_is_queried_once_years_are_chosen(db):
+    '''Once only the statistic is left, the final query is run for every statistic the user can choose (but the ratio, whose data item to divide by isn't chosen yet)'''
+    resolved = resolve(db, SELECTION)
+    queried, built = prefetched(db, resolved)
+    assert queried == [i for i in resolved['options']['stat_type'] if i != RATIO_STATISTIC]
+    assert built == []
+
+
+def test_figure_is_built_once_the_selection_is_complete(db):
+    '''A complete selection has its figure built, so Generate Graph finds it in the figure cache'''
+    queried, built = prefetched(db, resolve(db, dict(SELECTION, stat_type='Sum')))
+    assert queried == []
+    assert built == [dict(SELECTION, stat_type='Sum')]
+
+
+def run_now(fn, *args) -> Future:
+    '''
+    Runs fn with args as soon as it is submitted, before submit returns, as a thread of the pool that starts right away would
+
+    Returns the finished Future
+    '''
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+def test_selection_started_right_away_is_prefetched(db):
+    '''A selection whose thread starts before schedule returns is already the latest of its session, so it is prefetched rather than stopped'''
+    queried = []
+    prefetcher = Prefetcher(SimpleNamespace(db=db), lambda r: queried.append(r['selection']['stat_type']), lambda r: None)
+    prefetcher.pool, prefetcher.pid = SimpleNamespace(submit=run_now), os.getpid()
+    resolved = resolve(db, SELECTION)
+    prefetcher.schedule(resolved, 'session')
+    assert queried == [i for i in resolved['options']['stat_type'] if i != RATIO_STATISTIC]
+    assert prefetcher.pending == 0 and prefetcher.completed == 1
+
+
+def test_only_the_latest_selection_of_a_session_is_prefetched(db):
+    '''A newer selection of the same session stops the older one between steps, other sessions are left alone'''
+    started, release = threading.Event(), threading.Event()
+    queried = []
+
+    def final_results(resolved: dict) -> None:
+        '''Holds the first statistic's query until the newer selection is scheduled'''
+        queried.append(resolved['selection']['stat_type'])
+        started.set()
+        release.wait(5)
+
+    prefetcher = Prefetcher(SimpleNamespace(db=db), final_results, lambda r: None)
+    prefetcher.schedule(resolve(db, SELECTION), 'session')
+    started.wait(5)
+    prefetcher.schedule(resolve(db, dict(SELECTION, stat_type='Sum')), 'session') #complete, so only its figure is built
+    assert prefetcher.current('session', 2) and not prefetcher.current('session', 1)
+    release.set()
+    prefetcher.pool.shutdown(wait=True)
+    assert len(queried) == 1 #stopped after the statistic it was querying
+
+
+def test_too_many_pending_selections_are_dropped(db):
+    '''Past max_pending waiting selections, new ones are dropped rather than queued'''
+    release = threading.Event()
+    prefetcher = Prefetcher(SimpleNamespace(db=db), lambda r: release.wait(5), lambda r: None, max_pending=1)
+    prefetcher.schedule(resolve(db, SELECTION), 'first')
+    prefetcher.schedule(resolve(db, SELECTION), 'second')
+    assert prefetcher.sessions.get('second')['future'] == None
+    release.set()
+    prefetcher.pool.shutdown(wait=True)
+    assert prefetcher.pending == 0
@@ -0,0 +1,66 @@
+import io
+import pandas as pd
+import pytest
+from src.Irr_DB import RAW_COLUMNS
+from src.table_export import stream_table
+from tests.conftest import ROWS
+
+##the raw rows of one data item in two states
+PARAMS = {'state_id': ['CA', 'NE'], 'commodity': ['WATER'], 'domain': ['TOTAL'], 'data_item': ['ACRES IRRIGATED - ACRES']}
+
+
+def raw_rows(db, params: dict, batch_rows: int = 10000) -> pd.DataFrame:
+    '''
+    Streams the raw rows matching params (a dictionary) batch_rows (an int) rows at a time
+
+    Returns every row as one pandas DataFrame
+    '''
+    return pd.concat(list(db.stream_raw_rows(db.raw_query(params), params, batch_rows)), ignore_index=True)
+
+
+@pytest.mark.parametrize('params', [{'value': ['1']}, {'state_id': 'CA'}, {'year': [2013]}, {'state_id; DROP TABLE tMain': ['CA']}])
+def test_params_are_validated(db, params):
+    '''Only columns in RAW_FILTERS holding lists of strings can be filtered on, anything else raises a ValueError before a query is made'''
+    with pytest.raises(ValueError):
+        db.raw_query(params)
+
+
+def test_rows_match_the_filter(db):
+    '''Every raw row matching params is streamed with the columns in RAW_COLUMNS, in the order of the primary key, whatever the size of the batches'''
+    rows = raw_rows(db, PARAMS)
+    assert rows.columns.tolist() == RAW_COLUMNS
+    assert set(rows['state_id']) == {'CA', 'NE'}
+    assert set(rows['data_item']) == {'ACRES IRRIGATED - ACRES'}
+    assert set(rows['state']) == {'CALIFORNIA', 'NEBRASKA'}
+    assert rows['value'].tolist() == ROWS[ROWS['state_id'].isin(PARAMS['state_id']) & ROWS['data_item'].isin(PARAMS['data_item'])]['value'].tolist()
+    pd.testing.assert_frame_equal(raw_rows(db, PARAMS, batch_rows=3), rows)
+
+
+def test_no_matching_rows_streams_an_empty_table(db):
+    '''A filter matching nothing streams only the header'''
+    rows = raw_rows(db, {'state_id': ['XX']})
+    assert rows.empty and rows.columns.tolist() == RAW_COLUMNS
+
+
+def test_stream_is_written_a_batch_at_a_time(db):
+    '''The streamed file is the same as the file of every row at once, and nothing is read until the stream is iterated'''
+    read = []
+
+    def batches():
+        for batch in db.stream_raw_rows(db.raw_query(PARAMS), PARAMS, 5):
+            read.append(len(batch))
+            yield batch
+
+    stream = stream_table(batches(), 'csv')
+    assert read == []
+    data = b''.join(stream)
+    assert len(read) > 1
+    assert data == raw_rows(db, PARAMS).to_csv(index=False).encode()
+    assert pd.read_csv(io.BytesIO(data)).columns.tolist() == RAW_COLUMNS
+
+
+def test_excel_and_unknown_formats_cant_be_streamed():
+    '''Excel files can't be written a batch at a time, so streaming them raises a ValueError right away, as do unknown formats'''
+    for fmt in ['xlsx', 'txt']:
+        with pytest.raises(ValueError):
+            stream_table(iter([]), fmt)
@@ -0,0 +1,82 @@
+import os
+import shutil
+import pytest
+import report
+from report import make_report, report_selections
+from src.export_service import ExportService
+from src.Irr_DB import Irr_DB
+
+
+def test_grid_of_selections(db):
+    '''Every data item of the commodity is crossed with every statistic and group of states, statistics that can't be used are skipped with the reason'''
+    selections = report_selections(db, ['Bar Plot'], ['WELLS'], [], [['CA', 'NE'], ['CO']], ['2018'], ['Sum', 'Percent Change'], 'States', 'Multiple Lines')
+    data_items = db.resolve_selection({'state_id': ['CA', 'NE'], 'commodity': 'WELLS', 'domain': 'TOTAL'})['options']['data_item']
+    assert len(selections) == len(data_items) * 2 * 2
+    for resolved in selections:
+        if resolved['selection']['stat_type'] == 'Sum':
+            assert resolved['complete'] and 'skipped' not in resolved
+        else: #a percent change of a single year
+            assert resolved['skipped'] == 'Percent Change not available for the selection'
+
+
+def test_missing_data_is_skipped(db):
+    '''A data item the states don't have is skipped rather than failing the report'''
+    [resolved] = report_selections(db, ['Line Graph'], ['WATER'], ['NOT A DATA ITEM'], [['CA']], [], ['Sum'], 'States', 'Multiple Lines')
+    assert resolved['skipped'] == 'data item not available for the states'
+
+
+def test_report_only_renders_what_changed(db, tmp_path):
+    '''Rerunning a report finds every file it already made, and marks them unchanged in the manifest'''
+    pytest.importorskip('kaleido')
+    selections = report_selections(db, ['Line Graph'], ['WATER'], ['ACRES IRRIGATED - ACRES'], [['CA', 'NE']], ['2013', '2018'], ['Sum'], 'States', 'Multiple Lines')
+    service = ExportService(export_dir=str(tmp_path / 'figures'), processes=1, table_dir=str(tmp_path / 'tables'))
+    try:
+        manifest = make_report(selections, db, service, ['svg'], str(tmp_path))
+        assert manifest['items'][0]['status'] == {'csv': 'written', 'svg': 'written'}
+        assert (tmp_path / manifest['items'][0]['files']['svg']).exists()
+        assert (tmp_path / 'manifest.json').exists()
+        again = make_report(selections, db, service, ['svg'], str(tmp_path))
+        assert again['items'][0]['status'] == {'csv': 'unchanged', 'svg': 'unchanged'}
+        assert again['items'][0]['files'] == manifest['items'][0]['files']
+    finally:
+        service.stop()
+
+
+def test_other_domains_graph_every_domain_category(db):
+    '''With every domain taken, a domain other than TOTAL is made with every domain category of its data item, data items listed only with the domains that have them'''
+    selections = report_selections(db, ['Bar Plot'], ['ENERGY'], [], [['CA', 'NE']], ['2018'], ['Sum'], 'States', 'Multiple Lines', domains=[])
+    assert sorted(r['selection']['domain'] for r in selections) == ['ENERGY SOURCE', 'TOTAL']
+    [source] = [r for r in selections if r['selection']['domain'] == 'ENERGY SOURCE']
+    assert source['complete'] and sorted(source['params']['domain_category']) == ['DIESEL', 'ELECTRICITY']
+    selections = report_selections(db, ['Bar Plot'], ['WATER'], ['ACRES IRRIGATED - ACRES'], [['CA']], [], ['Sum'], 'States', 'Multiple Lines', domains=[])
+    assert [r['selection']['domain'] for r in selections] == ['TOTAL']
+
+
+def test_pool_makes_the_same_report(db, tmp_path):
+    '''Making the graphs and data tables in a pool of processes gives the same files as making them one after another'''
+    selections = report_selections(db, ['Bar Plot'], ['ENERGY'], [], [['CA', 'NE']], ['2018'], ['Sum'], 'States', 'Multiple Lines', domains=[])
+    one = make_report(selections, db, ExportService(table_dir=str(tmp_path / 'one' / 'tables')), [], str(tmp_path / 'one'))
+    pooled = make_report(selections, db, ExportService(table_dir=str(tmp_path / 'pooled' / 'tables')), [], str(tmp_path / 'pooled'), processes=2)
+    assert [i['files'] for i in pooled['items']] == [i['files'] for i in one['items']]
+    assert [i['title'] for i in pooled['items']] == [i['title'] for i in one['items']]
+
+
+def test_unchanged_selections_are_not_made_again(path_db, tmp_path, monkeypatch):
+    '''A selection whose key (the resolved selection and when the database changed) is in the last manifest isn't made again, until the database changes'''
+    shutil.copy(path_db, tmp_path / 'irrigation.db')
+    db = Irr_DB(str(tmp_path / 'irrigation.db'))
+    selections = report_selections(db, ['Line Graph'], ['WELLS'], [], [['CA', 'NE']], [], ['Sum'], 'States', 'Multiple Lines')
+    service = ExportService(table_dir=str(tmp_path / 'tables'))
+    manifest = make_report(selections, db, service, [], str(tmp_path))
+    make_item = report.make_report_item
+    monkeypatch.setattr(report, 'make_report_item', lambda db, resolved: pytest.fail('made again'))
+    again = make_report(selections, db, service, [], str(tmp_path))
+    assert [i['key'] for i in again['items']] == [i['key'] for i in manifest['items']]
+    assert all(i['status'] == {'csv': 'unchanged'} for i in again['items'])
+    made = []
+    monkeypatch.setattr(report, 'make_report_item', lambda db, resolved: made.append(resolved) or make_item(db, resolved))
+    os.utime(db.path_db, (os.path.getmtime(db.path_db) + 10,) * 2)
+    changed = make_report(selections, db, service, [], str(tmp_path))
+    assert len(made) == len(selections)
+    assert [i['key'] for i in changed['items']] != [i['key'] for i in manifest['items']]
+    assert [i['files'] for i in changed['items']] == [i['files'] for i in manifest['items']] #same content, so the same files
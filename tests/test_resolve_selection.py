@@ -0,0 +1,82 @@
+import sqlite3
+import pytest
+from tests.conftest import YEARS
+
+##selections of a partial app state, each resolved both ways: states and commodity, then every domain and data item they offer
+SELECTIONS = [(['CA'], 'WATER'), (['CA', 'NE', 'TX'], 'ENERGY'), (['CO', 'NE'], 'WELLS')]
+
+
+@pytest.mark.parametrize('state_id, commodity', SELECTIONS)
+def test_domains_and_data_items_match_per_step_api(db, state_id, commodity):
+    '''Every domain, data item and domain category resolve_selection offers is what get_domains, get_data_items and get_domain_categories find'''
+    resolved = db.resolve_selection({'state_id': state_id, 'commodity': commodity})
+    assert sorted(resolved['options']['domain']) == sorted(db.get_domains({'state_id': state_id, 'commodity': [commodity]}))
+    assert commodity in resolved['options']['commodity']
+    for domain in resolved['options']['domain']:
+        params = {'state_id': state_id, 'commodity': [commodity], 'domain': [domain]}
+        resolved = db.resolve_selection({'state_id': state_id, 'commodity': commodity, 'domain': domain})
+        assert sorted(resolved['options']['data_item']) == sorted(db.get_data_items(params))
+        if domain == 'TOTAL':
+            continue
+        for data_item in resolved['options']['data_item']:
+            resolved = db.resolve_selection({'state_id': state_id, 'commodity': commodity, 'domain': domain, 'data_item': data_item})
+            assert sorted(resolved['options']['domain_category']) == sorted(db.get_domain_categories(dict(params, data_item=[data_item]), None))
+
+
+@pytest.mark.parametrize('state_id, commodity', SELECTIONS)
+def test_years_match_per_step_api(db, state_id, commodity):
+    '''The years offered for one data item with domain TOTAL, and for every domain category of the other domains, are the ones get_years finds'''
+    for domain in db.get_domains({'state_id': state_id, 'commodity': [commodity]}):
+        params = {'state_id': state_id, 'commodity': [commodity], 'domain': [domain]}
+        for data_item in db.get_data_items(params):
+            sel = {'state_id': state_id, 'commodity': commodity, 'domain': domain, 'data_item': data_item, 'mult_dt_q': 'One Data Item'}
+            if domain == 'TOTAL':
+                year_params = dict(params, data_item=[data_item])
+            else:
+                sel['domain_category'] = db.get_domain_categories(dict(params, data_item=[data_item]), None)
+                year_params = dict(params, data_item=[data_item], domain_category=sel['domain_category'])
+            assert db.resolve_selection(sel)['options']['year'] == db.get_years(year_params)
+
+
+@pytest.mark.skipif(sqlite3.sqlite_version_info < (3, 44, 0), reason='intermediate_domain_categories uses CONCAT, added in sqlite 3.44')
+def test_additional_data_items_match_per_step_api(db):
+    '''The additional data items offered with domain TOTAL share the initial data item's units, as intermediate_domain_categories finds'''
+    params = {'state_id': ['CA', 'NE'], 'commodity': ['WATER'], 'domain': ['TOTAL'], 'data_item': ['ACRES IRRIGATED - ACRES']}
+    resolved = db.resolve_selection({'state_id': params['state_id'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES', 'mult_dt_q': 'Multiple Data Items'})
+    assert sorted(resolved['options']['add_data_item']) == sorted(db.get_domain_categories(params, 'Multiple Data Items'))
+
+
+def test_additional_data_items_share_units(db):
+    '''Additional data items are only offered in the units of the initial data item, and never the initial data item itself'''
+    selection = {'state_id': ['CA', 'NE'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES', 'mult_dt_q': 'Multiple Data Items'}
+    assert db.resolve_selection(selection)['options']['add_data_item'] == ['ACRES DRIP - ACRES']
+    assert db.resolve_selection(dict(selection, state_id=['CO']))['options']['add_data_item'] == [] #CO doesn't report ACRES DRIP
+
+
+def test_options_are_what_the_states_report(db):
+    '''Each step offers what the test database holds for the states chosen'''
+    assert sorted(db.resolve_selection({'state_id': ['TX']})['options']['commodity']) == ['ENERGY', 'WATER'] #TX doesn't report WELLS
+    resolved = db.resolve_selection({'state_id': ['CO'], 'commodity': 'WATER', 'domain': 'WATER SOURCE', 'data_item': 'ACRE FEET APPLIED, BY SOURCE - ACRE FEET'})
+    assert sorted(resolved['options']['domain']) == ['TOTAL', 'WATER SOURCE']
+    assert sorted(resolved['options']['data_item']) == ['ACRE FEET APPLIED, BY SOURCE - ACRE FEET']
+    assert resolved['options']['domain_category'] == ['GROUND'] #CO doesn't report SURFACE
+    resolved = db.resolve_selection({'state_id': ['CA'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES', 'mult_dt_q': 'One Data Item'})
+    assert sorted(resolved['options']['data_item']) == ['ACRE FEET APPLIED - ACRE FEET', 'ACRES DRIP - ACRES', 'ACRES IRRIGATED - ACRES']
+    assert resolved['options']['year'] == YEARS
+
+
+def test_stale_choices_are_dropped(db):
+    '''Choices remembered from another data specification are dropped rather than passed on to the query'''
+    resolved = db.resolve_selection({'viz_type': 'Line Graph', 'state_id': ['CA'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES',
+                                     'mult_dt_q': 'One Data Item', 'year': ['2013', '1850'], 'stat_type': 'Sum'})
+    assert resolved['valid']['year'] == ['2013']
+    assert resolved['params']['year'] == ['2013']
+    assert resolved['complete']
+
+
+def test_nothing_resolved_without_states(db):
+    '''Nothing can be chosen before the states are'''
+    resolved = db.resolve_selection({'commodity': 'WATER'})
+    assert resolved['options']['domain'] == []
+    assert resolved['params'] == None
+    assert not resolved['complete']
@@ -0,0 +1,45 @@
+import inspect
+import main_dash
+
+##a complete line graph selection, as the values of the components the selection-store callback reads (keyed by the names of its arguments)
+VALUES = {'viz_type': 'Line Graph', 'state_id': ['CA', 'NE'], 'commodity': 'WATER', 'domain': 'TOTAL', 'data_item': 'ACRES IRRIGATED - ACRES',
+          'mult_dt_q': 'One Data Item', 'year': ['2013', '2018'], 'stat_type': 'Sum', 'line_n': 'Multiple Lines'}
+
+##the sections after the state section, each presenting options held in the resolved selection
+SECTIONS = ['com-dd', 'dom-dd', 'dt-dd', 'mult-dt-r', 'tot-dom-dt', 'dc-cl', 'year-cl', 'statq-r', 'barxax-r', 'line-n-r']
+
+
+def store(values: dict) -> dict:
+    '''
+    Calls the callback of 'selection-store' with the component values in values (a dictionary keyed by the names of its arguments),
+    components not in values hold None, as they do before they are first set
+
+    Returns the resolved selection it stores, a dictionary
+    '''
+    names = inspect.signature(main_dash.resolve_selection).parameters
+    return main_dash.resolve_selection(*[values.get(name) for name in names])
+
+
+def test_store_holds_the_resolved_selection(app, db):
+    '''The store holds the selection resolved by the database, with the selections it was resolved from and defaults for the sections not set yet'''
+    resolved = store(VALUES)
+    assert resolved['complete']
+    assert resolved['params'] == db.resolve_selection(resolved['selection'])['params']
+    assert resolved['selection']['state_id'] == ['CA', 'NE']
+    assert resolved['selection']['add_data_item'] == [] and resolved['selection']['barax'] == ''
+
+
+def test_choices_of_other_data_are_dropped(app):
+    '''Years remembered from another data item are dropped from the store, and without states nothing can be chosen'''
+    resolved = store(dict(VALUES, year=['2013', '1850']))
+    assert resolved['valid']['year'] == ['2013']
+    assert not store(dict(VALUES, state_id=None))['complete']
+
+
+def test_sections_only_read_the_store(app):
+    '''Each section after the state section is updated from 'selection-store' alone, and only the store's own callback reads the selections'''
+    for section in SECTIONS:
+        [callback] = [c for output, c in app.callback_map.items() if '..' + section + '.options...' in output]
+        assert callback['inputs'] == [{'id': 'selection-store', 'property': 'data'}]
+        readers = [output for output, c in app.callback_map.items() if {'id': section, 'property': 'value'} in c['inputs']]
+        assert readers == ['selection-store.data']
@@ -0,0 +1,79 @@
+import gzip
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src import table_export
+from src.table_export import check_table_format, table_bytes, table_extension
+
+##a data table as get_statistics makes it, with years as column names and a year without a value
+TABLE = pd.DataFrame({'STATE': ['CA', 'NE', 'TX'], 2013: [1.5, np.nan, 3.25], 2018: [4.0, 5.0, 6.0]})
+
+
+def read(data: bytes, fmt: str, compression: str) -> pd.DataFrame:
+    '''
+    Reads a data table written as fmt with compression (strings) from data (the bytes of the file)
+
+    Returns the data table as a pandas DataFrame
+    '''
+    if fmt in table_export.TEXT_FORMATS and compression == 'gzip':
+        data = gzip.decompress(data)
+    elif fmt in table_export.TEXT_FORMATS and compression == 'zstd':
+        zstandard = pytest.importorskip('zstandard')
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    if fmt == 'csv':
+        return pd.read_csv(io.BytesIO(data))
+    if fmt == 'jsonl':
+        return pd.read_json(io.BytesIO(data), lines=True, dtype=False)
+    if fmt == 'parquet':
+        return pd.read_parquet(io.BytesIO(data))
+    return pd.read_excel(io.BytesIO(data))
+
+
+@pytest.mark.parametrize('fmt, compression', [('csv', 'none'), ('csv', 'gzip'), ('csv', 'zstd'), ('jsonl', 'none'), ('jsonl', 'gzip'),
+                                              ('parquet', 'none'), ('parquet', 'zstd'), ('parquet', 'gzip'), ('xlsx', 'none')])
+def test_table_is_read_back_the_same(fmt, compression):
+    '''Every format and compression is read back as the same table, with the years as column names written as strings'''
+    for name in [fmt, compression]:
+        if not table_export.installed(name):
+            pytest.skip(table_export.OPTIONAL_MODULES[name] + ' is not installed')
+    df = read(table_bytes(TABLE, fmt, compression), fmt, compression)
+    df.columns = [str(c) for c in df.columns]
+    pd.testing.assert_frame_equal(df, TABLE.rename(columns=str), check_dtype=False)
+
+
+def test_row_groups_write_one_header(monkeypatch):
+    '''A table written a row group at a time is the same file as one written at once, with the header only at the top'''
+    data = table_bytes(TABLE, 'csv')
+    monkeypatch.setattr(table_export, 'ROW_GROUP_ROWS', 1)
+    assert table_bytes(TABLE, 'csv') == data
+    assert data.decode().count('STATE') == 1
+    assert [json.loads(line)['STATE'] for line in table_bytes(TABLE, 'jsonl').decode().splitlines()] == ['CA', 'NE', 'TX']
+
+
+def test_same_table_gives_the_same_file():
+    '''Compressed files hold no timestamp, so the same table is always the same file (files are named by a hash of their content)'''
+    assert table_bytes(TABLE, 'csv', 'gzip') == table_bytes(TABLE.copy(), 'csv', 'gzip')
+
+
+def test_extensions():
+    '''Compressed text files add the compression to their extension, Parquet and Excel files keep their own'''
+    assert table_extension('csv', 'gzip') == 'csv.gz'
+    assert table_extension('jsonl', 'zstd') == 'jsonl.zst'
+    assert table_extension('parquet', 'zstd') == 'parquet'
+    assert table_extension('csv') == 'csv'
+
+
+@pytest.mark.parametrize('fmt, compression', [('txt', 'none'), ('csv', 'bz2'), ('csv', 'snappy')])
+def test_formats_that_cant_be_used_are_rejected(fmt, compression):
+    '''Unknown formats and compressions, and snappy for anything but Parquet, raise a ValueError'''
+    with pytest.raises(ValueError):
+        check_table_format(fmt, compression)
+
+
+def test_missing_package_is_reported(monkeypatch):
+    '''A format whose package isn't installed raises a ValueError naming the package to install'''
+    monkeypatch.setitem(table_export.OPTIONAL_MODULES, 'parquet', 'not_an_installed_package')
+    with pytest.raises(ValueError, match='pip install not_an_installed_package'):
+        check_table_format('parquet')
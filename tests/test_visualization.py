@@ -0,0 +1,83 @@
+from src.visualization import LINES_PER_FACET, MAX_TITLE_ITEMS, form_x_tick_labels, format_label, get_full_title, make_bar_plot, make_line_graph, set_dt_title, title_items
+
+##twelve states and years, more than a title lists
+STATES = ['AR', 'CA', 'CO', 'FL', 'GA', 'ID', 'KS', 'MO', 'MS', 'NE', 'OR', 'TX']
+YEARS = ['1978', '1984', '1988', '1994', '1998', '2003', '2008', '2013', '2018', '2023', '2024', '2025']
+
+
+def params(state_id: list[str], year: list[str]) -> dict:
+    '''
+    Makes the params of a selection of one data item with domain TOTAL over state_id and year (lists of strings)
+
+    Returns a dictionary
+    '''
+    return {'state_id': state_id, 'commodity': ['WATER'], 'domain': ['TOTAL'], 'data_item': ['ACRES IRRIGATED - ACRES'], 'year': year}
+
+
+def test_title_counts_large_selections():
+    '''Past MAX_TITLE_ITEMS states or years, the title gives how many were chosen (and the range of years) instead of listing them'''
+    assert title_items(STATES[:MAX_TITLE_ITEMS], 'STATES') == ', '.join(STATES[:MAX_TITLE_ITEMS])
+    assert title_items(STATES, 'STATES') == '12 STATES'
+    assert title_items(YEARS, 'YEARS') == '12 YEARS (1978-2025)'
+    assert '12 STATES' in get_full_title('SUM', params(STATES, ['2013']), 'ACRES')
+
+
+def test_large_bar_plot_is_one_trace():
+    '''In large selection mode every bar is drawn by one trace, otherwise each bar is its own trace'''
+    y_data = [float(i) for i in range(len(STATES))]
+    assert len(make_bar_plot(params(STATES, ['2013']), 'state_id', y_data, 'SUM', large=True).data) == 1
+    assert len(make_bar_plot(params(STATES, ['2013']), 'state_id', y_data, 'SUM').data) == len(STATES)
+
+
+def test_large_line_graph_uses_webgl():
+    '''In large selection mode lines are drawn with WebGL, one per state'''
+    y_data = [[float(i), float(i + 1)] for i in range(len(STATES))]
+    fig = make_line_graph(params(STATES, ['2013', '2018']), y_data, 'SUM', 'multiple', large=True)
+    assert len(fig.data) == len(STATES)
+    assert all(trace.type == 'scattergl' for trace in fig.data)
+    fig = make_line_graph(params(STATES, ['2013', '2018']), y_data, 'SUM', 'multiple')
+    assert all(trace.type == 'scatter' for trace in fig.data)
+
+
+def test_large_line_graph_is_faceted_past_the_line_limit():
+    '''Past LINES_PER_FACET lines, a large line graph draws each LINES_PER_FACET lines in a facet of its own, titled and grouped in the legend by its first and last line'''
+    assert len(STATES) > LINES_PER_FACET
+    y_data = [[float(i), float(i + 1)] for i in range(len(STATES))]
+    fig = make_line_graph(params(STATES, ['2013', '2018']), y_data, 'SUM', 'multiple', large=True)
+    assert [annotation.text for annotation in fig.layout.annotations] == ['AR TO NE', 'OR TO TX']
+    assert [trace.yaxis for trace in fig.data] == ['y'] * LINES_PER_FACET + ['y2'] * (len(STATES) - LINES_PER_FACET)
+    assert [trace.legendgroup for trace in fig.data] == ['Facet0'] * LINES_PER_FACET + ['Facet1'] * (len(STATES) - LINES_PER_FACET)
+    assert (fig.data[0].legendgrouptitle.text, fig.data[LINES_PER_FACET].legendgrouptitle.text) == ('AR TO NE', 'OR TO TX')
+    assert fig.layout.xaxis2.title.text == 'YEARS' and fig.layout.yaxis2.title.text == 'ACRES'
+
+
+def test_large_line_graph_groups_its_legend():
+    '''A large line graph within the line limit is one plot whose lines share one legend group, otherwise every line is its own legend group'''
+    y_data = [[float(i), float(i + 1)] for i in range(4)]
+    fig = make_line_graph(params(STATES[:4], ['2013', '2018']), y_data, 'SUM', 'multiple', large=True)
+    assert {trace.legendgroup for trace in fig.data} == {'Facet0'}
+    assert fig.layout.annotations == ()
+    fig = make_line_graph(params(STATES[:4], ['2013', '2018']), y_data, 'SUM', 'multiple')
+    assert [trace.legendgroup for trace in fig.data] == ['Group0', 'Group1', 'Group2', 'Group3']
+
+
+def test_labels_are_split_into_lines_of_three_words():
+    '''Tick labels get a line break every three words, keep a trailing $ with the word before it, and lose their units when they are data items'''
+    assert format_label('ACRES IRRIGATED - ACRES') == 'ACRES IRRIGATED -<br>ACRES<br>'
+    assert format_label('ELECTRICITY - EXPENSE, MEASURED IN $') == 'ELECTRICITY - EXPENSE,<br>MEASURED IN $<br>'
+    assert format_label('ACRES IRRIGATED - ACRES', data_item=True) == 'ACRES IRRIGATED<br>'
+    assert form_x_tick_labels(['ACRES IRRIGATED - ACRES'], line_graph=True) == ['ACRES IRRIGATED -<br>ACRES']
+
+
+def test_titles_break_after_the_second_comma():
+    '''Data items with three or more commas get a line break after the second one in titles'''
+    assert set_dt_title(['EXPENSE, MEASURED IN $']) == 'EXPENSE, MEASURED IN $'
+    assert set_dt_title(['A, B, C, D']) == 'A, B<br>C, D'
+
+
+def test_labels_are_formatted_once():
+    '''A label already formatted is looked up rather than formatted again'''
+    first = form_x_tick_labels(['NUMBER OF WELLS - NUMBER'])
+    hits = format_label.cache_info().hits
+    assert form_x_tick_labels(['NUMBER OF WELLS - NUMBER']) == first
+    assert format_label.cache_info().hits == hits + 1
@@ -0,0 +1,46 @@
+import importlib
+import json
+import os
+import runpy
+import shutil
+import sys
+from types import SimpleNamespace
+import main_dash
+from tests.conftest import PATH_ROOT, STATES
+
+##the state create_app sets up in main_dash, restored after a test makes another app
+SERVICES = ['data_service', 'export_service', 'typed_arrays', 'prefetcher', 'job_manager', 'callback_metrics']
+
+
+def test_wsgi_serves_the_app(app, path_db, tmp_path, monkeypatch):
+    '''wsgi.py creates the app with the default settings (run from the root of the repository) and exposes its Flask server for the WSGI server'''
+    #the app of the other tests is set up first (app), so it keeps the callbacks rather than the app made here
+    os.mkdir(tmp_path / 'data')
+    shutil.copy(path_db, tmp_path / 'data' / 'irrigation.db')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DVAT_SLOW_CALLBACK', '2.5')
+    for name in SERVICES:
+        monkeypatch.setattr(main_dash, name, getattr(main_dash, name))
+    monkeypatch.delitem(sys.modules, 'wsgi', raising=False)
+    wsgi = importlib.import_module('wsgi')
+    assert wsgi.server is wsgi.app.server
+    assert main_dash.callback_metrics.slow_threshold == 2.5
+    response = wsgi.server.test_client().get('/_dash-layout')
+    assert response.status_code == 200
+    layout = json.dumps(response.get_json())
+    assert all('{"label": "' + s + '", "value": "' + s + '"}' in layout for s in STATES) #the state checklist
+    monkeypatch.delitem(sys.modules, 'wsgi')
+
+
+def test_gunicorn_serves_the_wsgi_app_and_warms_up_each_worker(monkeypatch):
+    '''gunicorn.conf.py serves wsgi:server with the app loaded before forking, settings come from the environment,
+    and each forked worker warms up its database connection, kaleido renderers and fork server'''
+    monkeypatch.setenv('DVAT_WORKERS', '3')
+    monkeypatch.delenv('DVAT_BIND', raising=False)
+    conf = runpy.run_path(os.path.join(PATH_ROOT, 'gunicorn.conf.py'))
+    assert (conf['wsgi_app'], conf['preload_app'], conf['workers'], conf['bind']) == ('wsgi:server', True, 3, '127.0.0.1:8050')
+    started = []
+    for name, method in [('data_service', 'warm_up'), ('export_service', 'start'), ('job_manager', 'start')]:
+        monkeypatch.setattr(main_dash, name, SimpleNamespace(**{method: lambda name=name: started.append(name)}))
+    conf['post_fork'](None, None)
+    assert started == ['data_service', 'export_service', 'job_manager']
@@ -0,0 +1,17 @@
+'''
+WSGI entry point of the tool, for serving it with a multi-process server (such as gunicorn, configured in gunicorn.conf.py) behind a reverse proxy
+
+The app is created once when this module is imported, with debug off. If the server loads the app before forking its workers (preload_app in gunicorn.conf.py),
+the irrigation database, its indexes, and the layout are set up once in the parent process and shared by every worker
+
+Callbacks taking longer than the DVAT_SLOW_CALLBACK environment variable (in seconds) are logged as warnings
+'''
+import os
+from main_dash import create_app
+
+config={}
+if os.environ.get('DVAT_SLOW_CALLBACK'):
+    config['slow_callback_seconds']=float(os.environ['DVAT_SLOW_CALLBACK'])
+
+app=create_app(config)
+server=app.server #the Flask server the WSGI server calls